@@ -1,8 +1,50 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
-import requests
-from datetime import datetime, date
-import re
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import contextvars
+import json
+
+from atualizacao import erro_snapshot, estatisticas, idade_snapshot
+from carga import chave_snapshot, obter_bancario, obter_receber
+from filtros import derivado, fatiar_cubo, filtrar_movimentos, filtrar_receber, ocupacao
+from formatacao import format_brl, formatar_brl_centavos, formatar_extrato_html, montar_detalhe_receber
+from historico import (
+    HISTORICO,
+    JANELA_HISTORICO_DIAS,
+    bancos_movimentos,
+    consultar_receber,
+    contar_receber,
+    cubo_receber,
+    extrato,
+    limites_movimentos,
+    limites_receber,
+    recebido_no_mes,
+    status_receber,
+)
+from instrumentacao import (
+    INSTRUMENTACAO,
+    etapa,
+    iniciar_execucao,
+    iniciar_servidor_metricas,
+    registrar,
+    registrar_contadores,
+    registros,
+    totais,
+    ultimas_por_etapa,
+)
+from processamento import (
+    COLUNAS_DETALHE_RECEBER,
+    FAIXAS_ATRASO,
+    agrupar_extrato,
+    montar_cubo_receber,
+    preprocessar_receber,
+    recebido_entre,
+    totais_receber,
+)
 
 # Define a configuração da página
 st.set_page_config(layout="wide", page_title="Aplicação Financeira")
@@ -33,69 +75,18 @@ API_TOKEN = setup_api()
 
 # --- Funções Helper ---
 
-def format_brl(value):
-    """
-    Formata um número float para o padrão BRL (R$ 1.234,56).
-    """
-    try:
-        if pd.isna(value) or value == 0:
-            return "R$ 0,00"
-        # Formata como en-US (ex: 1,234.56)
-        formatted = f"{float(value):,.2f}"
-        # Inverte os separadores para o padrão pt-BR
-        formatted_br = formatted.replace(",", "X").replace(".", ",").replace("X", ".")
-        return f"R$ {formatted_br}"
-    except (ValueError, TypeError):
-        return "R$ 0,00"
-
-def corrigir_fuso_horario(data_str):
-    """
-    Corrige o fuso horário das datas ISO 8601.
-    Converte '2025-10-16T01:00:00-03:00' para '2025-10-16T00:00:00'
-    """
-    if pd.isna(data_str) or data_str == '':
-        return data_str
-    
-    data_str = str(data_str)
-    
-    # Se já é uma data válida sem fuso, retorna como está
-    if not 'T' in data_str:
-        return data_str
-    
-    try:
-        # Extrai apenas a parte da data (antes do T)
-        data_parte = data_str.split('T')[0]
-        # Retorna no formato correto sem fuso horário
-        return f"{data_parte}T00:00:00"
-    except:
-        return data_str
+# Ordenações do extrato: rótulo -> (coluna, crescente)
+ORDENACOES_EXTRATO = {
+    "Data (mais recente)": ('Data', False),
+    "Data (mais antiga)": ('Data', True),
+    "Descrição": ('Descricao', True),
+    "Maiores entradas": ('Total Entradas', False),
+    "Maiores saídas": ('Total Saídas', False),
+}
+TAMANHOS_PAGINA_EXTRATO = [100, 250, 500, 1000]
 
-def get_status(row):
-    """
-    Calcula o status de um título (A vencer, Vence hoje, Vencido, Baixado).
-    """
-    try:
-        # 1. Verifica se foi pago (Baixado)
-        if pd.notna(row.get('dataBaixa')) or pd.notna(row.get('dataCredito')):
-            return "Baixado" 
-        
-        # 2. Prepara as datas para comparação
-        today = pd.to_datetime(date.today()).normalize()
-        vencimento = pd.to_datetime(row.get('dataVencimentoReal')).normalize()
-        
-        # 3. Verifica se a data de vencimento é válida
-        if pd.isna(vencimento):
-            return "A vencer"
-            
-        # 4. Compara as datas
-        if vencimento == today:
-            return "Vence hoje" 
-        elif vencimento < today:
-            return "Vencido"
-        else:
-            return "A vencer" 
-    except Exception:
-        return "A vencer"
+# Clientes com maior entrada prevista mostrados no fluxo semanal (os demais viram "Outros")
+MAX_CLIENTES_FLUXO = 10
 
 # --- Estilização CSS Customizada ---
 st.markdown("""
@@ -202,185 +193,213 @@ st.markdown("""
 
 # --- Carregamento de Dados (Cache) ---
 
-@st.cache_data(ttl=600)
 def load_movimentos_e_saldos(api_token):
     """
-    Carrega dados das APIs de movimentos e saldos.
+    Retorna o último snapshot bancário: saldos, rollup diário dos movimentos
+    e curva de saldos (atualizado em background).
     """
     try:
-        headers = {"Authorization": f"Bearer {api_token}"}
-        
-        # 1. Carregar Movimentos Bancários
-        url_movimentos = "https://api.flow2.com.br/v1/movimentosBancarios?DesabilitarPaginacao=true&DataMovimentoMaiorOuIgualA=2025-01-01"
-        response_mov = requests.get(url_movimentos, headers=headers, timeout=30)
-        response_mov.raise_for_status()
-        data_mov = response_mov.json()
-        
-        if 'itens' in data_mov and data_mov['itens']:
-            df_movimentos = pd.json_normalize(data_mov, record_path=['itens'])
-        else:
-            df_movimentos = pd.DataFrame()
-            
-        # Processa movimentos se existirem dados
-        if not df_movimentos.empty:
-            df_movimentos = df_movimentos.rename(columns={
-                "valor": "Valor",
-                "dataMovimento": "DataMovimento",
-                "descricao": "Descricao",
-                "operacao": "Operacao",
-                "nomeBanco": "Banco"
-            })
-            
-            df_movimentos['Valor'] = pd.to_numeric(df_movimentos.get('Valor', 0), errors='coerce').fillna(0)
-            df_movimentos['DataMovimento'] = pd.to_datetime(df_movimentos.get('DataMovimento'), errors='coerce')
-            df_movimentos['Data'] = df_movimentos['DataMovimento'].dt.date
-            df_movimentos['Horario'] = df_movimentos['DataMovimento'].dt.time
-            df_movimentos['Descricao'] = df_movimentos.get('Descricao', '').astype(str).str.upper()
-            df_movimentos['Operacao'] = df_movimentos.get('Operacao', '').astype(str)
-        else:
-            # Cria DataFrame vazio com colunas esperadas
-            df_movimentos = pd.DataFrame(columns=['Data', 'Horario', 'Descricao', 'Valor', 'Operacao', 'Banco'])
-
-        # 2. Carregar Saldo dos Bancos
-        url_saldos = "https://api.flow2.com.br/v1/saldoBancos"
-        response_saldos = requests.get(url_saldos, headers=headers, timeout=30)
-        response_saldos.raise_for_status()
-        data_saldos = response_saldos.json()
-        
-        if data_saldos:
-            df_saldos = pd.json_normalize(data_saldos)
-            df_saldos = df_saldos.rename(columns={
-                "banco.nome": "Banco",
-                "saldo": "Saldo dos bancos"
-            })
-            df_saldos['Saldo dos bancos'] = pd.to_numeric(df_saldos.get('Saldo dos bancos', 0), errors='coerce').fillna(0)
-        else:
-            df_saldos = pd.DataFrame(columns=['Banco', 'Saldo dos bancos'])
-
-        return df_movimentos, df_saldos
-
+        return obter_bancario(api_token)
     except Exception as e:
         st.error(f"Erro ao carregar dados bancários: {e}")
-        return pd.DataFrame(), pd.DataFrame()
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
-@st.cache_data(ttl=600)
 def load_receber_e_clientes(api_token):
     """
-    Carrega dados das APIs de Contas a Receber e Clientes.
+    Retorna o último snapshot de contas a receber (atualizado em background).
     """
     try:
-        headers = {"Authorization": f"Bearer {api_token}"}
-        
-        # 1. Carregar Contas a Receber
-        url_receber = "https://api.flow2.com.br/v1/recebers?DesabilitarPaginacao=true"
-        response_receber = requests.get(url_receber, headers=headers, timeout=30)
-        response_receber.raise_for_status()
-        data_receber = response_receber.json()
-
-        # Normaliza os 'itens'
-        if 'itens' in data_receber and data_receber['itens']:
-            df_receber = pd.json_normalize(data_receber, record_path=['itens'])
-        else:
-            df_receber = pd.DataFrame()
-
-        # 2. Carregar Clientes
-        url_clientes = "https://api.flow2.com.br/v1/clientes?DesabilitarPaginacao=true"
-        response_clientes = requests.get(url_clientes, headers=headers, timeout=30)
-        response_clientes.raise_for_status()
-        data_clientes = response_clientes.json()
-
-        # Normaliza os clientes
-        if 'itens' in data_clientes and data_clientes['itens']:
-            df_clientes = pd.json_normalize(data_clientes, record_path=['itens'])
-            df_clientes = df_clientes.rename(columns={
-                "id": "idCliente", 
-                "nomeRazaoSocial": "Cliente"
-            })
-            df_clientes = df_clientes[['idCliente', 'Cliente']] 
-        else:
-            df_clientes = pd.DataFrame(columns=['idCliente', 'Cliente'])
-
-        # 3. Juntar as tabelas
-        if not df_receber.empty:
-            if 'idCliente' not in df_receber.columns:
-                df_receber['idCliente'] = None
-                 
-            if not df_clientes.empty:
-                df_final = pd.merge(df_receber, df_clientes, on="idCliente", how="left")
-            else:
-                df_final = df_receber
-            
-            df_final['Cliente'] = df_final.get('Cliente', 'Cliente não informado').fillna('Cliente não informado')
-        else:
-            df_final = pd.DataFrame()
-
-        return df_final
-
+        return obter_receber(api_token)
     except Exception as e:
         st.error(f"Erro ao carregar dados de contas a receber: {e}")
         return pd.DataFrame()
 
+def mostrar_idade_snapshot(nome, api_token):
+    """
+    Mostra há quanto tempo os dados exibidos foram buscados na Flow2.
+    """
+    chave = chave_snapshot(nome, api_token)
+    idade = idade_snapshot(chave)
+    if idade is None:
+        return
+    if idade < 60:
+        texto = f"{int(idade)} s"
+    else:
+        texto = f"{int(idade // 60)} min"
+    erro = erro_snapshot(chave)
+    if erro:
+        st.caption(f"🕒 Dados de {texto} atrás · ⚠️ última atualização falhou: {erro}")
+    else:
+        st.caption(f"🕒 Dados de {texto} atrás")
+
+def carregar_dados(api_token):
+    """
+    Executa os dois loaders ao mesmo tempo, de modo que as quatro chamadas
+    à Flow2 rodem em paralelo na carga inicial.
+    """
+    ctx = get_script_run_ctx()
+
+    def executar(loader):
+        # Propaga o contexto do Streamlit para que st.error funcione na thread
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return loader(api_token)
+
+    # Cada thread leva uma cópia do contexto, para as etapas ficarem na execução atual
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futuro_bancario = pool.submit(contextvars.copy_context().run, executar, load_movimentos_e_saldos)
+        futuro_receber = pool.submit(contextvars.copy_context().run, executar, load_receber_e_clientes)
+        return futuro_bancario.result(), futuro_receber.result()
+
+def mostrar_instrumentacao(execucao):
+    """
+    Painel de debug: etapas desta execução, últimas cargas da Flow2 e
+    acumulado do processo. A memória é a variação do RSS do processo (ou do
+    tracemalloc), então etapas simultâneas em threads se sobrepõem.
+    """
+    with st.expander("⏱️ Instrumentação (tempo e memória por etapa)"):
+        colunas = ['etapa', 'segundos', 'linhas', 'memoria_mb', 'thread']
+        df_execucao = pd.DataFrame(registros(execucao), columns=colunas + ['seq'])
+        st.caption(f"Esta execução (#{execucao})")
+        st.dataframe(df_execucao[colunas], use_container_width=True)
+
+        st.caption("Últimas cargas da Flow2 (inclui atualizações em background)")
+        df_cargas = pd.DataFrame(ultimas_por_etapa(["carga."]), columns=colunas + ['em'])
+        df_cargas['em'] = pd.to_datetime(df_cargas['em'], unit='s')
+        st.dataframe(df_cargas, use_container_width=True)
+
+        cache = estatisticas()
+        st.caption(
+            f"Snapshots em memória: {cache['snapshots']} ({cache['bytes'] / 1024 ** 2:.1f} MB de "
+            f"{cache['orcamento_bytes'] / 1024 ** 2:.0f} MB) · {cache['acertos']} acertos · "
+            f"{cache['faltas']} faltas · {cache['revalidacoes']} revalidações sem mudança · "
+            f"{cache['despejos']} despejos"
+        )
+        derivados = ocupacao()
+        st.caption(
+            f"Derivados dos snapshots: {derivados['entradas']} ({derivados['bytes'] / 1024 ** 2:.1f} MB de "
+            f"{derivados['orcamento_bytes'] / 1024 ** 2:.0f} MB) · {derivados['descartes']} descartes"
+        )
+
+        st.caption("Acumulado do processo")
+        df_totais = pd.DataFrame.from_dict(totais(), orient='index')
+        st.dataframe(df_totais, use_container_width=True)
+
+        st.download_button(
+            "⬇️ Exportar registros (JSON lines)",
+            "\n".join(json.dumps(r, ensure_ascii=False) for r in registros()),
+            file_name="flow2_metricas.jsonl",
+            mime="application/x-ndjson",
+        )
+
 # --- Início da Interface ---
 
+execucao = iniciar_execucao()
+inicio_execucao = time.perf_counter()
+
+# Exportação das métricas (FLOW2_METRICAS_PORTA) com os contadores dos snapshots
+registrar_contadores("flow2_snapshot", estatisticas)
+iniciar_servidor_metricas()
+
 st.title("📊 APLICAÇÃO FINANCEIRA")
 
 # Cria as Abas principais
 tab_bancario, tab_receber = st.tabs(["🏦 Controle Bancário", "🧾 Contas a Receber"])
 
+with etapa("tela.carregar_dados"):
+    (df_saldos, df_diario, df_curva_saldos), df_receber_raw = carregar_dados(API_TOKEN)
+
 # --- ABA 1: CONTROLE BANCÁRIO ---
-with tab_bancario:
-    
-    df_movimentos, df_saldos = load_movimentos_e_saldos(API_TOKEN)
+def listar_bancos(df):
+    return df['Banco'].dropna().unique().tolist()
+
+def grafico_saldos(df_curva):
+    """
+    Curva de saldos em reais, uma coluna por banco.
+    """
+    return df_curva.pivot(index='Data', columns='Banco', values='Saldo') / 100
+
+# Cada aba é um fragmento: mexer nos filtros de uma aba reexecuta só ela
+@st.fragment
+def aba_bancario(df_diario, df_saldos, df_curva_saldos):
+    """
+    Filtros, métricas, extrato e saldos do controle bancário. Filtros, KPIs
+    e extrato trabalham sobre o rollup diário, não sobre os movimentos; a
+    evolução dos saldos vem da curva pré-calculada na carga.
+    """
+    mostrar_idade_snapshot("bancario", API_TOKEN)
 
-    if df_movimentos.empty and df_saldos.empty:
+    if HISTORICO:
+        # Movimentos no histórico SQLite: só o período selecionado é consultado
+        min_date, max_date = limites_movimentos(API_TOKEN)
+        tem_movimentos = min_date is not None
+    else:
+        tem_movimentos = not df_diario.empty
+
+    if not tem_movimentos and df_saldos.empty:
         st.info("📭 Nenhum dado bancário disponível no momento")
     else:
         st.subheader("🔧 Filtros")
         col1, col2 = st.columns([1, 2])
 
         with col1:
-            if not df_movimentos.empty and 'Data' in df_movimentos.columns:
-                min_date = df_movimentos['Data'].min()
-                max_date = df_movimentos['Data'].max()
-                if pd.isna(min_date): min_date = date.today()
-                if pd.isna(max_date): max_date = date.today()
+            if HISTORICO and tem_movimentos:
+                # Abre nos últimos JANELA_HISTORICO_DIAS, mas permite navegar por todo o histórico
+                inicio_padrao = max(min_date, max_date - timedelta(days=JANELA_HISTORICO_DIAS))
+                date_range = st.date_input(
+                    "📅 Período", [inicio_padrao, max_date], min_value=min_date, max_value=max_date, key="tab1_date"
+                )
+            elif not df_diario.empty and 'Data' in df_diario.columns:
+                min_date, max_date = derivado(
+                    df_diario, "limites_data", lambda df: (df['Data'].min(), df['Data'].max())
+                )
+                min_date = date.today() if pd.isna(min_date) else min_date.date()
+                max_date = date.today() if pd.isna(max_date) else max_date.date()
                 date_range = st.date_input("📅 Período", [min_date, max_date], key="tab1_date")
             else:
                 date_range = [date.today(), date.today()]
 
         with col2:
             bancos = []
-            if not df_movimentos.empty and 'Banco' in df_movimentos.columns:
-                bancos.extend(df_movimentos['Banco'].dropna().unique().tolist())
+            if HISTORICO:
+                bancos.extend(bancos_movimentos(API_TOKEN))
+            elif not df_diario.empty and 'Banco' in df_diario.columns:
+                bancos.extend(derivado(df_diario, "bancos", listar_bancos))
             if not df_saldos.empty and 'Banco' in df_saldos.columns:
-                bancos.extend(df_saldos['Banco'].dropna().unique().tolist())
+                bancos.extend(derivado(df_saldos, "bancos", listar_bancos))
             bancos = sorted(list(set(bancos)))
             bancos_selecionados = st.multiselect("🏦 Bancos", bancos, default=bancos, key="tab1_banks")
 
         # Aplicar filtros
-        if not df_movimentos.empty:
-            df_filtrado = df_movimentos[
-                (df_movimentos['Data'].between(date_range[0], date_range[1])) &
-                (df_movimentos['Banco'].isin(bancos_selecionados))
-            ] if 'Data' in df_movimentos.columns else df_movimentos
-        else:
-            df_filtrado = df_movimentos
+        with etapa("tela.bancario.filtrar") as medida:
+            if HISTORICO:
+                # Filtro e agrupamento do extrato numa consulta só; as somas
+                # dos KPIs saem do extrato (tem as mesmas colunas de totais)
+                df_filtrado = extrato(API_TOKEN, date_range[0], date_range[1], bancos_selecionados)
+            elif not df_diario.empty:
+                df_filtrado = filtrar_movimentos(
+                    df_diario, date_range[0], date_range[1], bancos_selecionados
+                ) if 'Data' in df_diario.columns else df_diario
+            else:
+                df_filtrado = df_diario
+            medida["linhas"] = len(df_filtrado)
 
         # KPIs
         st.divider()
         st.subheader("📈 Métricas")
 
         if not df_filtrado.empty:
-            entradas = df_filtrado[~df_filtrado['Operacao'].str.contains('-', na=False)]['Valor'].sum()
-            saidas = df_filtrado[df_filtrado['Operacao'].str.contains('-', na=False)]['Valor'].sum()
+            entradas, saidas = derivado(
+                df_filtrado, "kpis", lambda df: (df['Total Entradas'].sum(), df['Total Saídas'].sum())
+            )
             saldo = entradas - saidas
         else:
             entradas = saidas = saldo = 0
 
+        # Valores em centavos
         col1, col2, col3 = st.columns(3)
-        col1.metric("💰 Entradas", format_brl(entradas))
-        col2.metric("💸 Saídas", format_brl(saidas), delta=format_brl(-saidas), delta_color="inverse")
-        col3.metric("💳 Saldo", format_brl(saldo))
+        col1.metric("💰 Entradas", format_brl(entradas / 100))
+        col2.metric("💸 Saídas", format_brl(saidas / 100), delta=format_brl(-saidas / 100), delta_color="inverse")
+        col3.metric("💳 Saldo", format_brl(saldo / 100))
 
         # Tabelas
         st.divider()
@@ -389,35 +408,42 @@ with tab_bancario:
         with col1:
             st.subheader("📋 Extratos Bancários")
             if not df_filtrado.empty:
-                # Preparar dados para exibição
-                df_display = df_filtrado.copy()
-                df_display['Total Entradas'] = df_display.apply(
-                    lambda row: row['Valor'] if '-' not in str(row['Operacao']) else 0, axis=1
-                )
-                df_display['Total Saídas'] = df_display.apply(
-                    lambda row: row['Valor'] if '-' in str(row['Operacao']) else 0, axis=1
-                )
-                
-                df_grouped = df_display.groupby(['Data', 'Descricao']).agg({
-                    'Total Entradas': 'sum', 'Total Saídas': 'sum'
-                }).reset_index()
-                
-                df_grouped = df_grouped[(df_grouped['Total Entradas'] != 0) | (df_grouped['Total Saídas'] != 0)]
-                df_grouped = df_grouped.sort_values('Data', ascending=False)
-                
-                # Formatar para HTML
-                df_formatted = df_grouped.copy()
-                df_formatted['Data'] = pd.to_datetime(df_formatted['Data']).dt.strftime('%d/%m/%Y')
-                df_formatted['Total Entradas'] = df_formatted['Total Entradas'].apply(
-                    lambda x: format_brl(x) if x > 0 else ""
-                )
-                df_formatted['Total Saídas'] = df_formatted['Total Saídas'].apply(
-                    lambda x: f"<span style='color:red; font-weight:bold;'>{format_brl(x)}</span>" if x > 0 else ""
+                # Agrupamento (só soma os bancos de cada dia no rollup) e
+                # ordenações memoizados por resultado de filtro
+                with etapa("tela.bancario.agrupar_extrato") as medida:
+                    if HISTORICO:
+                        df_grouped = df_filtrado
+                    else:
+                        df_grouped = derivado(df_filtrado, "extrato", agrupar_extrato)
+                    medida["linhas"] = len(df_grouped)
+
+                # Ordenação e paginação: só a página visível é formatada
+                col_ordem, col_tamanho, col_pagina = st.columns([2, 1, 1])
+                ordem = col_ordem.selectbox("Ordenar por", list(ORDENACOES_EXTRATO), key="tab1_extrato_ordem")
+                tamanho_pagina = col_tamanho.selectbox("Linhas por página", TAMANHOS_PAGINA_EXTRATO, key="tab1_extrato_tamanho")
+
+                total_paginas = max(1, -(-len(df_grouped) // tamanho_pagina))
+                if st.session_state.get("tab1_extrato_pagina", 1) > total_paginas:
+                    st.session_state["tab1_extrato_pagina"] = total_paginas
+                pagina = col_pagina.number_input(
+                    "Página", min_value=1, max_value=total_paginas, step=1, key="tab1_extrato_pagina"
                 )
-                df_formatted = df_formatted.rename(columns={'Descricao': 'Descrição'})
-                
-                html_table = df_formatted.to_html(escape=False, index=False, classes="extratos-table")
+
+                coluna_ordem, crescente = ORDENACOES_EXTRATO[ordem]
+                with etapa("tela.bancario.ordenar_paginar", linhas=len(df_grouped)):
+                    df_grouped = derivado(
+                        df_grouped, ("ordenado", ordem),
+                        lambda df: df.sort_values(coluna_ordem, ascending=crescente),
+                    )
+                    inicio = (pagina - 1) * tamanho_pagina
+                    df_pagina = df_grouped.iloc[inicio:inicio + tamanho_pagina]
+
+                with etapa("tela.bancario.render_html", linhas=len(df_pagina)):
+                    html_table = formatar_extrato_html(df_pagina)
                 st.markdown(f'<div class="extratos-table-container">{html_table}</div>', unsafe_allow_html=True)
+                st.caption(
+                    f"Página {pagina} de {total_paginas} · linhas {inicio + 1}–{inicio + len(df_pagina)} de {len(df_grouped)}"
+                )
             else:
                 st.info("Nenhum movimento encontrado para os filtros selecionados")
 
@@ -426,9 +452,11 @@ with tab_bancario:
             if not df_saldos.empty:
                 df_saldos_filtrado = df_saldos[df_saldos['Banco'].isin(bancos_selecionados)]
                 if not df_saldos_filtrado.empty:
-                    total_saldo = df_saldos_filtrado['Saldo dos bancos'].sum()
-                    df_display_saldos = df_saldos_filtrado.copy()
-                    df_display_saldos['Saldo dos bancos'] = df_display_saldos['Saldo dos bancos'].apply(format_brl)
+                    total_saldo = df_saldos_filtrado['Saldo dos bancos'].sum() / 100
+                    df_display_saldos = df_saldos_filtrado.assign(**{
+                        'Banco': df_saldos_filtrado['Banco'].astype(str),
+                        'Saldo dos bancos': formatar_brl_centavos(df_saldos_filtrado['Saldo dos bancos']),
+                    })
                     
                     # Adicionar linha de total
                     total_row = pd.DataFrame([{'Banco': 'TOTAL', 'Saldo dos bancos': format_brl(total_saldo)}])
@@ -440,75 +468,67 @@ with tab_bancario:
             else:
                 st.info("Nenhum saldo disponível")
 
+            # Evolução dos saldos no período (fim de dia, por banco)
+            if not df_curva_saldos.empty and len(date_range) == 2:
+                df_curva = filtrar_movimentos(df_curva_saldos, date_range[0], date_range[1], bancos_selecionados)
+                if not df_curva.empty:
+                    st.caption("📉 Saldo de fim de dia")
+                    st.line_chart(derivado(df_curva, "grafico", grafico_saldos), y_label="R$")
+
+with tab_bancario:
+    aba_bancario(df_diario, df_saldos, df_curva_saldos)
+
 # --- ABA 2: CONTAS A RECEBER ---
-with tab_receber:
-    
-    df_receber_raw = load_receber_e_clientes(API_TOKEN)
+def resumo_aging(df_fatia):
+    """
+    Títulos e valor em aberto por faixa de atraso (todas as faixas, mesmo vazias).
+    """
+    resumo = df_fatia.groupby('Faixa', observed=False)[['Quantidade', 'Valor']].sum().drop(index='Baixado')
+    return pd.DataFrame({
+        'Faixa': resumo.index.astype(str),
+        'Títulos': resumo['Quantidade'].to_numpy(),
+        'Valor': formatar_brl_centavos(resumo['Valor']).to_numpy(),
+    })
+
+def fluxo_semanal(df_fatia):
+    """
+    Entradas previstas (títulos a vencer) por semana e cliente, em reais;
+    fora os maiores clientes, o restante é somado em "Outros".
+    """
+    previstos = df_fatia[df_fatia['Faixa'] == FAIXAS_ATRASO[0]]
+    por_cliente = previstos.groupby(['Semana', 'Cliente'], observed=True)['Valor'].sum()
+    principais = por_cliente.groupby(level='Cliente', observed=True).sum().nlargest(MAX_CLIENTES_FLUXO).index
+    clientes = por_cliente.index.get_level_values('Cliente')
+    rotulos = pd.Index(clientes.astype(str).where(clientes.isin(principais), "Outros"), name='Cliente')
+    semanas = por_cliente.index.get_level_values('Semana')
+    return por_cliente.groupby([semanas, rotulos]).sum().unstack(fill_value=0) / 100
+
+@st.fragment
+def aba_receber(df_receber_raw):
+    """
+    Filtros, métricas e detalhe das contas a receber.
+    """
+    mostrar_idade_snapshot("receber", API_TOKEN)
 
     if df_receber_raw.empty:
         st.info("📭 Nenhuma conta a receber encontrada")
     else:
-        try:
-            # Preprocessamento dos dados COM CORREÇÃO DE FUSO
-            df_receber = df_receber_raw.copy()
-            
-            # CORREÇÃO DO FUSO HORÁRIO - APLICAR EM TODAS AS COLUNAS DE DATA
-            colunas_data = ['dataVencimentoNominal', 'dataVencimentoReal', 'dataBaixa', 'dataCredito']
-            
-            for coluna in colunas_data:
-                if coluna in df_receber.columns:
-                    # Aplica correção de fuso horário
-                    df_receber[coluna] = df_receber[coluna].apply(corrigir_fuso_horario)
-            
-            # TRATAMENTO ROBUSTO DE DATAS
-            def get_data_vencimento(row):
-                # Tenta dataVencimentoNominal primeiro (já corrigida)
-                nominal = row.get('dataVencimentoNominal')
-                if pd.notna(nominal) and nominal != '' and nominal != 'NaT':
-                    return nominal
-                # Fallback para dataVencimentoReal (já corrigida)
-                real = row.get('dataVencimentoReal')
-                if pd.notna(real) and real != '' and real != 'NaT':
-                    return real
-                return pd.NaT
-            
-            df_receber['dataVencimentoFinal'] = df_receber.apply(get_data_vencimento, axis=1)
-            
-            # Converter para datetime - AGORA SEM PROBLEMAS DE FUSO
-            df_receber['dataVencimentoReal'] = pd.to_datetime(
-                df_receber['dataVencimentoFinal'], 
-                errors='coerce',
-                utc=False  # Não usar UTC para evitar problemas de fuso
-            )
-            
-            # Outras datas (já corrigidas do fuso)
-            df_receber['dataBaixa'] = pd.to_datetime(df_receber.get('dataBaixa'), errors='coerce', utc=False)
-            df_receber['dataCredito'] = pd.to_datetime(df_receber.get('dataCredito'), errors='coerce', utc=False)
-            
-            # Valor
-            df_receber['Valor'] = pd.to_numeric(df_receber.get('valorBruto', 0), errors='coerce').fillna(0).abs()
-            
-            # Status
-            df_receber['Status'] = df_receber.apply(get_status, axis=1)
-            
-            # Colunas de exibição - TRATAMENTO SIMPLIFICADO
-            df_receber['Vencimento'] = df_receber['dataVencimentoReal'].dt.date
-            df_receber['Recebido em'] = df_receber['dataBaixa'].dt.date
-            df_receber['Nº projeto'] = df_receber.get('codigoProjeto', 'N/A')
-            
-            # Limpeza final - garantir que não há NaT nas colunas de exibição
-            df_receber['Vencimento'] = df_receber['Vencimento'].apply(
-                lambda x: x if not pd.isna(x) else None
-            )
-            df_receber['Recebido em'] = df_receber['Recebido em'].apply(
-                lambda x: x if not pd.isna(x) else None
-            )
-            
-        except Exception as e:
-            st.error(f"❌ Erro no processamento dos dados: {e}")
-            st.info("📋 Dados brutos para análise:")
-            st.dataframe(df_receber_raw.head(10))
-            st.stop()
+        if HISTORICO:
+            # Títulos no histórico SQLite: filtros e somas viram consultas
+            # e só o período selecionado é carregado
+            df_receber = pd.DataFrame(columns=COLUNAS_DETALHE_RECEBER)
+        else:
+            try:
+                # Preprocessamento vetorizado (fuso, vencimento, status e colunas de exibição),
+                # feito uma vez por snapshot e por dia
+                with etapa("tela.receber.preprocessar", linhas=len(df_receber_raw)):
+                    df_receber = derivado(df_receber_raw, "preprocessado", preprocessar_receber, versao=date.today())
+                
+            except Exception as e:
+                st.error(f"❌ Erro no processamento dos dados: {e}")
+                st.info("📋 Dados brutos para análise:")
+                st.dataframe(df_receber_raw.head(10))
+                st.stop()
 
         # Filtros
         st.subheader("🔧 Filtros")
@@ -516,7 +536,10 @@ with tab_receber:
 
         with col1:
             if 'Status' in df_receber.columns:
-                status_opcoes = df_receber['Status'].unique().tolist()
+                if HISTORICO:
+                    status_opcoes = status_receber(API_TOKEN, date.today())
+                else:
+                    status_opcoes = derivado(df_receber, "status_opcoes", lambda df: df['Status'].unique().tolist())
                 status_selecionados = st.multiselect(
                     "📊 Status", 
                     status_opcoes, 
@@ -534,12 +557,17 @@ with tab_receber:
             
             if 'Vencimento' in df_receber.columns:
                 try:
-                    # Filtrar apenas valores válidos (não nulos)
-                    datas_validas = df_receber['Vencimento'].dropna()
+                    # Limites só dos valores válidos (min/max ignoram NaT), uma vez por snapshot
+                    if HISTORICO:
+                        primeira, ultima = map(pd.Timestamp, limites_receber(API_TOKEN))
+                    else:
+                        primeira, ultima = derivado(
+                            df_receber, "limites_vencimento", lambda df: (df['Vencimento'].min(), df['Vencimento'].max())
+                        )
                     
-                    if not datas_validas.empty:
-                        min_venc = datas_validas.min()
-                        max_venc = datas_validas.max()
+                    if pd.notna(primeira):
+                        min_venc = primeira.date()
+                        max_venc = ultima.date()
                     else:
                         min_venc = date.today()
                         max_venc = date.today()
@@ -555,82 +583,94 @@ with tab_receber:
                 key="tab2_date"
             )
 
-        # Aplicar filtros
-        df_filtrado = df_receber.copy()
-        
-        if 'Status' in df_receber.columns and status_selecionados:
-            df_filtrado = df_filtrado[df_filtrado['Status'].isin(status_selecionados)]
-            
-        if 'Vencimento' in df_receber.columns:
-            try:
-                # Filtro seguro para datas
-                df_filtrado = df_filtrado[
-                    (df_filtrado['Vencimento'].notna()) &
-                    (df_filtrado['Vencimento'] >= periodo[0]) &
-                    (df_filtrado['Vencimento'] <= periodo[1])
-                ]
-            except Exception as e:
-                st.error(f"Erro ao filtrar por data: {e}")
+        # Aplicar filtros (índice por vencimento, memoizado por snapshot)
+        try:
+            with etapa("tela.receber.filtrar") as medida:
+                if HISTORICO:
+                    df_filtrado = consultar_receber(API_TOKEN, periodo[0], periodo[1], status_selecionados, date.today())
+                else:
+                    df_filtrado = filtrar_receber(df_receber, periodo[0], periodo[1], status_selecionados)
+                medida["linhas"] = len(df_filtrado)
+        except Exception as e:
+            st.error(f"Erro ao filtrar por data: {e}")
+            df_filtrado = df_receber[df_receber['Status'].isin(status_selecionados)] if status_selecionados else df_receber
 
         # KPIs
         st.divider()
         st.subheader("📈 Métricas")
 
-        total_receber = df_filtrado[df_filtrado['Status'] != 'Baixado']['Valor'].sum() if 'Status' in df_filtrado.columns else 0
-        total_vencido = df_filtrado[df_filtrado['Status'] == 'Vencido']['Valor'].sum() if 'Status' in df_filtrado.columns else 0
+        total_receber, total_vencido = derivado(df_filtrado, "kpis", totais_receber)
         
         # Recebido este mês (ignora filtros)
         recebido_mes = 0
-        if 'Recebido em' in df_receber.columns and 'Valor' in df_receber.columns:
+        if HISTORICO:
+            recebido_mes = recebido_no_mes(API_TOKEN, date.today())
+        elif 'Recebido em' in df_receber.columns and 'Valor' in df_receber.columns:
             hoje = date.today()
             try:
-                recebido_mes_df = df_receber[
-                    (df_receber['Recebido em'].notna()) &
-                    (df_receber['Recebido em'] >= date(hoje.year, hoje.month, 1)) &
-                    (df_receber['Recebido em'] <= hoje)
-                ]
-                recebido_mes = recebido_mes_df['Valor'].sum()
+                recebido_mes = derivado(
+                    df_receber, "recebido_mes", lambda df: recebido_entre(df, hoje.replace(day=1), hoje), versao=hoje
+                )
             except Exception:
                 recebido_mes = 0
 
+        # Valores em centavos
         col1, col2, col3 = st.columns(3)
-        col1.metric("💰 A Receber", format_brl(total_receber))
-        col2.metric("⚠️ Vencido", format_brl(total_vencido))
-        col3.metric("✅ Recebido Mês", format_brl(recebido_mes))
+        col1.metric("💰 A Receber", format_brl(total_receber / 100))
+        col2.metric("⚠️ Vencido", format_brl(total_vencido / 100))
+        col3.metric("✅ Recebido Mês", format_brl(recebido_mes / 100))
 
         # Tabela principal - FORMATAÇÃO SEGURA
         st.divider()
         st.subheader("📋 Detalhe de Contas a Receber")
         
-        colunas_exibir = ['Cliente', 'Nº projeto', 'Vencimento', 'Recebido em', 'Status', 'Valor']
-        colunas_disponiveis = [col for col in colunas_exibir if col in df_filtrado.columns]
+        with etapa("tela.receber.formatar_tabela", linhas=len(df_filtrado)):
+            df_display = derivado(df_filtrado, "detalhe", montar_detalhe_receber)
         
-        if colunas_disponiveis:
-            df_display = df_filtrado[colunas_disponiveis].copy()
-            
-            # Formatar colunas - MÉTODO SEGURO
-            if 'Valor' in df_display.columns:
-                df_display['Valor Parcela'] = df_display['Valor'].apply(format_brl)
-                df_display = df_display.drop('Valor', axis=1)
-            
-            # Formatação segura de datas
-            if 'Vencimento' in df_display.columns:
-                df_display['Vencimento'] = df_display['Vencimento'].apply(
-                    lambda x: x.strftime('%d/%m/%Y') if x and not pd.isna(x) else ''
-                )
-            
-            if 'Recebido em' in df_display.columns:
-                df_display['Recebido em'] = df_display['Recebido em'].apply(
-                    lambda x: x.strftime('%d/%m/%Y') if x and not pd.isna(x) else ''
-                )
-            
-            st.dataframe(df_display, use_container_width=True, height=400)
+        if df_display is not None:
+            with etapa("tela.receber.exibir_tabela", linhas=len(df_display)):
+                st.dataframe(df_display, use_container_width=True, height=400)
             
             # Estatísticas
-            st.info(f"📊 Mostrando {len(df_display)} de {len(df_receber)} registros")
+            total_registros = contar_receber(API_TOKEN) if HISTORICO else len(df_receber)
+            st.info(f"📊 Mostrando {len(df_display)} de {total_registros} registros")
         else:
             st.warning("Nenhuma coluna disponível para exibição")
 
+        # Aging e fluxo projetado: cubo (semana, faixa, cliente, status) montado
+        # uma vez por snapshot e fatiado pelos mesmos filtros
+        st.divider()
+        st.subheader("⏳ Aging e Fluxo Projetado")
+        if len(periodo) == 2 and 'Status' in df_receber.columns:
+            hoje = date.today()
+            with etapa("tela.receber.cubo") as medida:
+                if HISTORICO:
+                    df_cubo = cubo_receber(API_TOKEN, hoje)
+                else:
+                    df_cubo = derivado(df_receber, "cubo", lambda df: montar_cubo_receber(df, hoje), versao=hoje)
+                df_fatia = fatiar_cubo(df_cubo, periodo[0], periodo[1], status_selecionados)
+                medida["linhas"] = len(df_fatia)
+
+            st.caption("Semanas (segunda a domingo) que tocam o período selecionado")
+            col1, col2 = st.columns([1, 2])
+            with col1:
+                st.dataframe(derivado(df_fatia, "aging", resumo_aging), use_container_width=True, hide_index=True)
+            with col2:
+                df_fluxo = derivado(df_fatia, "fluxo", fluxo_semanal)
+                if df_fluxo.empty:
+                    st.info("Nenhuma entrada prevista para os filtros selecionados")
+                else:
+                    st.bar_chart(df_fluxo, y_label="R$")
+
         # Dados brutos para debug
         with st.expander("🔍 Dados Brutos (Primeiros 10)"):
             st.dataframe(df_receber_raw.head(10))
+
+with tab_receber:
+    aba_receber(df_receber_raw)
+
+# Instrumentação desta execução (FLOW2_INSTRUMENTACAO=0 esconde o painel)
+registrar("tela.total", time.perf_counter() - inicio_execucao)
+if INSTRUMENTACAO:
+    with tab_receber:
+        mostrar_instrumentacao(execucao)
@@ -0,0 +1,276 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Diretório local onde ficam os dados sincronizados (um arquivo Parquet por frame e empresa)
+CACHE_DIR = os.environ.get("FLOW2_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# Data inicial da primeira sincronização completa
+DATA_INICIAL = "2025-01-01"
+
+# Versão do formato dos stores; mudar força uma sincronização completa
+VERSAO_STORE = 5
+
+# Idade máxima (segundos) de um frame do cache em disco antes de buscar de novo
+CACHE_TTL = int(os.environ.get("FLOW2_CACHE_TTL", "600"))
+
+# Validade do diretório de clientes, que muda bem menos que os títulos (segundos)
+CLIENTES_TTL = int(os.environ.get("FLOW2_CLIENTES_TTL", "21600"))
+
+# Chave dos metadados da carga gravados no rodapé do Parquet
+CHAVE_METADADOS = b"flow2"
+
+# Versão do registro de saldos (CSV só de acréscimos, sem cabeçalho)
+VERSAO_REGISTRO_SALDOS = 1
+COLUNAS_REGISTRO_SALDOS = ['Registrado em', 'Banco', 'Saldo dos bancos']
+
+# Dias re-buscados antes da marca d'água para capturar edições tardias
+OVERLAP_DIAS = int(os.environ.get("FLOW2_SYNC_OVERLAP_DIAS", "7"))
+
+_lock_registro = threading.Lock()
+_ultimos_saldos = {}
+_registros_lidos = {}
+
+
+def tenant_id(api_token):
+    """
+    Gera um identificador estável para a empresa sem expor o token.
+    """
+    return hashlib.sha256(str(api_token).encode("utf-8")).hexdigest()[:16]
+
+
+def _caminho_frame(api_token, nome):
+    return os.path.join(CACHE_DIR, f"{nome}_v{VERSAO_STORE}_{tenant_id(api_token)}.parquet")
+
+
+def salvar_frame(api_token, nome, df):
+    """
+    Grava um DataFrame normalizado em Parquet com os metadados da carga
+    (empresa, horário da busca e número de linhas). A escrita é atômica, então
+    outros processos nunca leem um arquivo pela metade.
+    Retorna False se o frame não puder ser representado em Parquet.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    caminho = _caminho_frame(api_token, nome)
+    tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    metadados = {
+        "tenant": tenant_id(api_token),
+        "nome": nome,
+        "buscado_em": time.time(),
+        "linhas": len(df),
+    }
+    try:
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        tabela = tabela.replace_schema_metadata({
+            **(tabela.schema.metadata or {}),
+            CHAVE_METADADOS: json.dumps(metadados).encode("utf-8"),
+        })
+        pq.write_table(tabela, tmp)
+        os.replace(tmp, caminho)
+        return True
+    except (pa.ArrowException, ValueError, TypeError, OSError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+
+
+def ler_metadados(api_token, nome):
+    """
+    Lê só o rodapé do Parquet e retorna os metadados da carga (ou None).
+    """
+    caminho = _caminho_frame(api_token, nome)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        metadados = pq.read_schema(caminho).metadata or {}
+        return json.loads(metadados[CHAVE_METADADOS])
+    except Exception:
+        return None
+
+
+def carregar_frame(api_token, nome):
+    """
+    Lê um frame do cache em disco. Retorna (df, metadados) ou (None, None).
+    """
+    caminho = _caminho_frame(api_token, nome)
+    if not os.path.exists(caminho):
+        return None, None
+    try:
+        tabela = pq.read_table(caminho)
+        metadados = json.loads((tabela.schema.metadata or {})[CHAVE_METADADOS])
+        return tabela.to_pandas(), metadados
+    except Exception:
+        # Arquivo corrompido ou de outra versão: trata como ausente
+        return None, None
+
+
+def frame_fresco(metadados, ttl=None):
+    """
+    Indica se a carga descrita pelos metadados ainda está dentro do TTL.
+    """
+    if not metadados:
+        return False
+    ttl = CACHE_TTL if ttl is None else ttl
+    return time.time() - metadados.get("buscado_em", 0) < ttl
+
+
+def carregar_frames_frescos(api_token, nomes, ttl=None):
+    """
+    Retorna (frames, buscado_em do mais antigo) do cache em disco se todos
+    estiverem dentro do TTL; caso contrário None (é preciso buscar na API).
+    """
+    if not all(frame_fresco(ler_metadados(api_token, nome), ttl) for nome in nomes):
+        return None
+    return carregar_ultima_copia(api_token, nomes)
+
+
+def carregar_ultima_copia(api_token, nomes):
+    """
+    Última cópia gravada dos frames, qualquer que seja a idade. Retorna
+    (frames, buscado_em do mais antigo) ou None se algum não existir.
+    """
+    frames = []
+    buscado_em = None
+    for nome in nomes:
+        df, metadados = carregar_frame(api_token, nome)
+        if df is None:
+            return None
+        frames.append(df)
+        buscado_em = min(buscado_em or metadados["buscado_em"], metadados["buscado_em"])
+    return frames, buscado_em
+
+
+def _caminho_registro_saldos(api_token):
+    return os.path.join(CACHE_DIR, f"registro_saldos_v{VERSAO_REGISTRO_SALDOS}_{tenant_id(api_token)}.csv")
+
+
+def registrar_saldos(api_token, df_saldos, registrado_em=None):
+    """
+    Acrescenta os saldos de uma busca em saldoBancos ao registro da empresa
+    (uma linha por banco). Cada busca vai numa única escrita em modo append,
+    então processos concorrentes não intercalam linhas; saldos iguais aos
+    últimos que este processo registrou no mesmo dia não são repetidos.
+    """
+    if df_saldos.empty:
+        return False
+    registrado_em = registrado_em or datetime.now()
+    saldos = tuple(zip(df_saldos['Banco'].astype(str), df_saldos['Saldo dos bancos'].astype('int64').tolist()))
+    chave = tenant_id(api_token)
+    with _lock_registro:
+        if _ultimos_saldos.get(chave) == (registrado_em.date(), saldos):
+            return False
+        _ultimos_saldos[chave] = (registrado_em.date(), saldos)
+
+    linhas = io.StringIO()
+    momento = registrado_em.isoformat(timespec="seconds")
+    csv.writer(linhas, lineterminator="\n").writerows((momento, banco, saldo) for banco, saldo in saldos)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd = os.open(_caminho_registro_saldos(api_token), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, linhas.getvalue().encode("utf-8"))
+        finally:
+            os.close(fd)
+        return True
+    except OSError:
+        return False
+
+
+def carregar_registro_saldos(api_token):
+    """
+    Saldos registrados da empresa, compactados no último registro de cada
+    dia e banco (o que a curva usa), em ordem de registro (Registrado em /
+    Banco / Saldo dos bancos em centavos). O registro em disco continua só
+    de acréscimos; a leitura compactada fica em memória até o arquivo mudar.
+    """
+    caminho = _caminho_registro_saldos(api_token)
+    vazio = pd.DataFrame({
+        'Registrado em': pd.Series(dtype='datetime64[s]'),
+        'Banco': pd.Series(dtype='str'),
+        'Saldo dos bancos': pd.Series(dtype='int64'),
+    })
+    try:
+        estado = os.stat(caminho)
+    except OSError:
+        return vazio
+    assinatura = (estado.st_mtime_ns, estado.st_size)
+    with _lock_registro:
+        lido = _registros_lidos.get(caminho)
+    if lido is not None and lido[0] == assinatura:
+        return lido[1]
+    try:
+        df_registro = pd.read_csv(
+            caminho, header=None, names=COLUNAS_REGISTRO_SALDOS,
+            dtype={'Banco': 'str', 'Saldo dos bancos': 'int64'}, on_bad_lines='skip',
+        )
+        df_registro['Registrado em'] = pd.to_datetime(df_registro['Registrado em'], format='ISO8601')
+    except (OSError, ValueError):
+        return vazio
+    dias = df_registro['Registrado em'].dt.normalize()
+    ultimos = ~pd.DataFrame({'Data': dias, 'Banco': df_registro['Banco']}).duplicated(keep='last')
+    df_registro = df_registro[ultimos].reset_index(drop=True)
+    with _lock_registro:
+        _registros_lidos[caminho] = (assinatura, df_registro)
+    return df_registro
+
+
+def inicio_janela_sync(df_store):
+    """
+    Calcula a data a partir da qual os movimentos devem ser buscados.
+    Sem store (ou sem marca d'água válida) retorna a DATA_INICIAL.
+    """
+    if df_store is None or df_store.empty or 'DataMovimento' not in df_store.columns or 'id' not in df_store.columns:
+        return DATA_INICIAL
+
+    marca_dagua = df_store['DataMovimento'].max()
+    if pd.isna(marca_dagua):
+        return DATA_INICIAL
+
+    inicio = (marca_dagua - timedelta(days=OVERLAP_DIAS)).date()
+    return max(inicio.isoformat(), DATA_INICIAL)
+
+
+def mesclar_movimentos(df_store, df_novos, inicio_janela):
+    """
+    Aplica os movimentos da janela recente sobre o store, usando o id como chave.
+    Registros do store dentro da janela são substituídos pelos da API, o que
+    também remove movimentos excluídos no período.
+    """
+    if df_store is None or df_store.empty or inicio_janela == DATA_INICIAL:
+        return df_novos.reset_index(drop=True)
+    if df_novos.empty:
+        manter = df_store['DataMovimento'].dt.date < pd.Timestamp(inicio_janela).date()
+        return df_store[manter].reset_index(drop=True)
+    if 'id' not in df_novos.columns:
+        return df_novos.reset_index(drop=True)
+
+    manter = (
+        (df_store['DataMovimento'].dt.date < pd.Timestamp(inicio_janela).date()) &
+        (~df_store['id'].isin(df_novos['id']))
+    )
+    df_final = pd.concat([df_store[manter], df_novos], ignore_index=True)
+    return df_final.sort_values('DataMovimento', kind='stable', ignore_index=True)
+
+
+def mesclar_clientes(df_anterior, df_novos):
+    """
+    Atualiza o diretório de clientes pelo idCliente: cadastros novos ou
+    alterados vêm da API e os que sumiram da listagem mantêm o último nome
+    conhecido (títulos antigos ainda os referenciam).
+    """
+    if df_anterior is None or df_anterior.empty:
+        return df_novos.reset_index(drop=True)
+    if df_novos.empty:
+        return df_anterior.reset_index(drop=True)
+    manter = ~df_anterior['idCliente'].isin(df_novos['idCliente'])
+    return pd.concat([df_anterior[manter], df_novos], ignore_index=True)
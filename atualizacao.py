@@ -0,0 +1,375 @@
+import contextvars
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from armazenamento import CACHE_TTL, CLIENTES_TTL
+from flow2_api import inalterado, registrar_requisicoes
+
+# Quantos segundos antes do TTL o snapshot é buscado de novo em background
+ANTECEDENCIA = int(os.environ.get("FLOW2_PREFETCH_ANTECEDENCIA", "60"))
+
+# Intervalo entre atualizações em background de um mesmo snapshot
+INTERVALO = max(CACHE_TTL - ANTECEDENCIA, 1)
+INTERVALO_CLIENTES = max(CLIENTES_TTL - ANTECEDENCIA, 1)
+
+# Espera antes de tentar de novo quando uma atualização falha
+ESPERA_ERRO = int(os.environ.get("FLOW2_PREFETCH_ESPERA_ERRO", "60"))
+
+# Memória total dos snapshots de todos os tenants (0 = sem limite); acima
+# disso os menos usados recentemente são descartados
+ORCAMENTO_MEMORIA = int(os.environ.get("FLOW2_CACHE_MEMORIA_MB", "1024")) * 1024 ** 2
+
+# Snapshots sem leitura por este número de intervalos param de ser
+# atualizados em background e são descartados (tenant que ninguém está vendo)
+INTERVALOS_OCIOSO = int(os.environ.get("FLOW2_INTERVALOS_OCIOSO", "3"))
+
+# Antes de recarregar, confere com GETs condicionais se algo mudou na Flow2
+# (FLOW2_REVALIDAR=0 sempre recarrega)
+REVALIDAR = os.environ.get("FLOW2_REVALIDAR", "1") != "0"
+
+# Na leitura paginada a revalidação confere só a primeira página; depois de
+# tantos intervalos revalidados o snapshot é recarregado por inteiro mesmo
+# assim (pega mudanças nas outras páginas)
+INTERVALOS_REVALIDADO = int(os.environ.get("FLOW2_REVALIDAR_MAX_INTERVALOS", "6"))
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_locks_carga = {}
+_snapshots = OrderedDict()  # do menos para o mais usado recentemente
+_agendados = {}
+_carregadores = {}
+_antecipacoes = {}
+_em_andamento = set()
+_ultimo_uso = {}
+_contadores = {
+    "acertos": 0, "faltas": 0, "atualizacoes": 0, "revalidacoes": 0, "falhas": 0, "reservas": 0, "despejos": 0,
+    "ociosos": 0,
+}
+_versoes = itertools.count(1)
+# Snapshots lidos durante a carga de outro (ex: clientes dentro de receber)
+_dependencias = contextvars.ContextVar("dependencias_snapshot", default=None)
+# Horários de busca informados pelo carregador (dados vindos de uma cópia)
+_buscas = contextvars.ContextVar("buscas_snapshot", default=None)
+
+
+def obter_snapshot(chave, carregar, intervalo=INTERVALO, reserva=None):
+    """
+    Retorna o último snapshot bom de `chave` ({"dados", "buscado_em", "erro"}).
+    Só a primeira carga bloqueia (e propaga a exceção de `carregar`); depois
+    disso as atualizações rodam em background a cada `intervalo` segundos e
+    o snapshot é trocado de uma vez. Os dados são compartilhados entre
+    sessões e não devem ser alterados.
+
+    Se a primeira carga falhar, `reserva()` pode devolver (dados, buscado_em)
+    de uma cópia antiga (ex: o cache em disco vencido), exibida com o erro
+    até a próxima tentativa dar certo.
+
+    `chave` nunca deve conter o token em si, só o hash (armazenamento.tenant_id).
+    """
+    snapshot = _usar(chave)
+    if snapshot is None:
+        with _lock_carga(chave):
+            snapshot = _usar(chave)
+            if snapshot is None:
+                _contar("faltas")
+                snapshot = _primeira_carga(chave, carregar, intervalo, reserva)
+            else:
+                _contar("acertos")
+        _registrar_dependencia(chave, snapshot)
+        return snapshot
+
+    _contar("acertos")
+    if time.time() - snapshot["buscado_em"] >= intervalo and not _agendado(chave):
+        # Timer perdido ou atrasado: atualiza agora, sem bloquear quem pediu
+        _agendar(chave, carregar, intervalo, 0)
+    _registrar_dependencia(chave, snapshot)
+    return snapshot
+
+
+def antecipar(chave, motivo=None):
+    """
+    Agenda a atualização em background do snapshot para agora, fora do
+    intervalo normal. Repetir o mesmo `motivo` não dispara de novo, então
+    uma causa que a atualização não resolve não vira um laço de recargas.
+    """
+    with _lock:
+        if chave not in _snapshots or chave not in _carregadores:
+            return False
+        if motivo is not None and _antecipacoes.get(chave) == motivo:
+            return False
+        _antecipacoes[chave] = motivo
+        carregar, intervalo = _carregadores[chave]
+    _agendar(chave, carregar, intervalo, 0)
+    return True
+
+
+def informar_buscado_em(buscado_em):
+    """
+    Chamado dentro de `carregar` quando os dados vêm de uma cópia gravada
+    antes (ex: o cache em disco): o snapshot fica com o horário da busca
+    original (o mais antigo informado) e a próxima atualização conta a
+    partir dele, não do momento da leitura.
+    """
+    buscas = _buscas.get()
+    if buscas is not None and buscado_em is not None:
+        buscas.append(buscado_em)
+
+
+def estatisticas():
+    """
+    Contadores do processo: acertos/faltas na leitura de snapshots,
+    atualizações em background concluídas, revalidadas sem mudança ou com
+    falha, primeiras cargas servidas pela reserva, snapshots descartados
+    pelo orçamento de memória ou por falta de uso e a ocupação atual.
+    """
+    with _lock:
+        return {
+            **_contadores,
+            "snapshots": len(_snapshots),
+            "bytes": sum(s["tamanho"] for s in _snapshots.values()),
+            "orcamento_bytes": ORCAMENTO_MEMORIA,
+        }
+
+
+def tamanho_dados(dados):
+    """
+    Memória ocupada pelos dados de um snapshot (DataFrame ou tupla deles).
+    """
+    if hasattr(dados, "memory_usage"):
+        uso = dados.memory_usage(deep=True)
+        # DataFrame devolve uma Series por coluna; Series devolve um número
+        return int(uso.sum() if hasattr(uso, "sum") else uso)
+    if isinstance(dados, (tuple, list)):
+        return sum(tamanho_dados(d) for d in dados)
+    return sys.getsizeof(dados)
+
+
+def _contar(nome):
+    with _lock:
+        _contadores[nome] += 1
+
+
+def idade_snapshot(chave):
+    """
+    Segundos desde a busca do snapshot atual (ou None se ainda não existe).
+    """
+    snapshot = _snapshots.get(chave)
+    if snapshot is None:
+        return None
+    return time.time() - snapshot["buscado_em"]
+
+
+def erro_snapshot(chave):
+    """
+    Mensagem da última atualização em background que falhou (ou None).
+    """
+    snapshot = _snapshots.get(chave)
+    return snapshot["erro"] if snapshot else None
+
+
+def _lock_carga(chave):
+    with _lock:
+        return _locks_carga.setdefault(chave, threading.Lock())
+
+
+def _usar(chave):
+    """
+    Lê o snapshot marcando-o como o mais usado recentemente.
+    """
+    with _lock:
+        _ultimo_uso[chave] = time.time()
+        snapshot = _snapshots.get(chave)
+        if snapshot is not None:
+            _snapshots.move_to_end(chave)
+        return snapshot
+
+
+def _registrar_dependencia(chave, snapshot):
+    dependencias = _dependencias.get()
+    if dependencias is not None:
+        dependencias[chave] = snapshot["versao"]
+
+
+def _primeira_carga(chave, carregar, intervalo, reserva):
+    try:
+        return _atualizar(chave, carregar, intervalo)
+    except Exception as e:
+        copia = reserva() if reserva is not None else None
+        if copia is None:
+            raise
+        # Mostra a cópia antiga e continua tentando em background
+        _contar("reservas")
+        logger.warning("Falha na primeira carga de %s, usando cópia de reserva: %s", chave, e)
+        dados, buscado_em = copia
+        snapshot = _novo_snapshot(dados, buscado_em, erro=str(e))
+        with _lock:
+            _snapshots[chave] = snapshot
+            _carregadores[chave] = (carregar, intervalo)
+            _despejar()
+        _agendar(chave, carregar, intervalo, ESPERA_ERRO)
+        return snapshot
+
+
+def _novo_snapshot(dados, buscado_em, erro=None, requisicoes=(), dependencias=None):
+    return {
+        "dados": dados,
+        "buscado_em": buscado_em,
+        "carregado_em": buscado_em,
+        "erro": erro,
+        "tamanho": tamanho_dados(dados),
+        "versao": next(_versoes),
+        "requisicoes": list(requisicoes),
+        "dependencias": dependencias or {},
+    }
+
+
+def _atualizar(chave, carregar, intervalo, em_background=False):
+    # Guarda as requisições feitas e os snapshots lidos, para a próxima
+    # atualização poder conferir se algo mudou antes de recarregar
+    dependencias = {}
+    buscas = []
+    token = _dependencias.set(dependencias)
+    token_buscas = _buscas.set(buscas)
+    try:
+        with registrar_requisicoes() as requisicoes:
+            dados = carregar()
+    finally:
+        _buscas.reset(token_buscas)
+        _dependencias.reset(token)
+
+    buscado_em = min(buscas, default=time.time())
+    snapshot = _novo_snapshot(dados, buscado_em, requisicoes=requisicoes, dependencias=dependencias)
+    with _lock:
+        if em_background and chave not in _snapshots:
+            # Descartado pelo orçamento enquanto atualizava: ninguém está usando
+            return None
+        # Atualização em background mantém a posição na fila de uso
+        _snapshots[chave] = snapshot
+        _carregadores[chave] = (carregar, intervalo)
+        _despejar()
+        mantido = chave in _snapshots
+    if mantido:
+        _agendar(chave, carregar, intervalo, max(buscado_em + intervalo - time.time(), 0))
+    return snapshot
+
+
+def _revalidar(chave, intervalo):
+    """
+    Se nenhuma requisição da última carga mudou na Flow2 e os snapshots de
+    que ela dependia são os mesmos, só renova o horário do snapshot atual
+    (os dados e tudo o que foi derivado deles continuam valendo).
+    """
+    snapshot = _snapshots.get(chave)
+    if not REVALIDAR or snapshot is None or not snapshot["requisicoes"]:
+        return False
+    if time.time() - snapshot["carregado_em"] >= INTERVALOS_REVALIDADO * intervalo:
+        return False
+    for dependencia, versao in snapshot["dependencias"].items():
+        atual = _snapshots.get(dependencia)
+        if atual is None or atual["versao"] != versao:
+            return False
+    if not inalterado(snapshot["requisicoes"]):
+        return False
+
+    with _lock:
+        if _snapshots.get(chave) is not snapshot:
+            return False
+        _snapshots[chave] = {**snapshot, "buscado_em": time.time(), "erro": None}
+        carregar, _ = _carregadores[chave]
+    _agendar(chave, carregar, intervalo, intervalo)
+    return True
+
+
+def _despejar():
+    """
+    Descarta os snapshots menos usados até caber no orçamento (sempre
+    mantém ao menos um). Chamado com _lock adquirido.
+    """
+    if not ORCAMENTO_MEMORIA:
+        return
+    total = sum(s["tamanho"] for s in _snapshots.values())
+    while total > ORCAMENTO_MEMORIA and len(_snapshots) > 1:
+        chave = next(iter(_snapshots))
+        snapshot = _descartar(chave)
+        total -= snapshot["tamanho"]
+        _contadores["despejos"] += 1
+        logger.info("Snapshot %s descartado (%.1f MB) pelo orçamento de memória", chave, snapshot["tamanho"] / 1024 ** 2)
+
+
+def _descartar(chave):
+    """
+    Remove o snapshot e tudo o que o mantém vivo (timer, carregador).
+    Chamado com _lock adquirido; retorna o snapshot removido.
+    """
+    snapshot = _snapshots.pop(chave)
+    timer = _agendados.pop(chave, None)
+    if timer is not None:
+        timer.cancel()
+    _locks_carga.pop(chave, None)
+    _carregadores.pop(chave, None)
+    _antecipacoes.pop(chave, None)
+    _ultimo_uso.pop(chave, None)
+    return snapshot
+
+
+def _ocioso(chave, intervalo):
+    """
+    Descarta o snapshot se ninguém o leu nos últimos INTERVALOS_OCIOSO
+    intervalos (0 nunca descarta). Chamado com _lock adquirido.
+    """
+    if not INTERVALOS_OCIOSO or chave not in _snapshots:
+        return False
+    if time.time() - _ultimo_uso.get(chave, 0) < INTERVALOS_OCIOSO * intervalo:
+        return False
+    _descartar(chave)
+    _contadores["ociosos"] += 1
+    logger.info("Snapshot %s descartado: sem uso há %d intervalos", chave, INTERVALOS_OCIOSO)
+    return True
+
+
+def _atualizar_em_background(chave, carregar, intervalo):
+    with _lock:
+        if chave in _em_andamento or chave not in _snapshots or _ocioso(chave, intervalo):
+            return
+        _em_andamento.add(chave)
+
+    try:
+        if _revalidar(chave, intervalo):
+            _contar("revalidacoes")
+        elif _atualizar(chave, carregar, intervalo, em_background=True) is not None:
+            _contar("atualizacoes")
+    except Exception as e:
+        # Mantém o último snapshot bom e tenta de novo mais tarde
+        _contar("falhas")
+        logger.warning("Falha ao atualizar %s: %s", chave, e)
+        with _lock:
+            anterior = _snapshots.get(chave)
+            if anterior is None:
+                return
+            _snapshots[chave] = {**anterior, "erro": str(e)}
+        _agendar(chave, carregar, intervalo, ESPERA_ERRO)
+    finally:
+        with _lock:
+            _em_andamento.discard(chave)
+
+
+def _agendado(chave):
+    timer = _agendados.get(chave)
+    return timer is not None and timer.is_alive()
+
+
+def _agendar(chave, carregar, intervalo, atraso):
+    with _lock:
+        anterior = _agendados.get(chave)
+        if anterior is not None:
+            anterior.cancel()
+        timer = threading.Timer(atraso, _atualizar_em_background, args=(chave, carregar, intervalo))
+        timer.daemon = True
+        _agendados[chave] = timer
+        timer.start()
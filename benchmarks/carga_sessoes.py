@@ -0,0 +1,202 @@
+"""
+Teste de carga do app contra o servidor Flow2 de testes (mock_flow2.py):
+simula N sessões Streamlit simultâneas, distribuídas entre M tenants, cada
+uma abrindo o app e fazendo K interações aleatórias nos filtros.
+
+Mede a latência de cada execução do script (primeira carga e reruns, p50 e
+p95), o fan-out de requisições à API por endpoint e por sessão e os acertos
+e despejos do cache de snapshots (atualizacao.estatisticas):
+
+    python benchmarks/carga_sessoes.py --sessoes 20 --tenants 3 --latencia 0.1
+    python benchmarks/carga_sessoes.py --taxa-erro 0.05 --interacoes 10
+
+Usa um diretório de cache temporário, então cada execução parte do disco vazio.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.gerador import gerar_payloads  # noqa: E402
+from benchmarks.mock_flow2 import iniciar_servidor  # noqa: E402
+
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def preparar_sessoes_concorrentes():
+    """
+    Ajustes para rodar vários AppTest ao mesmo tempo no mesmo processo:
+
+    - o AppTest instala um Runtime falso a cada execução e o zera ao
+      terminar, apagando o das outras sessões no meio do script: mantém o
+      último Runtime criado visível para todas;
+    - ast.parse não é thread-safe no Python 3.11: serializa a compilação
+      do script.
+    """
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner import magic
+
+    instance_original = Runtime.__dict__["instance"].__func__
+    ultimo = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo["runtime"] = cls._instance
+        elif "runtime" in ultimo:
+            return ultimo["runtime"]
+        return instance_original(cls)
+
+    add_magic_original = magic.add_magic
+    lock_compilacao = threading.Lock()
+
+    def add_magic(*args, **kwargs):
+        with lock_compilacao:
+            return add_magic_original(*args, **kwargs)
+
+    Runtime.instance = classmethod(instance)
+    magic.add_magic = add_magic
+
+
+def interagir(at, rng):
+    """
+    Aplica uma interação aleatória (período, bancos, página ou status) nos
+    widgets do AppTest; o próximo at.run() envia os novos valores.
+    """
+    opcoes = []
+    if at.date_input(key="tab1_date") is not None:
+        opcoes.append("periodo")
+    opcoes += ["bancos", "pagina", "status"]
+    escolha = rng.choice(opcoes)
+
+    if escolha == "periodo":
+        widget = at.date_input(key="tab1_date")
+        inicio, fim = widget.value
+        dias = max((fim - inicio).days, 1)
+        novo_inicio = inicio + timedelta(days=rng.randrange(dias))
+        widget.set_value([novo_inicio, novo_inicio + timedelta(days=rng.randrange(1, 60))])
+    elif escolha == "bancos":
+        widget = at.multiselect(key="tab1_banks")
+        opcoes_banco = list(widget.options)
+        widget.set_value(rng.sample(opcoes_banco, rng.randint(1, len(opcoes_banco))))
+    elif escolha == "pagina":
+        widget = at.number_input(key="tab1_extrato_pagina")
+        widget.set_value(rng.randint(1, int(widget.max_value or 1)))
+    else:
+        widget = at.multiselect(key="tab2_status")
+        opcoes_status = list(widget.options)
+        widget.set_value(rng.sample(opcoes_status, rng.randint(0, len(opcoes_status))))
+
+
+def sessao(indice, tenants, interacoes, seed):
+    """
+    Uma sessão de navegador: primeira carga + interações. Retorna as
+    latências (s) e a quantidade de exceções do script.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed + indice)
+    at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=300)
+    # Token pelo campo da sidebar: at.secrets troca st.secrets do processo
+    # inteiro e as sessões simultâneas se atropelariam
+    at.run()
+    at.sidebar.text_input[0].set_value(f"token-carga-{indice % tenants}")
+
+    inicio = time.perf_counter()
+    at.run()
+    primeira = time.perf_counter() - inicio
+    excecoes = len(at.exception)
+
+    reruns = []
+    for _ in range(interacoes):
+        try:
+            interagir(at, rng)
+        except Exception:
+            # Widget ausente (ex: carga falhou e a aba ficou vazia): só reexecuta
+            pass
+        inicio = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - inicio)
+        excecoes += len(at.exception)
+
+    return primeira, reruns, excecoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", type=int, default=10)
+    parser.add_argument("--tenants", type=int, default=2)
+    parser.add_argument("--interacoes", type=int, default=5)
+    parser.add_argument("--simultaneas", type=int, help="sessões rodando ao mesmo tempo (padrão: todas)")
+    parser.add_argument("--movimentos", type=int, default=20_000)
+    parser.add_argument("--titulos", type=int, default=5_000)
+    parser.add_argument("--latencia", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    servidor = iniciar_servidor(
+        gerar_payloads(args.movimentos, args.titulos),
+        latencia=args.latencia, jitter=args.jitter, taxa_erro=args.taxa_erro, seed=args.seed,
+    )
+    # Precisa vir antes do primeiro import de flow2_api/armazenamento
+    os.environ["FLOW2_API_BASE_URL"] = servidor.url
+    os.environ["FLOW2_CACHE_DIR"] = tempfile.mkdtemp(prefix="flow2-carga-")
+
+    import atualizacao
+
+    preparar_sessoes_concorrentes()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.simultaneas or args.sessoes) as executor:
+        resultados = list(executor.map(
+            lambda i: sessao(i, args.tenants, args.interacoes, args.seed), range(args.sessoes)
+        ))
+    total = time.perf_counter() - inicio
+
+    primeiras = [r[0] for r in resultados]
+    reruns = [t for r in resultados for t in r[1]]
+    excecoes = sum(r[2] for r in resultados)
+    api = servidor.estatisticas
+    cache = atualizacao.estatisticas()
+    leituras = cache["acertos"] + cache["faltas"]
+
+    print(f"Sessões: {args.sessoes} ({args.tenants} tenants), {args.interacoes} interações cada, em {total:.1f}s")
+    print(f"API: {servidor.url}  latência {args.latencia}s + até {args.jitter}s, erro {args.taxa_erro:.0%}")
+    print()
+    print(f"{'execução':<16}{'n':>6}{'p50 (s)':>10}{'p95 (s)':>10}{'máx (s)':>10}")
+    for nome, tempos in [("primeira carga", primeiras), ("rerun", reruns)]:
+        print(f"{nome:<16}{len(tempos):>6}{percentil(tempos, 50):>10.3f}{percentil(tempos, 95):>10.3f}{max(tempos, default=0):>10.3f}")
+    print()
+    total_api = sum(api["requisicoes"].values())
+    print(f"Requisições à API: {total_api} ({total_api / args.sessoes:.1f} por sessão), {api['erros']} erros simulados, "
+          f"{api['nao_modificados']} respostas 304, {api['bytes'] / 1024 ** 2:.1f} MB")
+    for endpoint, n in sorted(api["requisicoes"].items()):
+        print(f"  {endpoint:<22}{n:>6}")
+    print()
+    taxa = cache["acertos"] / leituras if leituras else 0
+    print(f"Snapshots: {cache['acertos']} acertos, {cache['faltas']} faltas ({taxa:.0%} de acerto), "
+          f"{cache['atualizacoes']} atualizações em background, {cache['revalidacoes']} revalidadas sem mudança, "
+          f"{cache['falhas']} falhas, {cache['reservas']} primeiras cargas pela cópia em disco")
+    print(f"Memória dos snapshots: {cache['snapshots']} em cache, {cache['bytes'] / 1024 ** 2:.1f} MB "
+          f"de {cache['orcamento_bytes'] / 1024 ** 2:.0f} MB, {cache['despejos']} despejos")
+    if excecoes:
+        print(f"\n{excecoes} exceção(ões) no script durante a carga")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
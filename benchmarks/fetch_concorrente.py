@@ -0,0 +1,106 @@
+"""
+Compara a carga sequencial (quatro requests.get, cada um com sua conexão)
+com a carga concorrente sobre a sessão compartilhada de flow2_api.
+
+Sobe um servidor HTTP local que imita os quatro endpoints da Flow2 com
+latência artificial, então roda totalmente offline:
+
+    python benchmarks/fetch_concorrente.py [--latencia 0.3] [--repeticoes 5]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flow2_api  # noqa: E402
+
+ENDPOINTS = ["movimentosBancarios", "saldoBancos", "recebers", "clientes"]
+
+
+def criar_handler(latencias, payload):
+    corpo = json.dumps(payload).encode("utf-8")
+    corpo_gzip = gzip.compress(corpo)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            endpoint = urlparse(self.path).path.rsplit("/", 1)[-1]
+            time.sleep(latencias.get(endpoint, 0))
+            dados = corpo
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                dados = corpo_gzip
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def carga_sequencial(base_url):
+    headers = flow2_api.headers_auth("token-local")
+    for endpoint in ENDPOINTS:
+        response = requests.get(f"{base_url}/{endpoint}", headers=headers, timeout=30)
+        response.raise_for_status()
+        response.json()
+
+
+def carga_concorrente():
+    flow2_api.get_json_concorrente({endpoint: (endpoint, None) for endpoint in ENDPOINTS}, "token-local")
+
+
+def medir(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), sum(tempos) / len(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencia", type=float, default=0.3, help="latência base por endpoint (s)")
+    parser.add_argument("--itens", type=int, default=2000, help="itens por resposta")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    # Latências diferentes por endpoint: o ideal concorrente é a do mais lento
+    latencias = {endpoint: args.latencia * (1 + i * 0.25) for i, endpoint in enumerate(ENDPOINTS)}
+    payload = {"itens": [{"id": i, "valor": i * 1.5, "descricao": f"ITEM {i}"} for i in range(args.itens)]}
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), criar_handler(latencias, payload))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{servidor.server_port}/v1"
+    flow2_api.API_BASE_URL = base_url
+
+    try:
+        seq_min, seq_media = medir(lambda: carga_sequencial(base_url), args.repeticoes)
+        conc_min, conc_media = medir(carga_concorrente, args.repeticoes)
+    finally:
+        servidor.shutdown()
+
+    print(f"Soma das latências:        {sum(latencias.values()):.3f}s")
+    print(f"Endpoint mais lento:       {max(latencias.values()):.3f}s")
+    print(f"Sequencial (min / média):  {seq_min:.3f}s / {seq_media:.3f}s")
+    print(f"Concorrente (min / média): {conc_min:.3f}s / {conc_media:.3f}s")
+    print(f"Ganho: {seq_media / conc_media:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
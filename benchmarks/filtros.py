@@ -0,0 +1,74 @@
+"""
+Compara o filtro por máscaras (Data.between + Banco.isin sobre toda a base)
+com o motor de filtros (busca binária no índice por data, códigos
+categóricos e memo por snapshot), conferindo que o resultado é o mesmo:
+
+    python benchmarks/filtros.py [--movimentos 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtros import filtrar_movimentos  # noqa: E402
+
+
+def gerar_movimentos(n, seed=42):
+    rng = np.random.default_rng(seed)
+    inicio = date(2025, 1, 1)
+    datas = [inicio + timedelta(days=int(d)) for d in rng.integers(0, 365, n)]
+    return pd.DataFrame({
+        'Data': datas,
+        'Banco': rng.choice(["ITAU", "BRADESCO", "SICOOB", "CAIXA", "INTER"], n),
+        'Valor': rng.uniform(1, 5000, n).round(2),
+    })
+
+
+def medir(func, repeticoes=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = func()
+    return (time.perf_counter() - inicio) / repeticoes, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movimentos", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = gerar_movimentos(args.movimentos)
+    periodo = (date(2025, 3, 1), date(2025, 3, 31))
+    bancos = ["ITAU", "SICOOB"]
+
+    tempo_mascara, esperado = medir(lambda: df[
+        df['Data'].between(periodo[0], periodo[1]) & df['Banco'].isin(bancos)
+    ])
+
+    inicio = time.perf_counter()
+    obtido = filtrar_movimentos(df, periodo[0], periodo[1], bancos)
+    tempo_primeiro = time.perf_counter() - inicio
+
+    outro_periodo = (date(2025, 6, 1), date(2025, 6, 30))
+    tempo_indexado, _ = medir(lambda: filtrar_movimentos(df, outro_periodo[0], outro_periodo[1], bancos), 1)
+    tempo_memo, _ = medir(lambda: filtrar_movimentos(df, periodo[0], periodo[1], bancos))
+
+    if not esperado.equals(obtido):
+        print("DIVERGÊNCIA entre máscara e motor de filtros")
+        sys.exit(1)
+
+    print(f"Movimentos:                      {args.movimentos}")
+    print(f"Máscaras (por filtro):           {tempo_mascara * 1000:.1f} ms")
+    print(f"Motor, 1º filtro (com índice):   {tempo_primeiro * 1000:.1f} ms")
+    print(f"Motor, novo filtro indexado:     {tempo_indexado * 1000:.1f} ms")
+    print(f"Motor, filtro repetido (memo):   {tempo_memo * 1000:.3f} ms")
+    print(f"Resultado idêntico ({len(obtido)} linhas)")
+
+
+if __name__ == "__main__":
+    main()
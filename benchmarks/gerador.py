@@ -0,0 +1,113 @@
+"""
+Gerador de dados sintéticos no formato dos endpoints da Flow2
+(movimentosBancarios, saldoBancos, recebers e clientes).
+
+Os itens são dicts como os que a API devolve em 'itens', com datas ISO 8601
+com fuso (-03:00) e alguns campos aninhados, para que json_normalize e os
+loaders trabalhem sobre a mesma forma do payload real.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+BANCOS = ["ITAU", "BRADESCO", "SICOOB", "CAIXA", "INTER", "SANTANDER", "BANCO DO BRASIL", "NUBANK"]
+DESCRICOES = [
+    "pix recebido", "pix enviado", "tarifa bancaria", "ted enviada", "ted recebida",
+    "boleto pago", "boleto recebido", "rendimento aplicacao", "folha de pagamento", "imposto",
+]
+
+
+def gerar_movimentos(n, n_bancos=5, data_inicio=date(2025, 1, 1), dias=365, seed=42, n_descricoes=len(DESCRICOES)):
+    rng = np.random.default_rng(seed)
+    bancos = BANCOS[:n_bancos]
+    # Além das descrições base, variações numeradas ("pix recebido 12")
+    descricoes = [
+        DESCRICOES[k % len(DESCRICOES)] + (f" {k // len(DESCRICOES)}" if k >= len(DESCRICOES) else "")
+        for k in range(n_descricoes)
+    ]
+    base = np.datetime64(data_inicio.isoformat(), 'm')
+    momentos = base + rng.integers(0, dias * 24 * 60, n).astype('timedelta64[m]')
+    datas = np.datetime_as_string(momentos, unit='s')
+    valores = rng.lognormal(6, 1.2, n).round(2)
+    operacoes = rng.choice(["+", "-"], n, p=[0.45, 0.55])
+    idx_bancos = rng.integers(0, len(bancos), n)
+    idx_descricoes = rng.integers(0, len(descricoes), n)
+
+    return [
+        {
+            "id": i,
+            "valor": float(valores[i]),
+            "dataMovimento": f"{datas[i]}-03:00",
+            "descricao": descricoes[idx_descricoes[i]],
+            "operacao": str(operacoes[i]),
+            "nomeBanco": bancos[idx_bancos[i]],
+            "banco": {"id": int(idx_bancos[i]), "nome": bancos[idx_bancos[i]]},
+            "conciliado": bool(i % 3),
+        }
+        for i in range(n)
+    ]
+
+
+def gerar_saldos(n_bancos=5, seed=42):
+    rng = np.random.default_rng(seed)
+    return [
+        {"banco": {"id": i, "nome": nome}, "saldo": round(float(rng.uniform(-5_000, 250_000)), 2)}
+        for i, nome in enumerate(BANCOS[:n_bancos])
+    ]
+
+
+def gerar_clientes(n, seed=42):
+    rng = np.random.default_rng(seed)
+    documentos = rng.integers(10 ** 13, 10 ** 14, n)
+    return [
+        {
+            "id": i,
+            "nomeRazaoSocial": f"Cliente {i:06d} LTDA",
+            "cpfCnpj": str(documentos[i]),
+            "endereco": {"cidade": "São Paulo", "uf": "SP"},
+        }
+        for i in range(n)
+    ]
+
+
+def gerar_recebers(n, n_clientes=1000, hoje=None, seed=42):
+    rng = np.random.default_rng(seed)
+    hoje = hoje or date.today()
+    deslocamentos = rng.integers(-180, 90, n)
+    pagos = rng.random(n) < 0.4
+    creditados = rng.random(n) < 0.05
+    sem_nominal = rng.random(n) < 0.1
+    valores = rng.lognormal(7, 1, n).round(2)
+    negativos = rng.random(n) < 0.02
+    clientes = rng.integers(0, int(n_clientes * 1.05) + 1, n)  # alguns sem cadastro
+
+    itens = []
+    for i in range(n):
+        vencimento = hoje + timedelta(days=int(deslocamentos[i]))
+        vencimento_iso = f"{vencimento.isoformat()}T01:00:00-03:00"
+        itens.append({
+            "id": i,
+            "idCliente": int(clientes[i]),
+            "valorBruto": float(-valores[i] if negativos[i] else valores[i]),
+            "dataVencimentoNominal": None if sem_nominal[i] else vencimento_iso,
+            "dataVencimentoReal": vencimento_iso,
+            "dataBaixa": f"{(vencimento - timedelta(days=1)).isoformat()}T10:30:00-03:00" if pagos[i] else None,
+            "dataCredito": vencimento_iso if creditados[i] else None,
+            "codigoProjeto": f"P{i % 300:03d}",
+            "categoria": {"id": i % 12, "nome": f"Categoria {i % 12}"},
+        })
+    return itens
+
+
+def gerar_payloads(n_movimentos, n_titulos, n_clientes=None, n_bancos=5, seed=42):
+    """
+    Respostas completas dos quatro endpoints, como a API devolve com
+    DesabilitarPaginacao=true.
+    """
+    n_clientes = n_clientes or max(10, n_titulos // 20)
+    return {
+        "movimentosBancarios": {"itens": gerar_movimentos(n_movimentos, n_bancos, seed=seed)},
+        "saldoBancos": gerar_saldos(n_bancos, seed=seed),
+        "recebers": {"itens": gerar_recebers(n_titulos, n_clientes, seed=seed)},
+        "clientes": {"itens": gerar_clientes(n_clientes, seed=seed)},
+    }
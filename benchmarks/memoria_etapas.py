@@ -0,0 +1,177 @@
+"""
+Orçamento de memória do pipeline de transformação: mede com tracemalloc o
+pico de memória alocada por etapa (carga já feita -> preprocessamento ->
+filtros -> KPIs -> formatação) num tenant sintético grande. Cada etapa pode
+usar no máximo o próprio resultado mais uma vez o frame de entrada como
+memória de trabalho; uma etapa que copia a entrada inteira mais de uma vez
+estoura o orçamento e o script termina com código 1:
+
+    python benchmarks/memoria_etapas.py
+    python benchmarks/memoria_etapas.py --titulos 500000 --movimentos 500000
+
+O tracemalloc só vê o alocador do Python/numpy; as colunas de texto
+(pyarrow) entram pelo que a etapa deixa alocado no pool do Arrow, o que
+pega cópias delas mas não picos transitórios.
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.gerador import gerar_movimentos, gerar_payloads  # noqa: E402
+from filtros import filtrar_movimentos, filtrar_receber  # noqa: E402
+from formatacao import formatar_extrato_html, montar_detalhe_receber  # noqa: E402
+from processamento import (  # noqa: E402
+    ESQUEMAS,
+    agregar_diario,
+    agrupar_extrato,
+    compactar_movimentos,
+    extrair_itens,
+    juntar_clientes,
+    montar_cubo_receber,
+    normalizar_clientes,
+    normalizar_movimentos,
+    preprocessar_receber,
+    recebido_entre,
+    totais_receber,
+)
+
+# Memória de trabalho de cada etapa além do resultado, como fração do frame
+# de entrada (memory_usage deep): até uma cópia da entrada
+TRABALHO = 1.0
+
+# Cópias do resultado admitidas no pico: o HTML é montado num buffer do
+# Arrow e decodificado para str, então a página existe duas vezes
+COPIAS_RESULTADO = {"html_pagina": 2}
+
+# Folga: fração da entrada mais um custo fixo por chamada do pandas
+# (índices, blocos e formatadores) que não cresce com o frame
+FOLGA = 0.05
+FOLGA_BYTES = 64 * 1024
+
+
+def orcamento(nome, bytes_entrada, bytes_saida):
+    """
+    Pico máximo da etapa em bytes.
+    """
+    return (
+        (TRABALHO + FOLGA) * bytes_entrada
+        + COPIAS_RESULTADO.get(nome, 1) * bytes_saida
+        + FOLGA_BYTES
+    )
+
+
+def tamanho(objeto):
+    if isinstance(objeto, pd.DataFrame):
+        return int(objeto.memory_usage(deep=True).sum())
+    if isinstance(objeto, pd.Series):
+        return int(objeto.memory_usage(deep=True))
+    if isinstance(objeto, (tuple, list)):
+        return sum(tamanho(item) for item in objeto)
+    return sys.getsizeof(objeto)
+
+
+def medir(entrada, func):
+    """
+    Roda `func()` e retorna (resultado, pico em bytes acima do que já
+    estava alocado, bytes da entrada, bytes do resultado).
+    """
+    tracemalloc.reset_peak()
+    antes, _ = tracemalloc.get_traced_memory()
+    arrow_antes = pa.total_allocated_bytes()
+    resultado = func()
+    _, pico = tracemalloc.get_traced_memory()
+    arrow = max(0, pa.total_allocated_bytes() - arrow_antes)
+    return resultado, pico - antes + arrow, tamanho(entrada), tamanho(resultado)
+
+
+def preparar(titulos, movimentos):
+    """
+    Frames como ficam no snapshot depois da carga (fora da medição).
+    """
+    payloads = gerar_payloads(0, titulos)
+    # Rollup grande: três anos, oito bancos e 200 descrições, para que quase
+    # todo movimento vire uma linha própria do diário
+    payloads["movimentosBancarios"]["itens"] = gerar_movimentos(movimentos, n_bancos=8, dias=3 * 365, n_descricoes=200)
+
+    def extrair(endpoint):
+        return extrair_itens(payloads[endpoint]["itens"], ESQUEMAS[endpoint])
+
+    df_clientes = normalizar_clientes(extrair("clientes"))
+    df_receber_raw = juntar_clientes(extrair("recebers"), df_clientes)
+    df_movimentos = compactar_movimentos(normalizar_movimentos(extrair("movimentosBancarios")))
+    return df_receber_raw, agregar_diario(df_movimentos)
+
+
+def executar_etapas(df_receber_raw, df_diario):
+    """
+    Caminho de uma execução do app sobre os snapshots; retorna
+    {etapa: (pico, bytes da entrada)}.
+    """
+    medidas = {}
+
+    def etapa(nome, entrada, func):
+        resultado, pico, bytes_entrada, bytes_saida = medir(entrada, func)
+        medidas[nome] = (pico, bytes_entrada, bytes_saida)
+        return resultado
+
+    hoje = date.today()
+    df_receber = etapa("preprocessar_receber", df_receber_raw, lambda: preprocessar_receber(df_receber_raw, hoje))
+    inicio, fim = df_receber['Vencimento'].min(), df_receber['Vencimento'].max()
+    status = df_receber['Status'].unique().tolist()
+    df_filtrado = etapa("filtrar_receber", df_receber, lambda: filtrar_receber(df_receber, inicio, fim, status))
+    etapa("totais_receber", df_filtrado, lambda: totais_receber(df_filtrado))
+    etapa("recebido_mes", df_receber, lambda: recebido_entre(df_receber, hoje.replace(day=1), hoje))
+    etapa("detalhe_receber", df_filtrado, lambda: montar_detalhe_receber(df_filtrado))
+    etapa("cubo_receber", df_receber, lambda: montar_cubo_receber(df_receber, hoje))
+
+    bancos = df_diario['Banco'].dropna().unique().tolist()
+    df_periodo = etapa("filtrar_diario", df_diario, lambda: filtrar_movimentos(
+        df_diario, df_diario['Data'].min(), df_diario['Data'].max(), bancos
+    ))
+    df_extrato = etapa("agrupar_extrato", df_periodo, lambda: agrupar_extrato(df_periodo))
+    df_pagina = df_extrato.iloc[:100]
+    etapa("html_pagina", df_pagina, lambda: formatar_extrato_html(df_pagina))
+    return medidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titulos", type=int, default=200_000)
+    parser.add_argument("--movimentos", type=int, default=200_000)
+    args = parser.parse_args()
+
+    df_receber_raw, df_diario = preparar(args.titulos, args.movimentos)
+    tracemalloc.start()
+    try:
+        medidas = executar_etapas(df_receber_raw, df_diario)
+    finally:
+        tracemalloc.stop()
+
+    estouros = []
+    print(f"{args.titulos} títulos / {args.movimentos} movimentos")
+    print(f"{'etapa':<22}{'entrada (MB)':>14}{'saída (MB)':>12}{'pico (MB)':>12}{'orçamento (MB)':>16}{'uso':>7}")
+    for nome, (pico, bytes_entrada, bytes_saida) in medidas.items():
+        limite = orcamento(nome, bytes_entrada, bytes_saida)
+        marca = ""
+        if pico > limite:
+            marca = "  <-- ACIMA DO ORÇAMENTO"
+            estouros.append(nome)
+        print(
+            f"{nome:<22}{bytes_entrada / 1024 ** 2:>14.2f}{bytes_saida / 1024 ** 2:>12.2f}"
+            f"{pico / 1024 ** 2:>12.2f}{limite / 1024 ** 2:>16.2f}{pico / limite:>7.0%}{marca}"
+        )
+
+    if estouros:
+        print(f"\n{len(estouros)} etapa(s) acima do orçamento de memória: {', '.join(estouros)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
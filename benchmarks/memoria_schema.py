@@ -0,0 +1,74 @@
+"""
+Relatório de memória dos frames carregados antes e depois do schema
+compacto (categóricas, datetime64 e centavos int64):
+
+    python benchmarks/memoria_schema.py [--movimentos 200000] [--titulos 100000]
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.gerador import gerar_movimentos  # noqa: E402
+from benchmarks.preprocessamento_receber import gerar_recebers, preprocessar_receber_linha_a_linha  # noqa: E402
+from processamento import compactar_movimentos, juntar_clientes, normalizar_movimentos, preprocessar_receber  # noqa: E402
+
+
+def normalizar_movimentos_anterior(df_movimentos):
+    df_movimentos = df_movimentos.rename(columns={
+        "valor": "Valor", "dataMovimento": "DataMovimento", "descricao": "Descricao",
+        "operacao": "Operacao", "nomeBanco": "Banco",
+    })
+    df_movimentos['Valor'] = pd.to_numeric(df_movimentos['Valor'], errors='coerce').fillna(0)
+    df_movimentos['DataMovimento'] = pd.to_datetime(df_movimentos['DataMovimento'], errors='coerce')
+    df_movimentos['Data'] = df_movimentos['DataMovimento'].dt.date
+    df_movimentos['Horario'] = df_movimentos['DataMovimento'].dt.time
+    df_movimentos['Descricao'] = df_movimentos['Descricao'].astype(object).str.upper().astype(object)
+    df_movimentos['Operacao'] = df_movimentos['Operacao'].astype(object)
+    df_movimentos['Banco'] = df_movimentos['Banco'].astype(object)
+    return df_movimentos
+
+
+def mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movimentos", type=int, default=200_000)
+    parser.add_argument("--titulos", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df_mov_api = pd.json_normalize(gerar_movimentos(args.movimentos))
+    antes_mov = normalizar_movimentos_anterior(df_mov_api.copy())
+    depois_mov = compactar_movimentos(normalizar_movimentos(df_mov_api.copy()))
+
+    df_rec_raw = gerar_recebers(args.titulos)
+    df_rec_raw['Cliente'] = ("Cliente " + df_rec_raw['idCliente'].astype(str)).astype(object)
+    antes_rec = preprocessar_receber_linha_a_linha(df_rec_raw)
+    antes_rec['Cliente'] = antes_rec['Cliente'].astype(object)
+    depois_rec = preprocessar_receber(juntar_clientes(df_rec_raw.drop(columns='Cliente'), pd.DataFrame({
+        'idCliente': df_rec_raw['idCliente'].unique(),
+        'Cliente': ["Cliente " + str(i) for i in df_rec_raw['idCliente'].unique()],
+    })))
+
+    print(f"{'frame':<22}{'antes (MB)':>12}{'depois (MB)':>13}{'redução':>10}")
+    for nome, antes, depois in [
+        (f"movimentos ({args.movimentos})", antes_mov, depois_mov),
+        (f"receber ({args.titulos})", antes_rec, depois_rec),
+    ]:
+        print(f"{nome:<22}{mb(antes):>12.1f}{mb(depois):>13.1f}{1 - mb(depois) / mb(antes):>10.0%}")
+
+    print()
+    print("Por coluna (movimentos):")
+    antes_col = antes_mov.memory_usage(deep=True, index=False) / 1024 ** 2
+    depois_col = depois_mov.memory_usage(deep=True, index=False) / 1024 ** 2
+    for coluna in ['Data', 'Horario', 'Descricao', 'Operacao', 'Banco', 'Valor']:
+        print(f"  {coluna:<12}{antes_col[coluna]:>8.1f} -> {depois_col[coluna]:>6.1f} MB  ({depois_mov[coluna].dtype})")
+
+
+if __name__ == "__main__":
+    main()
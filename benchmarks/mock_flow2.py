@@ -0,0 +1,194 @@
+"""
+Servidor local que imita a API da Flow2 para testes de carga.
+
+Serve movimentosBancarios, saldoBancos, recebers e clientes a partir de
+payloads sintéticos (benchmarks/gerador.py) ou gravados (um <endpoint>.json
+por endpoint em --gravados), com latência, tamanho e taxa de erro ajustáveis.
+Entende DesabilitarPaginacao, Pagina/TamanhoPagina e
+DataMovimentoMaiorOuIgualA, responde com gzip quando o cliente aceita e
+envia ETag, respondendo 304 a If-None-Match (--sem-etag desliga, para
+testar a comparação por conteúdo).
+
+    python benchmarks/mock_flow2.py --porta 8765 --latencia 0.2 --taxa-erro 0.02
+    FLOW2_API_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+
+GET /_stats devolve os contadores de requisições; GET /_stats/reset zera.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.gerador import gerar_payloads  # noqa: E402
+
+ENDPOINTS = ["movimentosBancarios", "saldoBancos", "recebers", "clientes"]
+
+
+def carregar_gravados(diretorio):
+    payloads = {}
+    for endpoint in ENDPOINTS:
+        with open(os.path.join(diretorio, f"{endpoint}.json"), encoding="utf-8") as f:
+            payloads[endpoint] = json.load(f)
+    return payloads
+
+
+class MockFlow2(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, payloads, latencia=0.0, jitter=0.0, taxa_erro=0.0, seed=None, etag=True):
+        super().__init__(endereco, _Handler)
+        self.payloads = payloads
+        self.etag = etag
+        self.latencia = latencia
+        self.jitter = jitter
+        self.taxa_erro = taxa_erro
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.zerar_estatisticas()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def zerar_estatisticas(self):
+        with self.lock:
+            self.estatisticas = {"requisicoes": {}, "erros": 0, "nao_modificados": 0, "bytes": 0}
+
+    def registrar(self, endpoint, bytes_enviados=0, erro=False, nao_modificado=False):
+        with self.lock:
+            requisicoes = self.estatisticas["requisicoes"]
+            requisicoes[endpoint] = requisicoes.get(endpoint, 0) + 1
+            self.estatisticas["bytes"] += bytes_enviados
+            if erro:
+                self.estatisticas["erros"] += 1
+            if nao_modificado:
+                self.estatisticas["nao_modificados"] += 1
+
+    def sortear_erro(self):
+        with self.lock:
+            return self.random.random() < self.taxa_erro
+
+    def atraso(self):
+        with self.lock:
+            return self.latencia + self.random.uniform(0, self.jitter)
+
+    def resposta(self, endpoint, query):
+        """
+        Corpo da resposta para o endpoint e os parâmetros da query.
+        """
+        payload = self.payloads[endpoint]
+        if not isinstance(payload, dict):
+            return payload
+
+        itens = payload.get("itens") or []
+        if endpoint == "movimentosBancarios" and "DataMovimentoMaiorOuIgualA" in query:
+            inicio = query["DataMovimentoMaiorOuIgualA"][0]
+            itens = [item for item in itens if item.get("dataMovimento", "")[:10] >= inicio]
+
+        if query.get("DesabilitarPaginacao", ["false"])[0].lower() != "true":
+            pagina = int(query.get("Pagina", ["1"])[0])
+            tamanho = int(query.get("TamanhoPagina", ["50"])[0])
+            itens = itens[(pagina - 1) * tamanho: pagina * tamanho]
+
+        return {**payload, "itens": itens}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/_stats"):
+            if url.path.endswith("/reset"):
+                self.server.zerar_estatisticas()
+            with self.server.lock:
+                self.enviar(200, json.dumps(self.server.estatisticas).encode("utf-8"))
+            return
+
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+        if endpoint not in self.server.payloads:
+            self.enviar(404, b'{"mensagem": "endpoint desconhecido"}')
+            return
+
+        time.sleep(self.server.atraso())
+
+        if self.server.sortear_erro():
+            self.server.registrar(endpoint, erro=True)
+            self.enviar(503, b'{"mensagem": "erro simulado"}')
+            return
+
+        corpo = json.dumps(self.server.resposta(endpoint, parse_qs(url.query))).encode("utf-8")
+        etag = f'"{hashlib.md5(corpo).hexdigest()}"' if self.server.etag else None
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.enviar(304, b"", etag)
+            self.server.registrar(endpoint, nao_modificado=True)
+            return
+        enviados = self.enviar(200, corpo, etag)
+        self.server.registrar(endpoint, enviados)
+
+    def enviar(self, status, corpo, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        if status == 200 and "gzip" in self.headers.get("Accept-Encoding", ""):
+            corpo = gzip.compress(corpo, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+        return len(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_servidor(payloads, porta=0, **opcoes):
+    """
+    Sobe o servidor em uma thread daemon e retorna a instância (use .url).
+    """
+    servidor = MockFlow2(("127.0.0.1", porta), payloads, **opcoes)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--gravados", help="diretório com <endpoint>.json gravados da API real")
+    parser.add_argument("--movimentos", type=int, default=20_000)
+    parser.add_argument("--titulos", type=int, default=5_000)
+    parser.add_argument("--clientes", type=int)
+    parser.add_argument("--latencia", type=float, default=0.2, help="latência fixa por requisição (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="latência aleatória adicional máxima (s)")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de respostas 503")
+    parser.add_argument("--sem-etag", action="store_true", help="não envia ETag nem responde 304")
+    args = parser.parse_args()
+
+    if args.gravados:
+        payloads = carregar_gravados(args.gravados)
+    else:
+        payloads = gerar_payloads(args.movimentos, args.titulos, args.clientes)
+
+    servidor = MockFlow2(
+        ("127.0.0.1", args.porta), payloads,
+        latencia=args.latencia, jitter=args.jitter, taxa_erro=args.taxa_erro, etag=not args.sem_etag,
+    )
+    print(f"Flow2 de testes em {servidor.url} (Ctrl+C para sair)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Parse dos payloads da Flow2: json_normalize do item inteiro + tipagem (o
+caminho antigo) contra a leitura só dos campos de ESQUEMAS com datas ISO
+em formato explícito (extrair_itens) e, opcionalmente, a mesma leitura
+dividida num pool de processos. Mede tempo (melhor de N) e pico de memória
+(tracemalloc + pool do Arrow) por endpoint, sobre payloads sintéticos:
+
+    python benchmarks/parse_json.py
+    python benchmarks/parse_json.py --itens 1000000 --processos 4
+
+Os frames dos dois caminhos são comparados nas colunas em comum; uma
+diferença termina o script com código 1.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import carga  # noqa: E402
+from benchmarks.gerador import gerar_payloads  # noqa: E402
+from processamento import (  # noqa: E402
+    ESQUEMAS,
+    extrair_itens,
+    normalizar_clientes,
+    normalizar_movimentos,
+    preprocessar_receber,
+)
+
+# Tipagem aplicada depois do parse em cada endpoint (a dos títulos é a do
+# preprocessamento, onde as datas eram convertidas antes)
+NORMALIZAR = {
+    "movimentosBancarios": normalizar_movimentos,
+    "recebers": preprocessar_receber,
+    "clientes": normalizar_clientes,
+}
+
+
+def medir(func, repeticoes):
+    """
+    (resultado, melhor tempo, pico de memória em bytes) de `func()`.
+    """
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempo = time.perf_counter() - inicio
+        melhor = tempo if melhor is None else min(melhor, tempo)
+
+    tracemalloc.start()
+    arrow_antes = pa.total_allocated_bytes()
+    try:
+        resultado = func()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado, melhor, pico + max(0, pa.total_allocated_bytes() - arrow_antes)
+
+
+def caminhos(endpoint, itens, processos):
+    normalizar = NORMALIZAR[endpoint]
+    esquema = ESQUEMAS[endpoint]
+    resultado = {
+        "json_normalize": lambda: normalizar(pd.json_normalize(itens)),
+        "esquema": lambda: normalizar(extrair_itens(itens, esquema)),
+    }
+    if processos > 1 and endpoint != "recebers":
+        resultado["esquema_processos"] = lambda: carga.normalizar_em_blocos(itens, esquema, normalizar)
+    return resultado
+
+
+def diferencas(df_antigo, df_novo):
+    return [
+        coluna for coluna in df_antigo.columns
+        if coluna in df_novo.columns and not df_antigo[coluna].equals(df_novo[coluna])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itens", type=int, default=200_000, help="movimentos e títulos")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--processos", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    carga.PROCESSOS = args.processos
+    payloads = gerar_payloads(args.itens, args.itens)
+    divergentes = []
+
+    print(f"{args.itens} movimentos / títulos · {args.processos} processo(s)")
+    print(f"{'endpoint':<22}{'caminho':<20}{'tempo (s)':>11}{'pico (MB)':>11}{'razão':>8}")
+    for endpoint in NORMALIZAR:
+        itens = payloads[endpoint]["itens"]
+        referencia = None
+        for nome, func in caminhos(endpoint, itens, args.processos).items():
+            df, tempo, pico = medir(func, args.repeticoes)
+            if referencia is None:
+                referencia = (df, tempo)
+            elif diferencas(referencia[0], df):
+                divergentes.append((endpoint, nome, diferencas(referencia[0], df)))
+            razao = tempo / referencia[1] if referencia[1] else 0.0
+            print(f"{endpoint:<22}{nome:<20}{tempo:>11.4f}{pico / 1024 ** 2:>11.1f}{razao:>8.2f}")
+
+    if divergentes:
+        for endpoint, nome, colunas in divergentes:
+            print(f"\n{endpoint}/{nome} difere do json_normalize em: {', '.join(colunas)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
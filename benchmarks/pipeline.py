@@ -0,0 +1,142 @@
+"""
+Suíte de benchmark do pipeline carga -> transformação -> renderização,
+sobre payloads sintéticos da Flow2 (benchmarks/gerador.py). Roda offline.
+
+Cada etapa é medida (melhor de N repetições) para cada tamanho e comparada
+com a baseline gravada em benchmarks/baseline.json; etapas mais lentas que
+baseline × tolerância são sinalizadas e o script termina com código 1.
+
+    python benchmarks/pipeline.py                        # 10k e 100k
+    python benchmarks/pipeline.py --tamanhos 1000000
+    python benchmarks/pipeline.py --salvar-baseline      # regrava a baseline
+
+As baselines dependem da máquina: regrave-as ao trocar de ambiente.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.gerador import gerar_payloads  # noqa: E402
+from formatacao import formatar_brl_centavos, formatar_datas, formatar_extrato_html  # noqa: E402
+from processamento import (  # noqa: E402
+    ESQUEMAS,
+    agrupar_extrato,
+    compactar_movimentos,
+    extrair_itens,
+    juntar_clientes,
+    normalizar_clientes,
+    normalizar_movimentos,
+    preprocessar_receber,
+)
+
+CAMINHO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Diferenças abaixo disso (segundos) nunca contam como regressão
+FOLGA_ABSOLUTA = 0.005
+
+
+def medir(func, repeticoes):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempo = time.perf_counter() - inicio
+        melhor = tempo if melhor is None else min(melhor, tempo)
+    return melhor, resultado
+
+
+def executar_etapas(tamanho, repeticoes):
+    """
+    Executa o pipeline completo para `tamanho` movimentos e títulos,
+    retornando {etapa: segundos}.
+    """
+    payloads = gerar_payloads(tamanho, tamanho)
+    tempos = {}
+
+    def etapa(nome, func):
+        tempos[nome], resultado = medir(func, repeticoes)
+        return resultado
+
+    # Caminho antigo da carga (item inteiro), só para comparação
+    etapa("json_normalize", lambda: (
+        pd.json_normalize(payloads["movimentosBancarios"]["itens"]),
+        pd.json_normalize(payloads["recebers"]["itens"]),
+        pd.json_normalize(payloads["clientes"]["itens"]),
+    ))
+    df_mov_api, df_rec_api, df_cli_api = etapa("extrair_itens", lambda: tuple(
+        extrair_itens(payloads[endpoint]["itens"], ESQUEMAS[endpoint])
+        for endpoint in ["movimentosBancarios", "recebers", "clientes"]
+    ))
+    df_movimentos = etapa("normalizar_movimentos", lambda: compactar_movimentos(normalizar_movimentos(df_mov_api)))
+    df_clientes = normalizar_clientes(df_cli_api)
+    df_receber_raw = etapa("merge_clientes", lambda: juntar_clientes(df_rec_api.copy(), df_clientes))
+    df_receber = etapa("preprocessar_receber", lambda: preprocessar_receber(df_receber_raw))
+    df_extrato = etapa("agrupar_extrato", lambda: agrupar_extrato(df_movimentos))
+    etapa("formatar_brl", lambda: formatar_brl_centavos(df_receber['Valor']))
+    etapa("formatar_datas", lambda: formatar_datas(df_receber['Vencimento']))
+
+    df_extrato = df_extrato.sort_values('Data', ascending=False)
+    etapa("render_html_pagina", lambda: formatar_extrato_html(df_extrato.iloc[:100]))
+    etapa("render_html_completo", lambda: formatar_extrato_html(df_extrato))
+    return tempos
+
+
+def carregar_baseline():
+    if not os.path.exists(CAMINHO_BASELINE):
+        return {}
+    with open(CAMINHO_BASELINE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--tolerancia", type=float, default=1.5, help="fator acima da baseline que conta como regressão")
+    parser.add_argument("--salvar-baseline", action="store_true")
+    args = parser.parse_args()
+
+    baseline = carregar_baseline()
+    resultados = {}
+    regressoes = []
+
+    for tamanho in args.tamanhos:
+        tempos = executar_etapas(tamanho, args.repeticoes)
+        resultados[str(tamanho)] = tempos
+        referencia = baseline.get("tamanhos", {}).get(str(tamanho), {})
+
+        print(f"\n== {tamanho} movimentos / {tamanho} títulos ==")
+        print(f"{'etapa':<24}{'tempo (s)':>11}{'baseline':>11}{'razão':>8}")
+        for nome, tempo in tempos.items():
+            base = referencia.get(nome)
+            if base is None:
+                print(f"{nome:<24}{tempo:>11.4f}{'-':>11}{'-':>8}")
+                continue
+            razao = tempo / base if base else float("inf")
+            marca = ""
+            if tempo > base * args.tolerancia and tempo - base > FOLGA_ABSOLUTA:
+                marca = "  <-- REGRESSÃO"
+                regressoes.append((tamanho, nome, tempo, base))
+            print(f"{nome:<24}{tempo:>11.4f}{base:>11.4f}{razao:>8.2f}{marca}")
+
+    if args.salvar_baseline:
+        baseline.setdefault("tamanhos", {}).update(resultados)
+        baseline["maquina"] = f"{platform.system()} {platform.machine()} / Python {platform.python_version()} / pandas {pd.__version__}"
+        with open(CAMINHO_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nBaseline gravada em {CAMINHO_BASELINE}")
+    elif regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia}x a baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Compara o preprocessamento vetorizado das contas a receber
+(processamento.preprocessar_receber) com a implementação linha a linha
+anterior, conferindo que Status, Vencimento e Recebido em são idênticos:
+
+    python benchmarks/preprocessamento_receber.py [--titulos 100000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processamento import COLUNAS_DATA_RECEBER, para_centavos, preprocessar_receber  # noqa: E402
+
+
+# --- Implementação anterior (referência) ---
+
+def corrigir_fuso_horario(data_str):
+    if pd.isna(data_str) or data_str == '':
+        return data_str
+    data_str = str(data_str)
+    if not 'T' in data_str:
+        return data_str
+    try:
+        data_parte = data_str.split('T')[0]
+        return f"{data_parte}T00:00:00"
+    except:
+        return data_str
+
+
+def get_status(row):
+    try:
+        if pd.notna(row.get('dataBaixa')) or pd.notna(row.get('dataCredito')):
+            return "Baixado"
+        today = pd.to_datetime(date.today()).normalize()
+        vencimento = pd.to_datetime(row.get('dataVencimentoReal')).normalize()
+        if pd.isna(vencimento):
+            return "A vencer"
+        if vencimento == today:
+            return "Vence hoje"
+        elif vencimento < today:
+            return "Vencido"
+        else:
+            return "A vencer"
+    except Exception:
+        return "A vencer"
+
+
+def preprocessar_receber_linha_a_linha(df_receber_raw):
+    df_receber = df_receber_raw.copy()
+    for coluna in COLUNAS_DATA_RECEBER:
+        if coluna in df_receber.columns:
+            df_receber[coluna] = df_receber[coluna].apply(corrigir_fuso_horario)
+
+    def get_data_vencimento(row):
+        nominal = row.get('dataVencimentoNominal')
+        if pd.notna(nominal) and nominal != '' and nominal != 'NaT':
+            return nominal
+        real = row.get('dataVencimentoReal')
+        if pd.notna(real) and real != '' and real != 'NaT':
+            return real
+        return pd.NaT
+
+    df_receber['dataVencimentoFinal'] = df_receber.apply(get_data_vencimento, axis=1)
+    df_receber['dataVencimentoReal'] = pd.to_datetime(df_receber['dataVencimentoFinal'], errors='coerce', utc=False)
+    df_receber['dataBaixa'] = pd.to_datetime(df_receber.get('dataBaixa'), errors='coerce', utc=False)
+    df_receber['dataCredito'] = pd.to_datetime(df_receber.get('dataCredito'), errors='coerce', utc=False)
+    df_receber['Valor'] = pd.to_numeric(df_receber.get('valorBruto', 0), errors='coerce').fillna(0).abs()
+    df_receber['Status'] = df_receber.apply(get_status, axis=1)
+    df_receber['Vencimento'] = df_receber['dataVencimentoReal'].dt.date
+    df_receber['Recebido em'] = df_receber['dataBaixa'].dt.date
+    df_receber['Nº projeto'] = df_receber.get('codigoProjeto', 'N/A')
+    df_receber['Vencimento'] = df_receber['Vencimento'].apply(lambda x: x if not pd.isna(x) else None)
+    df_receber['Recebido em'] = df_receber['Recebido em'].apply(lambda x: x if not pd.isna(x) else None)
+    return df_receber
+
+
+# --- Dados sintéticos ---
+
+def gerar_recebers(n, seed=42):
+    rng = np.random.default_rng(seed)
+    hoje = date.today()
+    deslocamentos = rng.integers(-180, 90, n)
+    datas = np.array([(hoje + timedelta(days=int(d))).isoformat() for d in deslocamentos], dtype=object)
+    vencimento = datas + "T01:00:00-03:00"
+
+    nominal = vencimento.copy()
+    nominal[rng.random(n) < 0.1] = None
+    nominal[rng.random(n) < 0.02] = ''
+
+    baixa = np.where(rng.random(n) < 0.4, vencimento, None)
+    credito = np.where(rng.random(n) < 0.05, datas, None)
+
+    return pd.DataFrame({
+        'idCliente': rng.integers(0, 5000, n),
+        'valorBruto': rng.normal(1500, 900, n).round(2),
+        'dataVencimentoNominal': nominal,
+        'dataVencimentoReal': vencimento,
+        'dataBaixa': baixa,
+        'dataCredito': credito,
+        'codigoProjeto': rng.integers(1, 300, n).astype(str),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titulos", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df_raw = gerar_recebers(args.titulos)
+
+    inicio = time.perf_counter()
+    esperado = preprocessar_receber_linha_a_linha(df_raw)
+    tempo_linha = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    obtido = preprocessar_receber(df_raw)
+    tempo_vetorizado = time.perf_counter() - inicio
+
+    # A referência usa o schema antigo: datas como date, Valor em reais
+    esperado['Vencimento'] = pd.to_datetime(esperado['Vencimento'])
+    esperado['Recebido em'] = pd.to_datetime(esperado['Recebido em'])
+    esperado['Valor'] = para_centavos(esperado['Valor'])
+
+    for coluna in ['Status', 'Vencimento', 'Recebido em', 'Valor', 'dataVencimentoReal', 'Nº projeto']:
+        if not esperado[coluna].astype(object).equals(obtido[coluna].astype(object)):
+            print(f"DIVERGÊNCIA na coluna {coluna}")
+            sys.exit(1)
+
+    print(f"Títulos:        {args.titulos}")
+    print(f"Linha a linha:  {tempo_linha:.3f}s")
+    print(f"Vetorizado:     {tempo_vetorizado:.3f}s")
+    print(f"Ganho:          {tempo_linha / tempo_vetorizado:.1f}x")
+    print("Status, Vencimento e Recebido em idênticos")
+
+
+if __name__ == "__main__":
+    main()
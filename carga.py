@@ -0,0 +1,491 @@
+"""
+Carga dos dados da Flow2 sem Streamlit: busca, sincronização com o cache em
+disco e o histórico, normalização e snapshots compartilhados. Usado pelo app
+e pela exportação em lote (exportar.py).
+"""
+import contextvars
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+import pandas as pd
+
+from armazenamento import (
+    DATA_INICIAL,
+    carregar_frame,
+    carregar_frames_frescos,
+    carregar_registro_saldos,
+    carregar_ultima_copia,
+    inicio_janela_sync,
+    mesclar_clientes,
+    mesclar_movimentos,
+    registrar_saldos,
+    salvar_frame,
+    tenant_id,
+)
+from atualizacao import (
+    INTERVALO,
+    INTERVALO_CLIENTES,
+    antecipar,
+    idade_snapshot,
+    informar_buscado_em,
+    obter_snapshot,
+)
+from flow2_api import get_json_async, iter_paginas
+from historico import (
+    HISTORICO,
+    gravar_movimentos,
+    gravar_receber,
+    inicio_janela_historico,
+    liquido_movimentos,
+    sincronizado_ha,
+)
+from instrumentacao import etapa, registrar
+from processamento import (
+    COLUNAS_DIARIO,
+    COLUNAS_MOVIMENTOS,
+    ESQUEMAS,
+    compactar_movimentos,
+    curva_saldos,
+    extrair_itens,
+    indexar_clientes,
+    liquido_diario,
+    mesclar_diario,
+    nomear_clientes,
+    normalizar_clientes,
+    normalizar_movimentos,
+    normalizar_saldos,
+)
+
+# Sincronização incremental dos movimentos (FLOW2_SYNC_INCREMENTAL=0 volta à carga completa)
+SYNC_INCREMENTAL = os.environ.get("FLOW2_SYNC_INCREMENTAL", "1") != "0"
+
+# Cache persistente em disco compartilhado entre processos (FLOW2_CACHE_DISCO=0 desliga)
+CACHE_DISCO = os.environ.get("FLOW2_CACHE_DISCO", "1") != "0"
+
+# Registro em disco dos saldos de cada busca, base da curva de saldos
+# (FLOW2_REGISTRO_SALDOS=0 desliga; depende do cache em disco)
+REGISTRO_SALDOS = CACHE_DISCO and os.environ.get("FLOW2_REGISTRO_SALDOS", "1") != "0"
+
+# Itens lidos só pelos campos de ESQUEMAS, já tipados (FLOW2_PARSE_ESQUEMA=0
+# volta ao json_normalize do item inteiro)
+PARSE_ESQUEMA = os.environ.get("FLOW2_PARSE_ESQUEMA", "1") != "0"
+
+# Com FLOW2_PROCESSOS > 1, páginas com pelo menos LIMITE_PARALELO itens (ex:
+# listagem sem paginação) são normalizadas em blocos num pool de processos.
+# Desligado por padrão: os itens já decodificados precisam ser serializados
+# para os processos, o que custa mais que a extração por esquema
+# (benchmarks/parse_json.py mede os dois na máquina)
+PROCESSOS = int(os.environ.get("FLOW2_PROCESSOS", "1"))
+LIMITE_PARALELO = int(os.environ.get("FLOW2_LIMITE_PARALELO", "100000"))
+
+_lock_processos = threading.Lock()
+_pool_processos = None
+
+# No modo histórico o snapshot de contas a receber guarda só esta amostra
+# (para o expander de dados brutos); o resto é consultado no SQLite
+AMOSTRA_RECEBER = 10
+
+
+def chave_snapshot(nome, api_token):
+    return (nome, tenant_id(api_token))
+
+
+def normalizar_itens(itens, esquema=None, normalizar=None):
+    """
+    Frame tipado de uma lista de itens da API: só os campos do esquema
+    (extrair_itens) ou o item inteiro (json_normalize), seguido de
+    `normalizar`. Roda também nos processos do pool.
+    """
+    df_bloco = pd.json_normalize(itens) if esquema is None else extrair_itens(itens, esquema)
+    return df_bloco if normalizar is None else normalizar(df_bloco)
+
+
+def _processos():
+    """
+    Pool de processos criado no primeiro uso (None se já falhou). 'spawn'
+    porque o processo principal tem threads (Streamlit, cliente HTTP) e
+    fork não é seguro.
+    """
+    global _pool_processos
+    with _lock_processos:
+        if _pool_processos is None:
+            _pool_processos = ProcessPoolExecutor(max_workers=PROCESSOS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool_processos or None
+
+
+def normalizar_em_blocos(itens, esquema=None, normalizar=None):
+    """
+    normalizar_itens de um payload grande dividido em um bloco por
+    processo; os blocos voltam na ordem original. Se o pool não sobe (ex:
+    script sem o guarda de __main__), segue no próprio processo.
+    """
+    global _pool_processos
+    pool = _processos()
+    if pool is not None:
+        tamanho = -(-len(itens) // PROCESSOS)
+        blocos = [itens[inicio:inicio + tamanho] for inicio in range(0, len(itens), tamanho)]
+        try:
+            return pd.concat(list(pool.map(normalizar_itens, blocos, repeat(esquema), repeat(normalizar))), ignore_index=True)
+        except BrokenProcessPool:
+            with _lock_processos:
+                _pool_processos = False
+    return normalizar_itens(itens, esquema, normalizar)
+
+
+def carregar_paginado(endpoint, api_token, params=None, normalizar=None):
+    """
+    Lê o endpoint página por página (ou, sem paginação, bloco por bloco da
+    resposta única), normalizando cada uma assim que chega. Só os blocos já
+    tipados são acumulados, nunca o JSON inteiro.
+    """
+    esquema = ESQUEMAS.get(endpoint) if PARSE_ESQUEMA else None
+
+    # Tempo acumulado nas páginas: espera pela API, extração dos campos e
+    # tipagem (páginas divididas entre processos contam tudo em "extrair")
+    tempos = {"espera_http": 0.0, "extrair": 0.0, "normalizar": 0.0}
+    linhas = 0
+    marca = time.perf_counter()
+
+    blocos = []
+    for itens in iter_paginas(endpoint, api_token, params):
+        agora = time.perf_counter()
+        tempos["espera_http"] += agora - marca
+        if PROCESSOS > 1 and len(itens) >= LIMITE_PARALELO:
+            df_bloco, pendente = normalizar_em_blocos(itens, esquema, normalizar), None
+        else:
+            df_bloco, pendente = normalizar_itens(itens, esquema), normalizar
+        del itens
+        marca = time.perf_counter()
+        tempos["extrair"] += marca - agora
+        if pendente is not None:
+            df_bloco = pendente(df_bloco)
+            agora = time.perf_counter()
+            tempos["normalizar"] += agora - marca
+            marca = agora
+        linhas += len(df_bloco)
+        blocos.append(df_bloco)
+    tempos["espera_http"] += time.perf_counter() - marca
+
+    for nome, segundos in tempos.items():
+        if nome != "normalizar" or normalizar is not None:
+            registrar(f"carga.{endpoint}.{nome}", segundos, linhas=linhas)
+
+    if not blocos:
+        return pd.DataFrame()
+    if len(blocos) == 1:
+        return blocos[0]
+    return pd.concat(blocos, ignore_index=True)
+
+
+def buscar_movimentos(api_token, data_inicio):
+    """
+    Busca e normaliza os movimentos com DataMovimento >= data_inicio.
+    """
+    return carregar_paginado(
+        "movimentosBancarios", api_token,
+        {"DataMovimentoMaiorOuIgualA": data_inicio},
+        normalizar=normalizar_movimentos,
+    )
+
+
+def sincronizar_movimentos(api_token):
+    """
+    Sincronização incremental: busca só a janela recente (marca d'água menos
+    OVERLAP_DIAS) e mescla no store local pelo id do movimento. Retorna
+    também a data a partir da qual os dias podem ter mudado (None se tudo).
+    """
+    with etapa("carga.disco.ler_movimentos") as medida:
+        df_store, _ = carregar_frame(api_token, "movimentos")
+        medida["linhas"] = 0 if df_store is None else len(df_store)
+    inicio_janela = inicio_janela_sync(df_store)
+
+    df_novos = buscar_movimentos(api_token, inicio_janela)
+    with etapa("carga.movimentos.mesclar") as medida:
+        df_movimentos = mesclar_movimentos(df_store, df_novos, inicio_janela)
+        medida["linhas"] = len(df_movimentos)
+
+    if not df_movimentos.empty:
+        with etapa("carga.disco.salvar_movimentos", linhas=len(df_movimentos)):
+            salvar_frame(api_token, "movimentos", df_movimentos)
+
+    if df_store is None or df_store.empty or inicio_janela == DATA_INICIAL:
+        return df_movimentos, None
+    # Movimentos que voltaram na janela com outra data também mudam o dia antigo
+    desde = pd.Timestamp(inicio_janela)
+    if not df_novos.empty and 'id' in df_novos.columns:
+        movidos = df_store.loc[df_store['id'].isin(df_novos['id']), 'Data'].min()
+        if pd.notna(movidos):
+            desde = min(desde, movidos)
+    return df_movimentos, desde
+
+
+def sincronizar_historico(api_token):
+    """
+    Modo histórico: busca só a janela recente e a grava no SQLite, que
+    guarda todos os anos já sincronizados.
+    """
+    inicio_janela = inicio_janela_historico(api_token)
+    df_novos = buscar_movimentos(api_token, inicio_janela)
+    with etapa("carga.historico.gravar_movimentos", linhas=len(df_novos)):
+        gravar_movimentos(api_token, df_novos, inicio_janela)
+
+
+def historico_em_dia(api_token, tabela):
+    idade = sincronizado_ha(api_token, tabela)
+    return idade is not None and idade < INTERVALO
+
+
+def montar_curva_saldos(api_token, df_diario):
+    """
+    Curva de saldo diário por banco: líquido do rollup diário (ou do
+    histórico) acumulado e ancorado nos saldos registrados.
+    """
+    with etapa("carga.saldos.curva") as medida:
+        df_liquido = liquido_movimentos(api_token) if HISTORICO else liquido_diario(df_diario)
+        df_curva = curva_saldos(df_liquido, carregar_registro_saldos(api_token))
+        medida["linhas"] = len(df_curva)
+    return df_curva
+
+
+def buscar_movimentos_e_saldos(api_token):
+    """
+    Carrega dados das APIs de movimentos e saldos. Retorna (saldos, rollup
+    diário, curva de saldos): os movimentos ficam só no store em disco, as
+    telas partem do rollup.
+    """
+    # Partida a quente: frames recentes gravados por qualquer processo
+    if CACHE_DISCO:
+        with etapa("carga.disco.ler_frescos"):
+            if HISTORICO:
+                # Os movimentos ficam no histórico: basta ele estar em dia
+                copia = None
+                if historico_em_dia(api_token, "movimentos"):
+                    copia = carregar_frames_frescos(api_token, ["saldos"], ttl=INTERVALO)
+                if copia is not None:
+                    frames, buscado_em = copia
+                    buscado_em = min(buscado_em, time.time() - (sincronizado_ha(api_token, "movimentos") or 0))
+                    copia = [frames[0], pd.DataFrame(columns=COLUNAS_DIARIO)], buscado_em
+            else:
+                # O rollup é gravado junto com cada carga: os movimentos em
+                # si não entram no snapshot
+                copia = carregar_frames_frescos(api_token, ["saldos", "diario"], ttl=INTERVALO)
+        if copia is not None:
+            (df_saldos, df_diario), buscado_em = copia
+            informar_buscado_em(buscado_em)
+            return df_saldos, df_diario, montar_curva_saldos(api_token, df_diario)
+
+    # Saldos são buscados em paralelo enquanto os movimentos sincronizam
+    futuro_saldos = get_json_async("saldoBancos", api_token)
+
+    # 1. Carregar Movimentos Bancários
+    desde = None
+    if HISTORICO:
+        sincronizar_historico(api_token)
+        df_movimentos = pd.DataFrame(columns=COLUNAS_MOVIMENTOS)
+    elif SYNC_INCREMENTAL:
+        df_movimentos, desde = sincronizar_movimentos(api_token)
+    else:
+        df_movimentos = buscar_movimentos(api_token, DATA_INICIAL)
+
+    if df_movimentos.empty:
+        # Cria DataFrame vazio com colunas esperadas
+        df_movimentos = pd.DataFrame(columns=COLUNAS_MOVIMENTOS)
+    with etapa("carga.movimentos.compactar", linhas=len(df_movimentos)):
+        df_movimentos = compactar_movimentos(df_movimentos)
+
+    # Rollup diário (Data, Banco, Descrição) usado pelo extrato e pelos KPIs;
+    # numa sincronização incremental só os dias da janela são reagregados
+    with etapa("carga.movimentos.agregar_diario") as medida:
+        df_diario_anterior = None
+        if desde is not None:
+            df_diario_anterior, _ = carregar_frame(api_token, "diario")
+        df_diario = mesclar_diario(df_diario_anterior, df_movimentos, desde)
+        medida["linhas"] = len(df_diario)
+
+    # 2. Carregar Saldo dos Bancos
+    with etapa("carga.saldoBancos.espera_http"):
+        saldos = futuro_saldos.result()
+    with etapa("carga.saldoBancos.normalizar") as medida:
+        df_saldos = normalizar_saldos(saldos)
+        medida["linhas"] = len(df_saldos)
+    if REGISTRO_SALDOS:
+        with etapa("carga.disco.registrar_saldos", linhas=len(df_saldos)):
+            registrar_saldos(api_token, df_saldos)
+
+    # O rollup acompanha o store de movimentos (a próxima sincronização parte dele)
+    if (CACHE_DISCO or SYNC_INCREMENTAL) and not HISTORICO:
+        with etapa("carga.disco.salvar_diario", linhas=len(df_diario)):
+            salvar_frame(api_token, "diario", df_diario)
+
+    if CACHE_DISCO:
+        with etapa("carga.disco.salvar_bancario", linhas=len(df_movimentos) + len(df_saldos)):
+            if not SYNC_INCREMENTAL and not HISTORICO:
+                salvar_frame(api_token, "movimentos", df_movimentos)
+            salvar_frame(api_token, "saldos", df_saldos)
+
+    return df_saldos, df_diario, montar_curva_saldos(api_token, df_diario)
+
+
+def buscar_clientes(api_token):
+    """
+    Diretório de clientes como índice id -> nome. Tem validade própria
+    (FLOW2_CLIENTES_TTL), bem maior que a das contas a receber.
+    """
+    # Disco só na primeira carga do processo: as atualizações seguintes
+    # (inclusive as antecipadas por clientes novos) precisam ir à API
+    if CACHE_DISCO and idade_snapshot(chave_snapshot("clientes", api_token)) is None:
+        with etapa("carga.disco.ler_clientes"):
+            copia = carregar_frames_frescos(api_token, ["clientes"], ttl=INTERVALO_CLIENTES)
+        if copia is not None:
+            frames, buscado_em = copia
+            informar_buscado_em(buscado_em)
+            return indexar_clientes(frames[0])
+
+    df_clientes = carregar_paginado("clientes", api_token, None, normalizar_clientes)
+    if df_clientes.empty:
+        df_clientes = pd.DataFrame(columns=['idCliente', 'Cliente'])
+
+    if CACHE_DISCO:
+        df_anterior, _ = carregar_frame(api_token, "clientes")
+        df_clientes = mesclar_clientes(df_anterior, df_clientes)
+        with etapa("carga.disco.salvar_clientes", linhas=len(df_clientes)):
+            salvar_frame(api_token, "clientes", df_clientes)
+
+    with etapa("carga.clientes.indexar", linhas=len(df_clientes)):
+        return indexar_clientes(df_clientes)
+
+
+def load_clientes(api_token):
+    """
+    Índice de clientes do snapshot de vida longa (atualizado em background).
+    """
+    snapshot = obter_snapshot(
+        chave_snapshot("clientes", api_token), lambda: buscar_clientes(api_token), intervalo=INTERVALO_CLIENTES
+    )
+    return snapshot["dados"]
+
+
+def buscar_receber_e_clientes(api_token):
+    """
+    Carrega as Contas a Receber e resolve o nome dos clientes pelo diretório
+    em cache (que não é baixado de novo a cada atualização dos títulos).
+    """
+    df_receber = None
+    buscado = False
+
+    # Partida a quente: frame recente gravado por qualquer processo
+    if CACHE_DISCO:
+        with etapa("carga.disco.ler_frescos"):
+            copia = carregar_frames_frescos(api_token, ["receber"], ttl=INTERVALO)
+        if copia is not None:
+            (df_receber,), buscado_em = copia
+            informar_buscado_em(buscado_em)
+
+    # Diretório de clientes em paralelo (só vai à API quando o snapshot dele é criado)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        futuro_clientes = pool.submit(contextvars.copy_context().run, load_clientes, api_token)
+
+        # 1. Carregar Contas a Receber
+        if df_receber is None:
+            df_receber = carregar_paginado("recebers", api_token)
+            buscado = True
+            if CACHE_DISCO:
+                with etapa("carga.disco.salvar_receber", linhas=len(df_receber)):
+                    salvar_frame(api_token, "receber", df_receber)
+
+        # 2. Índice id -> nome dos clientes
+        indice_clientes = futuro_clientes.result()
+
+    # 3. Nomes pelo índice categórico, sem merge
+    with etapa("carga.receber.nomear_clientes", linhas=len(df_receber)):
+        df_final = nomear_clientes(df_receber, indice_clientes)
+
+    # Títulos de clientes fora do diretório (cadastros novos): atualiza o
+    # diretório agora em vez de esperar a validade dele
+    if 'idCliente' in df_receber.columns:
+        ids = df_receber['idCliente'].dropna()
+        desconhecidos = ids[~ids.isin(indice_clientes.index)].unique()
+        if len(desconhecidos):
+            antecipar(chave_snapshot("clientes", api_token), motivo=hash(frozenset(desconhecidos.tolist())))
+
+    if HISTORICO:
+        # Títulos vindos do disco já foram gravados no histórico por quem os buscou
+        if buscado or sincronizado_ha(api_token, "recebers") is None:
+            with etapa("carga.historico.gravar_receber", linhas=len(df_final)):
+                gravar_receber(api_token, df_final)
+        return df_final.head(AMOSTRA_RECEBER)
+
+    return df_final
+
+
+def reserva_bancario(api_token):
+    """
+    Última cópia em disco dos saldos e do rollup diário, mesmo vencida,
+    para quando a Flow2 falha na primeira carga.
+    """
+    if not CACHE_DISCO:
+        return None
+    if HISTORICO:
+        copia = carregar_ultima_copia(api_token, ["saldos"])
+        if copia is None:
+            return None
+        (df_saldos,), buscado_em = copia
+        df_diario = pd.DataFrame(columns=COLUNAS_DIARIO)
+        return (df_saldos, df_diario, montar_curva_saldos(api_token, df_diario)), buscado_em
+    copia = carregar_ultima_copia(api_token, ["saldos", "diario"])
+    if copia is None:
+        return None
+    (df_saldos, df_diario), buscado_em = copia
+    return (df_saldos, df_diario, montar_curva_saldos(api_token, df_diario)), buscado_em
+
+
+def reserva_receber(api_token):
+    """
+    Última cópia em disco das contas a receber, com os nomes do último
+    diretório de clientes salvo.
+    """
+    if not CACHE_DISCO:
+        return None
+    copia = carregar_ultima_copia(api_token, ["receber"])
+    if copia is None:
+        return None
+    (df_receber,), buscado_em = copia
+    df_clientes, _ = carregar_frame(api_token, "clientes")
+    if df_clientes is None:
+        df_clientes = pd.DataFrame(columns=['idCliente', 'Cliente'])
+    df_final = nomear_clientes(df_receber, indexar_clientes(df_clientes))
+    if HISTORICO:
+        df_final = df_final.head(AMOSTRA_RECEBER)
+    return df_final, buscado_em
+
+
+def obter_bancario(api_token):
+    """
+    Último snapshot bancário (saldos, rollup diário e curva de saldos),
+    atualizado em background. Propaga a exceção se a primeira carga falhar
+    sem cópia em disco.
+    """
+    snapshot = obter_snapshot(
+        chave_snapshot("bancario", api_token),
+        lambda: buscar_movimentos_e_saldos(api_token),
+        reserva=lambda: reserva_bancario(api_token),
+    )
+    return snapshot["dados"]
+
+
+def obter_receber(api_token):
+    """
+    Último snapshot de contas a receber (com o nome dos clientes), atualizado
+    em background.
+    """
+    snapshot = obter_snapshot(
+        chave_snapshot("receber", api_token),
+        lambda: buscar_receber_e_clientes(api_token),
+        reserva=lambda: reserva_receber(api_token),
+    )
+    return snapshot["dados"]
@@ -0,0 +1,275 @@
+"""
+Exportação em lote (sem Streamlit) das mesmas visões do app: extrato
+agrupado, saldos e contas a receber, filtradas por período, bancos e status.
+Reusa o cache em disco e os snapshots do app e grava em blocos, então a
+memória extra fica limitada ao bloco sendo escrito:
+
+    FLOW_API_TOKEN=... python exportar.py --formato csv --saida exportacoes/
+    python exportar.py --formato parquet --inicio 2025-01-01 --fim 2025-06-30 --bancos ITAU
+    python exportar.py --formato xlsx --relatorios receber --status Vencido "A vencer"
+
+O token vem de --token, de FLOW_API_TOKEN ou de .streamlit/secrets.toml.
+Excel precisa do openpyxl (opcional, não faz parte do requirements.txt).
+"""
+import argparse
+import os
+import sys
+import tomllib
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from atualizacao import erro_snapshot, idade_snapshot
+from carga import chave_snapshot, obter_bancario, obter_receber
+from filtros import filtrar_movimentos, filtrar_receber
+from historico import (
+    HISTORICO,
+    bancos_movimentos,
+    consultar_receber,
+    extrato,
+    limites_movimentos,
+    limites_receber,
+)
+from instrumentacao import etapa
+from processamento import COLUNAS_DETALHE_RECEBER, agrupar_extrato, preprocessar_receber
+
+RELATORIOS = ["extrato", "saldos", "receber"]
+FORMATOS = ["csv", "parquet", "xlsx"]
+
+# Linhas convertidas e gravadas por vez
+TAMANHO_BLOCO = 50_000
+
+# Colunas em centavos convertidas para reais na exportação
+COLUNAS_VALOR = ['Total Entradas', 'Total Saídas', 'Saldo dos bancos', 'Valor']
+
+
+def ler_token(token=None):
+    """
+    Token da API: argumento, variável FLOW_API_TOKEN ou secrets do Streamlit.
+    """
+    token = token or os.environ.get("FLOW_API_TOKEN")
+    if token:
+        return token
+    caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+    try:
+        with open(caminho, "rb") as f:
+            return tomllib.load(f).get("FLOW_API_TOKEN")
+    except (OSError, tomllib.TOMLDecodeError):
+        return None
+
+
+def avisar_reserva(nome, api_token):
+    """
+    Avisa (stderr) quando a Flow2 falhou e a exportação usa a cópia em disco.
+    """
+    chave = chave_snapshot(nome, api_token)
+    erro = erro_snapshot(chave)
+    if erro:
+        idade = idade_snapshot(chave) or 0
+        print(f"aviso: {nome} vem da cópia em disco de {idade / 60:.0f} min atrás ({erro})", file=sys.stderr)
+
+
+def visao_extrato(api_token, df_diario, inicio=None, fim=None, bancos=None):
+    """
+    Extrato agrupado por Data e Descrição (como na tela), em ordem de data.
+    Sem período usa todo o intervalo dos dados; sem bancos, todos.
+    """
+    if HISTORICO:
+        primeira, ultima = limites_movimentos(api_token)
+        if primeira is None:
+            return None
+        return extrato(api_token, inicio or primeira, fim or ultima, bancos or bancos_movimentos(api_token))
+
+    if df_diario.empty:
+        return None
+    inicio = inicio or df_diario['Data'].min().date()
+    fim = fim or df_diario['Data'].max().date()
+    bancos = bancos or df_diario['Banco'].dropna().unique().tolist()
+    return agrupar_extrato(filtrar_movimentos(df_diario, inicio, fim, bancos))
+
+
+def visao_saldos(df_saldos, bancos=None):
+    if df_saldos.empty or not bancos:
+        return df_saldos
+    return df_saldos[df_saldos['Banco'].isin(bancos)]
+
+
+def visao_receber(api_token, df_receber_raw, inicio=None, fim=None, status=None, hoje=None):
+    """
+    Detalhe das contas a receber com as colunas da tela. Sem período usa o
+    intervalo de vencimentos; lista de status vazia não filtra.
+    """
+    hoje = hoje or date.today()
+    status = status or []
+    if HISTORICO:
+        primeira, ultima = limites_receber(api_token)
+        if primeira is None:
+            return None
+        return consultar_receber(api_token, inicio or primeira, fim or ultima, status, hoje)
+
+    if df_receber_raw.empty:
+        return None
+    df_receber = preprocessar_receber(df_receber_raw, hoje)
+    inicio = inicio or df_receber['Vencimento'].min().date()
+    fim = fim or df_receber['Vencimento'].max().date()
+    df_filtrado = filtrar_receber(df_receber, inicio, fim, status)
+    return df_filtrado[[c for c in COLUNAS_DETALHE_RECEBER if c in df_filtrado.columns]]
+
+
+def preparar_bloco(df_bloco):
+    """
+    Bloco pronto para gravar: valores em reais, categorias como texto e
+    datas sem hora. As colunas substituídas não alteram o frame de origem
+    (copy-on-write).
+    """
+    for coluna in df_bloco.columns:
+        serie = df_bloco[coluna]
+        if coluna in COLUNAS_VALOR:
+            df_bloco[coluna] = serie.to_numpy(dtype='int64') / 100
+        elif serie.dtype == 'category':
+            df_bloco[coluna] = serie.astype(str)
+        elif serie.dtype.kind == 'M':
+            df_bloco[coluna] = serie.dt.date
+    return df_bloco.rename(columns={'Descricao': 'Descrição'})
+
+
+def blocos(df, tamanho_bloco):
+    for inicio in range(0, len(df), tamanho_bloco):
+        yield preparar_bloco(df.iloc[inicio:inicio + tamanho_bloco])
+
+
+def gravar_csv(df, caminho, tamanho_bloco):
+    # ';' e vírgula decimal, com BOM, para abrir direto no Excel em pt-BR
+    with open(caminho, "w", encoding="utf-8-sig", newline="") as f:
+        preparar_bloco(df.head(0)).to_csv(f, sep=";", index=False)
+        for df_bloco in blocos(df, tamanho_bloco):
+            df_bloco.to_csv(f, sep=";", decimal=",", float_format="%.2f", index=False, header=False)
+
+
+def gravar_parquet(df, caminho, tamanho_bloco):
+    escritor = None
+    try:
+        for df_bloco in blocos(df, tamanho_bloco):
+            tabela = pa.Table.from_pandas(df_bloco, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(caminho, tabela.schema)
+            escritor.write_table(tabela.cast(escritor.schema))
+        if escritor is None:
+            pq.write_table(pa.Table.from_pandas(preparar_bloco(df.head(0)), preserve_index=False), caminho)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def gravar_xlsx(df, caminho, tamanho_bloco):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise SystemExit("Exportação em Excel precisa do openpyxl: pip install openpyxl")
+
+    # Modo write-only: as linhas vão para o arquivo sem montar a planilha em memória
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet()
+    planilha.append([c if c != 'Descricao' else 'Descrição' for c in df.columns])
+    for df_bloco in blocos(df, tamanho_bloco):
+        for linha in df_bloco.itertuples(index=False, name=None):
+            planilha.append([None if v != v else v for v in linha])
+    livro.save(caminho)
+
+
+GRAVADORES = {"csv": gravar_csv, "parquet": gravar_parquet, "xlsx": gravar_xlsx}
+
+
+def gravar(df, caminho, formato, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Grava o frame em blocos num arquivo temporário e o renomeia no fim, para
+    que um arquivo pela metade nunca fique no lugar do anterior.
+    """
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        GRAVADORES[formato](df, tmp, tamanho_bloco)
+        os.replace(tmp, caminho)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def exportar(api_token, relatorios, formato, saida, inicio=None, fim=None, bancos=None, status=None,
+             tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Carrega os dados (cache em disco ou Flow2) e grava um arquivo por
+    relatório em `saida`. Retorna {relatório: (caminho, linhas)}.
+    """
+    os.makedirs(saida, exist_ok=True)
+    gerados = {}
+
+    if "extrato" in relatorios or "saldos" in relatorios:
+        df_saldos, df_diario, _ = obter_bancario(api_token)
+        avisar_reserva("bancario", api_token)
+        visoes = {
+            "extrato": lambda: visao_extrato(api_token, df_diario, inicio, fim, bancos),
+            "saldos": lambda: visao_saldos(df_saldos, bancos),
+        }
+        for nome in ["extrato", "saldos"]:
+            if nome in relatorios:
+                gerados[nome] = _exportar_visao(nome, visoes[nome], formato, saida, tamanho_bloco)
+
+    if "receber" in relatorios:
+        df_receber_raw = obter_receber(api_token)
+        avisar_reserva("receber", api_token)
+        gerados["receber"] = _exportar_visao(
+            "receber", lambda: visao_receber(api_token, df_receber_raw, inicio, fim, status), formato, saida, tamanho_bloco
+        )
+    return gerados
+
+
+def _exportar_visao(nome, montar, formato, saida, tamanho_bloco):
+    with etapa(f"exportar.{nome}") as medida:
+        df = montar()
+        if df is None:
+            return None
+        caminho = os.path.join(saida, f"{nome}.{formato}")
+        gravar(df, caminho, formato, tamanho_bloco)
+        medida["linhas"] = len(df)
+    return caminho, len(df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token", help="token da API Flow2 (padrão: FLOW_API_TOKEN ou secrets do Streamlit)")
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--saida", default="exportacoes", help="diretório dos arquivos gerados")
+    parser.add_argument("--relatorios", nargs="+", choices=RELATORIOS, default=RELATORIOS)
+    parser.add_argument("--inicio", type=date.fromisoformat, help="AAAA-MM-DD (padrão: primeira data)")
+    parser.add_argument("--fim", type=date.fromisoformat, help="AAAA-MM-DD (padrão: última data)")
+    parser.add_argument("--bancos", nargs="+", help="bancos do extrato e dos saldos (padrão: todos)")
+    parser.add_argument("--status", nargs="+", help="status das contas a receber (padrão: todos)")
+    parser.add_argument("--tamanho-bloco", type=int, default=TAMANHO_BLOCO)
+    args = parser.parse_args(argv)
+
+    api_token = ler_token(args.token)
+    if not api_token:
+        parser.error("informe o token da API (--token ou FLOW_API_TOKEN)")
+
+    try:
+        gerados = exportar(
+            api_token, args.relatorios, args.formato, args.saida,
+            inicio=args.inicio, fim=args.fim, bancos=args.bancos, status=args.status,
+            tamanho_bloco=args.tamanho_bloco,
+        )
+    except Exception as e:
+        print(f"erro: {e}", file=sys.stderr)
+        return 1
+
+    for nome in args.relatorios:
+        if gerados.get(nome) is None:
+            print(f"{nome}: sem dados")
+        else:
+            caminho, linhas = gerados[nome]
+            print(f"{nome}: {linhas} linhas em {caminho}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
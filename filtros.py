@@ -0,0 +1,221 @@
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Resultados de filtro guardados por snapshot (os mais antigos saem primeiro)
+MAX_RESULTADOS = 32
+
+# Memória total do que é derivado dos snapshots (frames preprocessados,
+# índices, resultados de filtro...), somada à dos snapshots; acima disso os
+# menos usados recentemente são descartados e recalculados se preciso
+ORCAMENTO_DERIVADOS = int(os.environ.get("FLOW2_CACHE_DERIVADOS_MB", "512")) * 1024 ** 2
+
+# RLock: o descarte de um derivado pode liberar um frame e disparar o
+# finalizador dele (_esquecer) na mesma thread
+_lock = threading.RLock()
+_estados = {}
+_uso = OrderedDict()  # (estado, grupo, nome) -> bytes, do menos para o mais usado
+_ocupacao = {"bytes": 0, "descartes": 0}
+
+
+def _estado(df):
+    """
+    Estado derivado de um frame de snapshot (índices, memos), descartado
+    automaticamente quando o frame deixa de existir.
+    """
+    chave = id(df)
+    with _lock:
+        estado = _estados.get(chave)
+        if estado is None:
+            estado = {"chave": chave, "derivados": {}, "resultados": OrderedDict()}
+            _estados[chave] = estado
+            weakref.finalize(df, _esquecer, chave)
+        return estado
+
+
+def _esquecer(chave):
+    with _lock:
+        estado = _estados.pop(chave, None)
+        if estado is None:
+            return
+        for grupo in ("derivados", "resultados"):
+            for nome in estado[grupo]:
+                _liberar((chave, grupo, nome))
+
+
+def _tamanho(valor):
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sum(_tamanho(v) for v in valor.values())
+    if isinstance(valor, (tuple, list)):
+        return sum(_tamanho(v) for v in valor)
+    if hasattr(valor, "memory_usage"):
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum() if hasattr(uso, "sum") else uso)
+    return sys.getsizeof(valor)
+
+
+def _liberar(entrada):
+    """
+    Tira a entrada da contabilidade. Chamado com _lock adquirido.
+    """
+    _ocupacao["bytes"] -= _uso.pop(entrada, 0)
+
+
+def _tocar(estado, grupo, nome):
+    entrada = (estado["chave"], grupo, nome)
+    with _lock:
+        if entrada in _uso:
+            _uso.move_to_end(entrada)
+
+
+def _guardar(estado, grupo, nome, valor):
+    """
+    Guarda `valor` no estado e contabiliza o tamanho; descarta os derivados
+    menos usados (de qualquer snapshot) até caber em ORCAMENTO_DERIVADOS,
+    sempre mantendo o que acabou de ser guardado.
+    """
+    tamanho = _tamanho(valor)
+    entrada = (estado["chave"], grupo, nome)
+    with _lock:
+        estado[grupo][nome] = valor
+        _liberar(entrada)
+        _uso[entrada] = tamanho
+        _ocupacao["bytes"] += tamanho
+        while ORCAMENTO_DERIVADOS and _ocupacao["bytes"] > ORCAMENTO_DERIVADOS and len(_uso) > 1:
+            antiga = next(iter(_uso))
+            _liberar(antiga)
+            _ocupacao["descartes"] += 1
+            chave, grupo_antigo, nome_antigo = antiga
+            dono = _estados.get(chave)
+            if dono is not None:
+                dono[grupo_antigo].pop(nome_antigo, None)
+
+
+def _remover(estado, grupo, nome):
+    with _lock:
+        estado[grupo].pop(nome, None)
+        _liberar((estado["chave"], grupo, nome))
+
+
+def ocupacao():
+    """
+    Memória dos derivados de todos os snapshots: bytes, entradas, orçamento
+    e quantos foram descartados por ele.
+    """
+    with _lock:
+        return {**_ocupacao, "entradas": len(_uso), "orcamento_bytes": ORCAMENTO_DERIVADOS}
+
+
+def derivado(df, nome, calcular, versao=None):
+    """
+    Memoiza `calcular(df)` para o snapshot `df` sob o nome dado. Com
+    `versao` (ex: o dia, para o que depende de hoje) só a última versão de
+    cada nome é mantida: uma versão nova substitui a anterior. O resultado
+    é compartilhado e não deve ser alterado.
+    """
+    estado = _estado(df)
+    guardado = estado["derivados"].get(nome)
+    if guardado is not None and guardado[0] == versao:
+        _tocar(estado, "derivados", nome)
+        return guardado[1]
+    resultado = calcular(df)
+    _guardar(estado, "derivados", nome, (versao, resultado))
+    return resultado
+
+
+def _memo(df, filtro, calcular):
+    estado = _estado(df)
+    resultados = estado["resultados"]
+    with _lock:
+        if filtro in resultados:
+            resultados.move_to_end(filtro)
+            _tocar(estado, "resultados", filtro)
+            return resultados[filtro]
+
+    resultado = calcular()
+    _guardar(estado, "resultados", filtro, resultado)
+    with _lock:
+        while len(resultados) > MAX_RESULTADOS:
+            _remover(estado, "resultados", next(iter(resultados)))
+    return resultado
+
+
+def _indexar(df, coluna_data, coluna_chave):
+    """
+    Índice do snapshot: posições ordenadas pela data (para busca binária do
+    período) e códigos categóricos da coluna chave na mesma ordem.
+    """
+    datas = pd.to_datetime(df[coluna_data], errors='coerce').to_numpy(dtype='datetime64[ns]')
+    ordem = np.argsort(datas, kind='stable')
+    categorias = pd.Categorical(df[coluna_chave])
+    return {
+        "ordem": ordem,
+        "datas": datas[ordem],
+        "codigos": categorias.codes[ordem],
+        "categorias": categorias.categories,
+    }
+
+
+def _posicoes(indice, inicio, fim, valores):
+    """
+    Posições (na ordem original) com data em [inicio, fim] e chave em `valores`.
+    `valores` None não filtra pela chave.
+    """
+    lo = np.searchsorted(indice["datas"], np.datetime64(pd.Timestamp(inicio), 'ns'), side='left')
+    hi = np.searchsorted(indice["datas"], np.datetime64(pd.Timestamp(fim), 'ns'), side='right')
+    posicoes = indice["ordem"][lo:hi]
+
+    if valores is not None:
+        codigos = indice["categorias"].get_indexer(list(valores))
+        posicoes = posicoes[np.isin(indice["codigos"][lo:hi], codigos[codigos >= 0])]
+
+    return np.sort(posicoes)
+
+
+def filtrar_movimentos(df_movimentos, inicio, fim, bancos):
+    """
+    Movimentos com Data no período e Banco entre os selecionados.
+    """
+    filtro = ("movimentos", inicio, fim, tuple(sorted(map(str, bancos))))
+
+    def calcular():
+        indice = derivado(df_movimentos, "indice", lambda df: _indexar(df, 'Data', 'Banco'))
+        return df_movimentos.take(_posicoes(indice, inicio, fim, bancos))
+
+    return _memo(df_movimentos, filtro, calcular)
+
+
+def filtrar_receber(df_receber, inicio, fim, status):
+    """
+    Títulos com Vencimento no período e Status entre os selecionados
+    (lista de status vazia não filtra por status).
+    """
+    filtro = ("receber", inicio, fim, tuple(sorted(status)))
+
+    def calcular():
+        indice = derivado(df_receber, "indice", lambda df: _indexar(df, 'Vencimento', 'Status'))
+        return df_receber.take(_posicoes(indice, inicio, fim, status or None))
+
+    return _memo(df_receber, filtro, calcular)
+
+
+def fatiar_cubo(df_cubo, inicio, fim, status):
+    """
+    Linhas do cubo de contas a receber das semanas que tocam o período, com
+    Status entre os selecionados (lista de status vazia não filtra por status).
+    """
+    filtro = ("cubo", inicio, fim, tuple(sorted(status)))
+
+    def calcular():
+        indice = derivado(df_cubo, "indice", lambda df: _indexar(df, 'Semana', 'Status'))
+        primeira_semana = pd.Timestamp(inicio) - pd.Timedelta(days=pd.Timestamp(inicio).dayofweek)
+        return df_cubo.take(_posicoes(indice, primeira_semana, fim, status or None))
+
+    return _memo(df_cubo, filtro, calcular)
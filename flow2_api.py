@@ -0,0 +1,363 @@
+import codecs
+import contextvars
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# URL base da API (aponte FLOW2_API_BASE_URL para o servidor de testes local)
+API_BASE_URL = os.environ.get("FLOW2_API_BASE_URL", "https://api.flow2.com.br/v1").rstrip("/")
+
+# Conexões mantidas abertas por host (uma por requisição simultânea)
+POOL_CONEXOES = 8
+TIMEOUT = 30
+
+# Leitura paginada dos endpoints de listagem (FLOW2_PAGINACAO=1). Desligada
+# por padrão: os parâmetros Pagina/TamanhoPagina ainda não foram confirmados
+# com a Flow2, e sem paginação a listagem vem inteira (DesabilitarPaginacao=true)
+# numa resposta lida em fluxo
+PAGINACAO = os.environ.get("FLOW2_PAGINACAO", "0") != "0"
+TAMANHO_PAGINA = int(os.environ.get("FLOW2_TAMANHO_PAGINA", "500"))
+
+# Itens por bloco na leitura em fluxo da listagem sem paginação e bytes lidos
+# da conexão por vez
+TAMANHO_BLOCO = int(os.environ.get("FLOW2_TAMANHO_BLOCO", "5000"))
+PEDACO_BYTES = 64 * 1024
+
+# Tentativas por requisição em erros transitórios (rede, 429 e 5xx), com
+# espera exponencial aleatória (full jitter) limitada a ESPERA_MAXIMA segundos
+TENTATIVAS = max(int(os.environ.get("FLOW2_TENTATIVAS", "3")), 1)
+ESPERA_BASE = float(os.environ.get("FLOW2_ESPERA_BASE", "0.5"))
+ESPERA_MAXIMA = 10.0
+STATUS_TRANSITORIOS = {429, 500, 502, 503, 504}
+
+_sessao = None
+_executor = ThreadPoolExecutor(max_workers=POOL_CONEXOES, thread_name_prefix="flow2")
+_requisicoes = contextvars.ContextVar("requisicoes_flow2", default=None)
+
+
+def criar_sessao():
+    """
+    Cria uma sessão HTTP com pool de conexões keep-alive e compressão gzip.
+    """
+    sessao = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_CONEXOES)
+    sessao.mount("https://", adapter)
+    sessao.mount("http://", adapter)
+    sessao.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+    return sessao
+
+
+def get_sessao():
+    """
+    Retorna a sessão compartilhada pelo processo (criada sob demanda).
+    """
+    global _sessao
+    if _sessao is None:
+        _sessao = criar_sessao()
+    return _sessao
+
+
+def headers_auth(api_token):
+    return {"Authorization": f"Bearer {api_token}"}
+
+
+def espera_retentativa(tentativa, response=None):
+    """
+    Segundos até a próxima tentativa: Retry-After quando a API informa,
+    senão um valor aleatório até ESPERA_BASE * 2^tentativa.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), ESPERA_MAXIMA)
+    return random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** tentativa))
+
+
+def get(endpoint, api_token, params=None, headers=None, stream=False):
+    """
+    GET com novas tentativas nos erros transitórios. Retorna a resposta
+    (inclusive 304); outros erros HTTP viram exceção. Com stream=True o corpo
+    fica na conexão para ser lido aos pedaços (e a resposta deve ser fechada).
+    """
+    for tentativa in range(TENTATIVAS):
+        ultima = tentativa == TENTATIVAS - 1
+        try:
+            response = get_sessao().get(
+                f"{API_BASE_URL}/{endpoint}",
+                headers={**headers_auth(api_token), **(headers or {})},
+                params=params,
+                timeout=TIMEOUT,
+                stream=stream,
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            if ultima:
+                raise
+            time.sleep(espera_retentativa(tentativa))
+            continue
+
+        if response.status_code in STATUS_TRANSITORIOS and not ultima:
+            response.close()
+            time.sleep(espera_retentativa(tentativa, response))
+            continue
+        response.raise_for_status()
+        return response
+
+
+def get_json(endpoint, api_token, params=None, registrar=True):
+    """
+    GET em um endpoint da Flow2 (ex: 'saldoBancos') retornando o JSON decodificado.
+    Dentro de registrar_requisicoes() guarda os validadores da resposta
+    (registrar=False não guarda, ex: páginas além da primeira).
+    """
+    response = get(endpoint, api_token, params)
+    if registrar:
+        _registrar(endpoint, api_token, params, response, hashlib.sha1(response.content).hexdigest())
+    return response.json()
+
+
+def _registrar(endpoint, api_token, params, response, conteudo_hash):
+    requisicoes = _requisicoes.get()
+    if requisicoes is not None:
+        requisicoes.append({
+            "endpoint": endpoint,
+            "params": params,
+            "api_token": api_token,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "hash": conteudo_hash,
+        })
+
+
+def get_json_async(endpoint, api_token, params=None, registrar=True):
+    """
+    Dispara o GET em background e retorna um Future com o JSON.
+    """
+    return _executor.submit(contextvars.copy_context().run, get_json, endpoint, api_token, params, registrar)
+
+
+@contextmanager
+def registrar_requisicoes():
+    """
+    Coleta as requisições bem-sucedidas feitas no bloco (inclusive pelas
+    threads de get_json_async), com os validadores de cada resposta: ETag,
+    Last-Modified e o hash do conteúdo.
+    """
+    requisicoes = []
+    token = _requisicoes.set(requisicoes)
+    try:
+        yield requisicoes
+    finally:
+        _requisicoes.reset(token)
+
+
+def _conferir(requisicao):
+    headers = {}
+    if requisicao["etag"]:
+        headers["If-None-Match"] = requisicao["etag"]
+    if requisicao["last_modified"]:
+        headers["If-Modified-Since"] = requisicao["last_modified"]
+    response = get(requisicao["endpoint"], requisicao["api_token"], requisicao["params"], headers)
+    if response.status_code == 304:
+        return True
+    # Sem suporte a revalidação: compara o conteúdo
+    return hashlib.sha1(response.content).hexdigest() == requisicao["hash"]
+
+
+def inalterado(requisicoes):
+    """
+    Refaz as requisições registradas como GETs condicionais (em paralelo) e
+    indica se nenhuma resposta mudou. É uma por listagem (a primeira página
+    na leitura paginada); onde a Flow2 responde 304 cada uma custa só um
+    round-trip sem corpo.
+    """
+    if not requisicoes:
+        return False
+    return all(_executor.map(_conferir, requisicoes))
+
+
+def get_json_concorrente(requisicoes, api_token):
+    """
+    Executa várias requisições ao mesmo tempo.
+    `requisicoes` é um dict {nome: (endpoint, params)}; retorna {nome: json}.
+    """
+    futuros = {
+        nome: get_json_async(endpoint, api_token, params)
+        for nome, (endpoint, params) in requisicoes.items()
+    }
+    return {nome: futuro.result() for nome, futuro in futuros.items()}
+
+
+_decodificador_json = json.JSONDecoder()
+_ESPACOS = re.compile(r"[ \t\n\r]*")
+# Resto de pedaço que ainda pode continuar um número ("1." + "5")
+_CONTINUACAO_NUMERO = re.compile(r"[0-9.eE+-]*\Z")
+
+
+def iter_itens_json(pedacos, tamanho_bloco):
+    """
+    Lê o array 'itens' de um objeto JSON que chega em pedaços de texto,
+    gerando listas de até `tamanho_bloco` itens. Só o pedaço atual e o bloco
+    em montagem ficam em memória, qualquer que seja o tamanho da listagem.
+    Os demais campos do objeto são lidos e descartados. JSON inválido ou
+    cortado levanta ValueError.
+    """
+    pedacos = iter(pedacos)
+    texto = ""
+    pos = 0
+    terminou = False
+
+    def completar():
+        nonlocal texto, pos, terminou
+        for pedaco in pedacos:
+            if pedaco:
+                texto = texto[pos:] + pedaco
+                pos = 0
+                return True
+        terminou = True
+        return False
+
+    def caractere():
+        # Próximo caractere não branco, sem consumi-lo
+        nonlocal pos
+        while True:
+            pos = _ESPACOS.match(texto, pos).end()
+            if pos < len(texto):
+                return texto[pos]
+            if not completar():
+                raise ValueError("JSON da listagem terminou antes do fim")
+
+    def valor():
+        # Um número no fim do pedaço pode continuar no próximo: só aceita o
+        # valor quando o que vem depois dele não o continuaria
+        nonlocal pos
+        caractere()
+        while True:
+            try:
+                resultado, fim = _decodificador_json.raw_decode(texto, pos)
+            except json.JSONDecodeError:
+                if not completar():
+                    raise
+                continue
+            if terminou or not _CONTINUACAO_NUMERO.match(texto, fim):
+                pos = fim
+                return resultado
+            completar()
+
+    def esperar(esperado):
+        nonlocal pos
+        atual = caractere()
+        if atual not in esperado:
+            raise ValueError(f"JSON da listagem inválido: esperado {esperado!r}, encontrado {atual!r}")
+        pos += 1
+        return atual
+
+    esperar("{")
+    if caractere() == "}":
+        return
+    bloco = []
+    while True:
+        chave = valor()
+        esperar(":")
+        if chave == "itens" and caractere() == "[":
+            esperar("[")
+            if caractere() == "]":
+                esperar("]")
+            else:
+                while True:
+                    bloco.append(valor())
+                    if len(bloco) >= tamanho_bloco:
+                        yield bloco
+                        bloco = []
+                    if esperar(",]") == "]":
+                        break
+        else:
+            valor()
+        if esperar(",}") == "}":
+            break
+    if bloco:
+        yield bloco
+
+
+def iter_itens(endpoint, api_token, params=None):
+    """
+    GET de uma listagem inteira lendo os 'itens' enquanto a resposta chega,
+    em blocos de TAMANHO_BLOCO: o corpo nunca é decodificado de uma vez.
+    Dentro de registrar_requisicoes() registra os validadores como get_json.
+    """
+    response = get(endpoint, api_token, params, stream=True)
+    conteudo_hash = hashlib.sha1()
+
+    def pedacos():
+        decodificador = codecs.getincrementaldecoder("utf-8")()
+        for bruto in response.iter_content(PEDACO_BYTES):
+            conteudo_hash.update(bruto)
+            yield decodificador.decode(bruto)
+        yield decodificador.decode(b"", final=True)
+
+    texto = pedacos()
+    try:
+        yield from iter_itens_json(texto, TAMANHO_BLOCO)
+        # O hash do validador cobre o corpo inteiro
+        for _ in texto:
+            pass
+    finally:
+        response.close()
+    _registrar(endpoint, api_token, params, response, conteudo_hash.hexdigest())
+
+
+def iter_paginas(endpoint, api_token, params=None):
+    """
+    Percorre um endpoint paginado da Flow2, gerando a lista de 'itens' de
+    cada página. A próxima página é buscada enquanto a atual é processada,
+    então no máximo duas páginas ficam em memória. Sem PAGINACAO a listagem
+    vem numa única resposta, lida em blocos por iter_itens.
+
+    Para a revalidação só a primeira página é registrada: ela é a sonda da
+    listagem (um GET condicional em vez de um por página).
+
+    A leitura só termina numa página vazia (uma página menor que a pedida
+    não prova que acabou: a API pode limitar o tamanho). Se a API repete a
+    primeira página, levanta RuntimeError em vez de devolver a primeira
+    página várias vezes.
+    """
+    params = dict(params or {})
+
+    if not PAGINACAO:
+        params["DesabilitarPaginacao"] = "true"
+        yield from iter_itens(endpoint, api_token, params)
+        return
+
+    def pedir(pagina):
+        return get_json_async(
+            endpoint, api_token, {**params, "Pagina": pagina, "TamanhoPagina": TAMANHO_PAGINA}, registrar=pagina == 1
+        )
+
+    pagina = 1
+    primeiro = None
+    futuro = pedir(pagina)
+    while True:
+        resposta = futuro.result()
+        itens = resposta.get('itens') or []
+        if not itens:
+            break
+
+        # API que ignora 'Pagina' devolveria sempre a mesma página
+        if primeiro is None:
+            primeiro = itens[0]
+        elif itens[0] == primeiro:
+            raise RuntimeError(
+                f"{endpoint}: a página {pagina} repete a primeira; a API parece ignorar a paginação "
+                "(use FLOW2_PAGINACAO=0)"
+            )
+
+        # Pede a próxima antes de entregar a atual
+        pagina += 1
+        futuro = pedir(pagina)
+        yield itens
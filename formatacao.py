@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from processamento import COLUNAS_DETALHE_RECEBER
+
+
+def format_brl(value):
+    """
+    Formata um número float para o padrão BRL (R$ 1.234,56).
+    """
+    try:
+        if pd.isna(value) or value == 0:
+            return "R$ 0,00"
+        # Formata como en-US (ex: 1,234.56)
+        formatted = f"{float(value):,.2f}"
+        # Inverte os separadores para o padrão pt-BR
+        formatted_br = formatted.replace(",", "X").replace(".", ",").replace("X", ".")
+        return f"R$ {formatted_br}"
+    except (ValueError, TypeError):
+        return "R$ 0,00"
+
+
+def formatar_brl_centavos(centavos):
+    """
+    format_brl para uma coluna inteira em centavos, com o mesmo texto, mas
+    em operações vetorizadas (pyarrow) em vez de uma chamada por valor.
+    """
+    centavos = pd.Series(centavos)
+    valores = pd.to_numeric(centavos, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    zerados = np.isnan(valores) | (valores == 0)
+    absolutos = np.rint(np.abs(np.where(zerados, 0, valores))).astype('int64')
+    inteiros = absolutos // 100
+
+    # Milhares: todos os grupos de 3 dígitos com zeros à esquerda, unidos por
+    # ponto, e depois sem os zeros e pontos iniciais (0 fica "0")
+    n_grupos = len(str(int(inteiros.max(initial=0))))
+    grupos = [
+        pc.utf8_lpad(pc.cast(pa.array((inteiros // 1000 ** k) % 1000), pa.string()), 3, "0")
+        for k in range((n_grupos + 2) // 3 - 1, -1, -1)
+    ]
+    inteiros_texto = pc.utf8_ltrim(pc.binary_join_element_wise(*grupos, "."), "0.")
+    inteiros_texto = pc.if_else(pa.array(inteiros == 0), "0", inteiros_texto)
+    centavos_texto = pc.utf8_lpad(pc.cast(pa.array(absolutos % 100), pa.string()), 2, "0")
+    sinal = pc.if_else(pa.array(valores < 0), "R$ -", "R$ ")
+    texto = pc.binary_join_element_wise(sinal, inteiros_texto, ",", centavos_texto, "")
+    texto = pc.if_else(pa.array(zerados), "R$ 0,00", texto)
+    return texto.to_pandas().set_axis(centavos.index)
+
+
+def formatar_datas(datas, formato='%d/%m/%Y'):
+    """
+    Datas como texto (dd/mm/aaaa) numa passada só; vazias viram ''.
+    """
+    datas = pd.to_datetime(pd.Series(datas), errors='coerce')
+    texto = pc.fill_null(pc.strftime(pa.array(datas), format=formato), "")
+    return texto.to_pandas().set_axis(datas.index)
+
+
+# Como o to_html escreve uma célula: tab e quebras de linha como texto
+# escapado (só no corpo), sem espaços nas pontas e com espaços duplos
+# inquebráveis
+ESCAPES_HTML = [("\t", "\\t"), ("\n", "\\n"), ("\r", "\\r")]
+
+
+def _coluna_texto(serie):
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return pd.api.types.is_string_dtype(dtype) and not serie.isna().any()
+
+
+def tabela_html(df, classes):
+    """
+    O mesmo HTML de df.to_html(escape=False, index=False, classes=classes),
+    montado pelo pyarrow direto no texto final, sem as listas de células que
+    o to_html gera. Frames com colunas que não são texto (ou com vazios) vão
+    pelo to_html.
+    """
+    if not len(df.columns) or not all(_coluna_texto(df[coluna]) for coluna in df.columns):
+        return df.to_html(escape=False, index=False, classes=classes)
+
+    cabecalho = "".join(
+        f"      <th>{str(coluna).strip().replace('  ', '&nbsp;&nbsp;')}</th>\n" for coluna in df.columns
+    )
+    corpo = ""
+    if len(df):
+        partes = ["    <tr>\n      <td>"]
+        for posicao in range(df.shape[1]):
+            if posicao:
+                partes.append("</td>\n      <td>")
+            celulas = pa.array(df.iloc[:, posicao].astype(str), type=pa.string())
+            for caractere, texto in ESCAPES_HTML:
+                celulas = pc.replace_substring(celulas, caractere, texto)
+            celulas = pc.replace_substring(pc.utf8_trim_whitespace(celulas), "  ", "&nbsp;&nbsp;")
+            partes.append(celulas)
+        partes.append("</td>\n    </tr>\n")
+        linhas = pc.binary_join_element_wise(*partes, "")
+        del partes
+        # Sem nulos, as linhas em ordem são um trecho contínuo do buffer de
+        # dados, decodificado direto (sem cópia intermediária em bytes)
+        _, buffer_posicoes, buffer_dados = linhas.buffers()
+        posicoes = np.frombuffer(buffer_posicoes, dtype=np.int32)[linhas.offset:linhas.offset + len(linhas) + 1]
+        corpo = str(memoryview(buffer_dados)[int(posicoes[0]):int(posicoes[-1])], "utf-8")
+        del linhas, buffer_posicoes, buffer_dados, posicoes
+    return (
+        f'<table border="1" class="dataframe {classes}">\n'
+        '  <thead>\n    <tr style="text-align: right;">\n'
+        f"{cabecalho}    </tr>\n  </thead>\n  <tbody>\n{corpo}  </tbody>\n</table>"
+    )
+
+
+def formatar_extrato_html(df_pagina):
+    """
+    Formata uma página do extrato agrupado como tabela HTML
+    (saídas destacadas em vermelho).
+    """
+    # Valores em centavos; assign cria só as colunas formatadas (a página segue intacta)
+    entradas = df_pagina['Total Entradas']
+    saidas = df_pagina['Total Saídas']
+    df_formatted = df_pagina.assign(**{
+        'Data': formatar_datas(df_pagina['Data']),
+        'Total Entradas': formatar_brl_centavos(entradas).where(entradas > 0, ""),
+        'Total Saídas': (
+            "<span style='color:red; font-weight:bold;'>" + formatar_brl_centavos(saidas) + "</span>"
+        ).where(saidas > 0, ""),
+    })
+    df_formatted = df_formatted.rename(columns={'Descricao': 'Descrição'})
+    return tabela_html(df_formatted, "extratos-table")
+
+
+def montar_detalhe_receber(df_filtrado):
+    """
+    Tabela de detalhe das contas a receber já formatada para exibição (ou
+    None sem colunas). Projeção das colunas da tela, sem cópia do frame.
+    """
+    colunas_disponiveis = [col for col in COLUNAS_DETALHE_RECEBER if col in df_filtrado.columns]
+    if not colunas_disponiveis:
+        return None
+
+    df_display = df_filtrado[colunas_disponiveis]
+
+    # Formatar colunas (vetorizado, mesmo texto de format_brl)
+    if 'Valor' in df_display.columns:
+        df_display = df_display.assign(**{'Valor Parcela': formatar_brl_centavos(df_display['Valor'])})
+        df_display = df_display.drop(columns='Valor')
+
+    # Datas vazias viram ''
+    datas = {coluna: formatar_datas(df_display[coluna]) for coluna in ['Vencimento', 'Recebido em'] if coluna in df_display.columns}
+    return df_display.assign(**datas)
@@ -0,0 +1,421 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from datetime import date, timedelta
+
+import pandas as pd
+
+from armazenamento import CACHE_DIR, DATA_INICIAL, OVERLAP_DIAS, tenant_id
+from processamento import FAIXAS_ATRASO, LIMITES_ATRASO, categorizar, preprocessar_receber
+
+# Histórico completo em SQLite por empresa (FLOW2_HISTORICO=1 liga): filtros e
+# agregações viram consultas e só a janela selecionada é carregada no pandas
+HISTORICO = os.environ.get("FLOW2_HISTORICO", "0") != "0"
+
+# Primeira data buscada na sincronização completa do histórico
+INICIO_HISTORICO = os.environ.get("FLOW2_HISTORICO_INICIO", DATA_INICIAL)
+
+# Período inicial exibido no extrato (dias até o último movimento)
+JANELA_HISTORICO_DIAS = int(os.environ.get("FLOW2_HISTORICO_JANELA_DIAS", "90"))
+
+# Versão do schema; mudar cria um arquivo novo (sincronização completa)
+VERSAO_HISTORICO = 1
+
+# Resultados de consulta guardados em memória (os mais antigos saem primeiro)
+MAX_CONSULTAS = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movimentos (
+    id,
+    data TEXT NOT NULL,
+    data_movimento TEXT,
+    banco TEXT,
+    descricao TEXT,
+    operacao TEXT,
+    valor INTEGER NOT NULL,
+    saida INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS movimentos_id ON movimentos (id);
+CREATE INDEX IF NOT EXISTS movimentos_data_banco ON movimentos (data, banco);
+
+CREATE TABLE IF NOT EXISTS recebers (
+    cliente TEXT,
+    projeto,
+    vencimento TEXT,
+    recebido_em TEXT,
+    baixado INTEGER NOT NULL,
+    valor INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recebers_vencimento ON recebers (vencimento);
+
+CREATE TABLE IF NOT EXISTS sincronizacoes (
+    tabela TEXT PRIMARY KEY,
+    sincronizado_em REAL NOT NULL,
+    versao INTEGER NOT NULL
+);
+"""
+
+# Mesma regra de processamento.calcular_status, com :hoje como parâmetro
+STATUS_SQL = """
+    CASE
+        WHEN baixado THEN 'Baixado'
+        WHEN vencimento = :hoje THEN 'Vence hoje'
+        WHEN vencimento < :hoje THEN 'Vencido'
+        ELSE 'A vencer'
+    END
+"""
+
+_lock = threading.Lock()
+_inicializados = set()
+_consultas = OrderedDict()
+
+
+def _caminho(api_token):
+    return os.path.join(CACHE_DIR, f"historico_v{VERSAO_HISTORICO}_{tenant_id(api_token)}.sqlite3")
+
+
+def _conectar(api_token):
+    """
+    Abre o arquivo da empresa (criando o schema na primeira vez). WAL
+    permite que outros processos leiam enquanto uma sincronização grava.
+    """
+    caminho = _caminho(api_token)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=30)
+    with _lock:
+        if caminho not in _inicializados:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript(SCHEMA)
+            _inicializados.add(caminho)
+    return conexao
+
+
+def _texto_data(serie):
+    """
+    Datas como 'AAAA-MM-DD' (None quando ausentes), que ordenam como texto.
+    """
+    return serie.dt.strftime('%Y-%m-%d').astype(object).where(serie.notna(), None)
+
+
+def _valores(serie):
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+def _marcar_sincronizacao(conexao, tabela):
+    conexao.execute(
+        """
+        INSERT INTO sincronizacoes (tabela, sincronizado_em, versao) VALUES (?, ?, 1)
+        ON CONFLICT (tabela) DO UPDATE SET sincronizado_em = excluded.sincronizado_em, versao = versao + 1
+        """,
+        (tabela, time.time()),
+    )
+
+
+def sincronizado_ha(api_token, tabela):
+    """
+    Segundos desde a última sincronização da tabela (None se nunca houve).
+    """
+    with closing(_conectar(api_token)) as conexao:
+        linha = conexao.execute(
+            "SELECT sincronizado_em FROM sincronizacoes WHERE tabela = ?", (tabela,)
+        ).fetchone()
+    return None if linha is None else time.time() - linha[0]
+
+
+def inicio_janela_historico(api_token):
+    """
+    Data a partir da qual os movimentos devem ser buscados: a marca d'água
+    do histórico menos OVERLAP_DIAS, ou INICIO_HISTORICO se ele está vazio.
+    """
+    with closing(_conectar(api_token)) as conexao:
+        marca_dagua = conexao.execute("SELECT MAX(data) FROM movimentos").fetchone()[0]
+    if marca_dagua is None:
+        return INICIO_HISTORICO
+    inicio = date.fromisoformat(marca_dagua) - timedelta(days=OVERLAP_DIAS)
+    return max(inicio.isoformat(), INICIO_HISTORICO)
+
+
+def gravar_movimentos(api_token, df_novos, inicio_janela):
+    """
+    Substitui a janela sincronizada pelos movimentos da API (o que também
+    remove os excluídos no período). Um id já gravado fora da janela é
+    substituído pelo novo.
+    """
+    linhas = []
+    if not df_novos.empty:
+        df_novos = df_novos[df_novos['Data'].notna()]
+        ids = df_novos['id'] if 'id' in df_novos.columns else pd.Series(None, index=df_novos.index)
+        linhas = list(zip(
+            _valores(ids),
+            _texto_data(df_novos['Data']).tolist(),
+            df_novos['DataMovimento'].astype(str).tolist(),
+            _valores(df_novos['Banco']),
+            _valores(df_novos['Descricao']),
+            _valores(df_novos['Operacao']),
+            df_novos['Valor'].to_numpy(dtype='int64').tolist(),
+            df_novos['Saida'].to_numpy(dtype='int64').tolist(),
+        ))
+
+    with closing(_conectar(api_token)) as conexao, conexao:
+        conexao.execute("DELETE FROM movimentos WHERE data >= ?", (inicio_janela,))
+        conexao.executemany(
+            "INSERT OR REPLACE INTO movimentos (id, data, data_movimento, banco, descricao, operacao, valor, saida) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            linhas,
+        )
+        _marcar_sincronizacao(conexao, "movimentos")
+
+
+def gravar_receber(api_token, df_receber):
+    """
+    Substitui os títulos gravados pelos da API (a listagem sempre traz
+    todos). Grava só o que os filtros e a tabela de detalhe usam; o Status
+    é calculado na consulta, pois depende do dia.
+    """
+    linhas = []
+    if not df_receber.empty:
+        df_receber = preprocessar_receber(df_receber)
+        baixado = df_receber['dataBaixa'].notna() | df_receber['dataCredito'].notna()
+        linhas = list(zip(
+            _valores(df_receber['Cliente']) if 'Cliente' in df_receber.columns else [None] * len(df_receber),
+            _valores(df_receber['Nº projeto']),
+            _texto_data(df_receber['Vencimento']).tolist(),
+            _texto_data(df_receber['Recebido em']).tolist(),
+            baixado.to_numpy(dtype='int64').tolist(),
+            df_receber['Valor'].to_numpy(dtype='int64').tolist(),
+        ))
+
+    with closing(_conectar(api_token)) as conexao, conexao:
+        conexao.execute("DELETE FROM recebers")
+        conexao.executemany(
+            "INSERT INTO recebers (cliente, projeto, vencimento, recebido_em, baixado, valor) VALUES (?, ?, ?, ?, ?, ?)",
+            linhas,
+        )
+        _marcar_sincronizacao(conexao, "recebers")
+
+
+def _consultar(api_token, tabela, consulta, *args):
+    """
+    Executa `consulta(conexao, *args)` memoizando o resultado pela versão da
+    tabela: uma nova sincronização (de qualquer processo) invalida os
+    resultados anteriores. O resultado é compartilhado e não deve ser alterado.
+    """
+    with closing(_conectar(api_token)) as conexao:
+        linha = conexao.execute("SELECT versao FROM sincronizacoes WHERE tabela = ?", (tabela,)).fetchone()
+        chave = (tenant_id(api_token), tabela, linha and linha[0], consulta.__name__, args)
+        with _lock:
+            if chave in _consultas:
+                _consultas.move_to_end(chave)
+                return _consultas[chave]
+
+        resultado = consulta(conexao, *args)
+
+    with _lock:
+        _consultas[chave] = resultado
+        while len(_consultas) > MAX_CONSULTAS:
+            _consultas.popitem(last=False)
+    return resultado
+
+
+def _marcadores(valores):
+    return ", ".join("?" * len(valores))
+
+
+def _limites(conexao, tabela, coluna):
+    minimo, maximo = conexao.execute(f"SELECT MIN({coluna}), MAX({coluna}) FROM {tabela}").fetchone()
+    if minimo is None:
+        return None, None
+    return date.fromisoformat(minimo), date.fromisoformat(maximo)
+
+
+def limites_movimentos(api_token):
+    """
+    Primeira e última data dos movimentos gravados ((None, None) sem movimentos).
+    """
+    return _consultar(api_token, "movimentos", _limites, "movimentos", "data")
+
+
+def _bancos(conexao):
+    return [banco for (banco,) in conexao.execute(
+        "SELECT DISTINCT banco FROM movimentos WHERE banco IS NOT NULL"
+    )]
+
+
+def bancos_movimentos(api_token):
+    """
+    Bancos com movimentos no histórico.
+    """
+    return _consultar(api_token, "movimentos", _bancos)
+
+
+def _extrato(conexao, inicio, fim, bancos):
+    df_grouped = pd.read_sql_query(
+        f"""
+        SELECT data AS "Data", descricao AS "Descricao",
+               SUM(CASE WHEN saida THEN 0 ELSE valor END) AS "Total Entradas",
+               SUM(CASE WHEN saida THEN valor ELSE 0 END) AS "Total Saídas"
+        FROM movimentos
+        WHERE data BETWEEN ? AND ? AND banco IN ({_marcadores(bancos)})
+        GROUP BY data, descricao
+        HAVING "Total Entradas" != 0 OR "Total Saídas" != 0
+        ORDER BY data, descricao
+        """,
+        conexao,
+        params=[inicio, fim, *bancos],
+    )
+    df_grouped['Data'] = pd.to_datetime(df_grouped['Data'])
+    for coluna in ['Total Entradas', 'Total Saídas']:
+        df_grouped[coluna] = df_grouped[coluna].astype('int64')
+    return categorizar(df_grouped, ['Descricao'])
+
+
+def extrato(api_token, inicio, fim, bancos):
+    """
+    Extrato do período e bancos agrupado por Data e Descrição no próprio
+    SQLite (mesmas colunas de processamento.agrupar_extrato).
+    """
+    bancos = tuple(sorted(map(str, bancos)))
+    return _consultar(api_token, "movimentos", _extrato, inicio.isoformat(), fim.isoformat(), bancos)
+
+
+def _liquido(conexao):
+    df_liquido = pd.read_sql_query(
+        """
+        SELECT data AS "Data", banco AS "Banco", SUM(CASE WHEN saida THEN -valor ELSE valor END) AS "Liquido"
+        FROM movimentos
+        WHERE banco IS NOT NULL
+        GROUP BY data, banco
+        ORDER BY data, banco
+        """,
+        conexao,
+    )
+    df_liquido['Data'] = pd.to_datetime(df_liquido['Data'])
+    df_liquido['Liquido'] = df_liquido['Liquido'].astype('int64')
+    return df_liquido
+
+
+def liquido_movimentos(api_token):
+    """
+    Movimento líquido (entradas - saídas, centavos) por Data e Banco de
+    todo o histórico.
+    """
+    return _consultar(api_token, "movimentos", _liquido)
+
+
+def _status(conexao, hoje):
+    return [status for (status,) in conexao.execute(
+        f"SELECT {STATUS_SQL} AS status FROM recebers GROUP BY status ORDER BY MIN(rowid)", {"hoje": hoje}
+    )]
+
+
+def status_receber(api_token, hoje):
+    """
+    Status presentes nos títulos, na ordem em que aparecem.
+    """
+    return _consultar(api_token, "recebers", _status, hoje.isoformat())
+
+
+def limites_receber(api_token):
+    """
+    Primeiro e último vencimento dos títulos ((None, None) sem vencimentos).
+    """
+    return _consultar(api_token, "recebers", _limites, "recebers", "vencimento")
+
+
+def _receber(conexao, inicio, fim, status, hoje):
+    filtro_status = f"AND status IN ({', '.join(f':s{i}' for i in range(len(status)))})" if status else ""
+    df_receber = pd.read_sql_query(
+        f"""
+        SELECT * FROM (
+            SELECT rowid, cliente AS "Cliente", projeto AS "Nº projeto", vencimento AS "Vencimento",
+                   recebido_em AS "Recebido em", {STATUS_SQL} AS status, valor AS "Valor"
+            FROM recebers
+            WHERE vencimento BETWEEN :inicio AND :fim
+        )
+        WHERE 1 {filtro_status}
+        ORDER BY rowid
+        """,
+        conexao,
+        params={"inicio": inicio, "fim": fim, "hoje": hoje, **{f"s{i}": s for i, s in enumerate(status)}},
+    )
+    df_receber = df_receber.drop(columns='rowid').rename(columns={'status': 'Status'})
+    df_receber['Vencimento'] = pd.to_datetime(df_receber['Vencimento'])
+    df_receber['Recebido em'] = pd.to_datetime(df_receber['Recebido em'])
+    df_receber['Valor'] = df_receber['Valor'].astype('int64')
+    return categorizar(df_receber, ['Cliente', 'Status'])
+
+
+def consultar_receber(api_token, inicio, fim, status, hoje):
+    """
+    Títulos com vencimento no período e Status entre os selecionados (lista
+    vazia não filtra por status), com as colunas da tabela de detalhe.
+    """
+    status = tuple(sorted(status))
+    return _consultar(api_token, "recebers", _receber, inicio.isoformat(), fim.isoformat(), status, hoje.isoformat())
+
+
+# Faixa de aging (código em FAIXAS_ATRASO), mesma regra de processamento.faixas_atraso
+FAIXA_SQL = "CASE WHEN baixado THEN {baixado} {faixas} ELSE {ultima} END".format(
+    baixado=FAIXAS_ATRASO.index('Baixado'),
+    faixas=" ".join(
+        f"WHEN julianday(:hoje) - julianday(vencimento) <= {limite} THEN {codigo}"
+        for codigo, limite in enumerate(LIMITES_ATRASO)
+    ),
+    ultima=len(LIMITES_ATRASO),
+)
+
+
+def _cubo(conexao, hoje):
+    df_cubo = pd.read_sql_query(
+        f"""
+        SELECT date(vencimento, '-' || ((CAST(strftime('%w', vencimento) AS INTEGER) + 6) % 7) || ' days') AS "Semana",
+               {FAIXA_SQL} AS "Faixa", cliente AS "Cliente", {STATUS_SQL} AS "Status",
+               SUM(valor) AS "Valor", COUNT(*) AS "Quantidade"
+        FROM recebers
+        WHERE vencimento IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        """,
+        conexao,
+        params={"hoje": hoje},
+    )
+    df_cubo['Semana'] = pd.to_datetime(df_cubo['Semana'])
+    df_cubo['Faixa'] = pd.Categorical.from_codes(df_cubo['Faixa'].astype('int64'), FAIXAS_ATRASO)
+    df_cubo['Valor'] = df_cubo['Valor'].astype('int64')
+    df_cubo['Quantidade'] = df_cubo['Quantidade'].astype('int64')
+    return categorizar(df_cubo, ['Cliente', 'Status'])
+
+
+def cubo_receber(api_token, hoje):
+    """
+    Cubo de aging/fluxo das contas a receber (ver processamento.montar_cubo_receber)
+    agregado no SQLite.
+    """
+    return _consultar(api_token, "recebers", _cubo, hoje.isoformat())
+
+
+def _recebido_entre(conexao, inicio, fim):
+    return conexao.execute(
+        "SELECT COALESCE(SUM(valor), 0) FROM recebers WHERE recebido_em BETWEEN ? AND ?", (inicio, fim)
+    ).fetchone()[0]
+
+
+def recebido_no_mes(api_token, hoje):
+    """
+    Total recebido do primeiro dia do mês até hoje, em centavos.
+    """
+    return _consultar(api_token, "recebers", _recebido_entre, hoje.replace(day=1).isoformat(), hoje.isoformat())
+
+
+def _contar(conexao):
+    return conexao.execute("SELECT COUNT(*) FROM recebers").fetchone()[0]
+
+
+def contar_receber(api_token):
+    """
+    Quantidade de títulos gravados.
+    """
+    return _consultar(api_token, "recebers", _contar)
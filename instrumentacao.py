@@ -0,0 +1,235 @@
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Medição por etapa (FLOW2_INSTRUMENTACAO=0 desliga)
+INSTRUMENTACAO = os.environ.get("FLOW2_INSTRUMENTACAO", "1") != "0"
+
+# Memória pelo tracemalloc (preciso, mas deixa o pandas bem mais lento); sem ele usa o RSS do processo
+TRACEMALLOC = os.environ.get("FLOW2_INSTRUMENTACAO_TRACEMALLOC", "0") != "0"
+
+# Registros mantidos em memória para o painel de debug
+MAX_REGISTROS = 1000
+
+# Exportação: um JSON por linha neste arquivo e/ou /metrics (formato Prometheus) nesta porta
+ARQUIVO_METRICAS = os.environ.get("FLOW2_METRICAS_ARQUIVO")
+PORTA_METRICAS = int(os.environ.get("FLOW2_METRICAS_PORTA", "0"))
+
+# Cada registro também vai para este logger como JSON (nível INFO)
+logger = logging.getLogger("flow2.metricas")
+
+_lock = threading.Lock()
+_sequencia = itertools.count(1)
+_execucoes = itertools.count(1)
+_registros = deque(maxlen=MAX_REGISTROS)
+_totais = {}
+_contadores_externos = {}
+_servidor = None
+_execucao_atual = contextvars.ContextVar("execucao_flow2", default=None)
+
+if INSTRUMENTACAO and TRACEMALLOC and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+def iniciar_execucao():
+    """
+    Marca o início de uma execução do script. As etapas medidas no mesmo
+    contexto (inclusive threads iniciadas com contextvars.copy_context)
+    ficam associadas a ela.
+    """
+    execucao = next(_execucoes)
+    _execucao_atual.set(execucao)
+    return execucao
+
+
+@contextmanager
+def etapa(nome, linhas=None):
+    """
+    Mede tempo e variação de memória do bloco. As linhas processadas podem
+    ser informadas na chamada ou preenchidas dentro do bloco:
+
+        with etapa("agrupar_extrato") as medida:
+            df = agrupar_extrato(df_filtrado)
+            medida["linhas"] = len(df)
+    """
+    medida = {"linhas": linhas}
+    if not INSTRUMENTACAO:
+        yield medida
+        return
+
+    memoria_antes = _memoria_mb()
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    except Exception as e:
+        medida["erro"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        memoria_depois = _memoria_mb()
+        registrar(
+            nome,
+            time.perf_counter() - inicio,
+            linhas=medida.get("linhas"),
+            memoria_mb=None if memoria_antes is None else memoria_depois - memoria_antes,
+            erro=medida.get("erro"),
+        )
+
+
+def registrar(nome, segundos, linhas=None, memoria_mb=None, erro=None):
+    """
+    Registra uma etapa já medida (ex: tempo acumulado em várias páginas).
+    """
+    if not INSTRUMENTACAO:
+        return
+    registro = {
+        "seq": next(_sequencia),
+        "execucao": _execucao_atual.get(),
+        "etapa": nome,
+        "em": round(time.time(), 3),
+        "segundos": round(segundos, 6),
+        "linhas": None if linhas is None else int(linhas),
+        "memoria_mb": None if memoria_mb is None else round(memoria_mb, 3),
+        "thread": threading.current_thread().name,
+    }
+    if erro:
+        registro["erro"] = erro
+
+    with _lock:
+        _registros.append(registro)
+        total = _totais.setdefault(nome, {"execucoes": 0, "segundos": 0.0, "linhas": 0, "erros": 0})
+        total["execucoes"] += 1
+        total["segundos"] += segundos
+        total["linhas"] += registro["linhas"] or 0
+        total["erros"] += 1 if erro else 0
+        if ARQUIVO_METRICAS:
+            _gravar_linha(registro)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(registro, ensure_ascii=False))
+
+
+def registros(execucao=None):
+    """
+    Registros em memória (os mais antigos primeiro), opcionalmente só os de
+    uma execução.
+    """
+    with _lock:
+        todos = list(_registros)
+    if execucao is None:
+        return todos
+    return [r for r in todos if r["execucao"] == execucao]
+
+
+def ultimas_por_etapa(prefixos):
+    """
+    Último registro de cada etapa cujo nome começa com um dos prefixos.
+    """
+    ultimos = {}
+    for registro in registros():
+        if registro["etapa"].startswith(tuple(prefixos)):
+            ultimos[registro["etapa"]] = registro
+    return list(ultimos.values())
+
+
+def totais():
+    """
+    Acumulado do processo por etapa: execuções, segundos, linhas e erros.
+    """
+    with _lock:
+        return {nome: dict(total) for nome, total in _totais.items()}
+
+
+def registrar_contadores(prefixo, ler):
+    """
+    Inclui em /metrics os contadores devolvidos por `ler()` ({nome: número}),
+    como `<prefixo>_<nome>`.
+    """
+    _contadores_externos[prefixo] = ler
+
+
+def texto_prometheus():
+    """
+    Totais no formato de exposição de texto do Prometheus.
+    """
+    linhas = []
+    metricas = [
+        ("flow2_etapa_execucoes_total", "execucoes", "Execuções da etapa"),
+        ("flow2_etapa_segundos_total", "segundos", "Tempo acumulado da etapa em segundos"),
+        ("flow2_etapa_linhas_total", "linhas", "Linhas processadas pela etapa"),
+        ("flow2_etapa_erros_total", "erros", "Execuções da etapa que terminaram em exceção"),
+    ]
+    acumulado = totais()
+    for metrica, campo, descricao in metricas:
+        linhas.append(f"# HELP {metrica} {descricao}")
+        linhas.append(f"# TYPE {metrica} counter")
+        for nome, total in sorted(acumulado.items()):
+            linhas.append(f'{metrica}{{etapa="{nome}"}} {total[campo]:g}')
+
+    for prefixo, ler in _contadores_externos.items():
+        for nome, valor in sorted(ler().items()):
+            linhas.append(f"# TYPE {prefixo}_{nome} untyped")
+            linhas.append(f"{prefixo}_{nome} {valor:g}")
+    return "\n".join(linhas) + "\n"
+
+
+def iniciar_servidor_metricas(porta=None):
+    """
+    Sobe (uma vez por processo) o endpoint /metrics em uma thread daemon.
+    Sem porta configurada não faz nada.
+    """
+    global _servidor
+    porta = PORTA_METRICAS if porta is None else porta
+    with _lock:
+        if _servidor is not None or not porta:
+            return _servidor
+        try:
+            _servidor = ThreadingHTTPServer(("0.0.0.0", porta), _HandlerMetricas)
+        except OSError as e:
+            # Outro processo do app já serve a porta
+            logger.warning("Endpoint de métricas indisponível na porta %s: %s", porta, e)
+            return None
+        _servidor.daemon_threads = True
+    threading.Thread(target=_servidor.serve_forever, daemon=True, name="flow2-metricas").start()
+    return _servidor
+
+
+class _HandlerMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _gravar_linha(registro):
+    try:
+        with open(ARQUIVO_METRICAS, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning("Falha ao gravar métricas em %s: %s", ARQUIVO_METRICAS, e)
+
+
+def _memoria_mb():
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0] / 1024 ** 2
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
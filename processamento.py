@@ -0,0 +1,512 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# As transformações contam com o copy-on-write do pandas 3 (requirements.txt):
+# projeções e cópias rasas compartilham as colunas e nenhuma escrita volta
+# para o frame de origem, então nada precisa de cópia completa
+
+# Schema compacto aplicado na carga: datas em datetime64, colunas de baixa
+# cardinalidade como categóricas e valores monetários em centavos (int64),
+# para que as somas sejam exatas.
+CATEGORICAS_MOVIMENTOS = ['Banco', 'Operacao', 'Descricao']
+CATEGORICAS_RECEBER = ['Cliente', 'Status']
+
+# Status dos títulos (em ordem alfabética, como as categorias do astype)
+STATUS_RECEBER = ['A vencer', 'Baixado', 'Vence hoje', 'Vencido']
+
+# Nome exibido para títulos cujo cliente não está no diretório
+CLIENTE_NAO_INFORMADO = 'Cliente não informado'
+
+# Colunas dos movimentos normalizados
+COLUNAS_MOVIMENTOS = [
+    'Data', 'Horario', 'Descricao', 'Valor', 'Operacao', 'Banco',
+    'Saida', 'Total Entradas', 'Total Saídas',
+]
+
+# Chaves e colunas do rollup diário dos movimentos
+CHAVES_DIARIO = ['Data', 'Banco', 'Descricao']
+COLUNAS_DIARIO = CHAVES_DIARIO + ['Total Entradas', 'Total Saídas', 'Quantidade']
+
+# Colunas da tabela de detalhe das contas a receber (tela e exportação)
+COLUNAS_DETALHE_RECEBER = ['Cliente', 'Nº projeto', 'Vencimento', 'Recebido em', 'Status', 'Valor']
+
+# Colunas da curva de saldo diário por banco (centavos)
+COLUNAS_CURVA_SALDOS = ['Data', 'Banco', 'Saldo']
+
+# Faixas do aging das contas a receber: dias após o vencimento até cada
+# limite (inclusive); títulos baixados ficam numa faixa à parte
+LIMITES_ATRASO = [0, 30, 60, 90]
+FAIXAS_ATRASO = ['A vencer', '1–30 dias', '31–60 dias', '61–90 dias', '90+ dias', 'Baixado']
+
+# Chaves e colunas do cubo de aging/fluxo das contas a receber
+CHAVES_CUBO_RECEBER = ['Semana', 'Faixa', 'Cliente', 'Status']
+COLUNAS_CUBO_RECEBER = CHAVES_CUBO_RECEBER + ['Valor', 'Quantidade']
+
+# Colunas de data dos títulos que chegam com fuso (ex: 2025-10-16T01:00:00-03:00)
+COLUNAS_DATA_RECEBER = ['dataVencimentoNominal', 'dataVencimentoReal', 'dataBaixa', 'dataCredito']
+
+# Campos lidos de cada endpoint da Flow2 (o resto do item é ignorado na
+# carga) e o tipo aplicado: 'numero', 'data_hora' (ISO 8601, horário local),
+# 'data' (só a parte da data) ou None (como veio). Aninhados usam ponto.
+ESQUEMAS = {
+    "movimentosBancarios": {
+        "id": None, "valor": "numero", "dataMovimento": "data_hora",
+        "descricao": None, "operacao": None, "nomeBanco": None,
+    },
+    "recebers": {
+        "id": None, "idCliente": None, "valorBruto": "numero",
+        "dataVencimentoNominal": "data", "dataVencimentoReal": "data",
+        "dataBaixa": "data", "dataCredito": "data", "codigoProjeto": None,
+    },
+    "clientes": {"id": None, "nomeRazaoSocial": None},
+    "saldoBancos": {"saldo": "numero", "banco.nome": None},
+}
+
+# Fuso no fim de uma data/hora ISO 8601 (-03:00, +0000, Z)
+FUSO_ISO = r'(T[\d:.]+)(?:Z|[+-]\d{2}:?\d{2})$'
+
+
+def para_centavos(serie):
+    """
+    Converte valores em reais (qualquer tipo numérico ou texto) para centavos int64.
+    """
+    reais = pd.to_numeric(serie, errors='coerce').fillna(0).to_numpy(dtype='float64')
+    return pd.Series(np.round(reais * 100).astype('int64'), index=serie.index)
+
+
+def sem_fuso(serie):
+    """
+    Remove o fuso de uma série datetime64, mantendo o horário local.
+    """
+    if getattr(serie.dt, 'tz', None) is not None:
+        return serie.dt.tz_localize(None)
+    return serie
+
+
+def data_sem_hora(serie):
+    """
+    Data (meia-noite, sem fuso) de uma série datetime64. Séries já só com
+    datas (ex: tipadas por extrair_itens) voltam como estão, sem cópia.
+    """
+    serie = sem_fuso(serie)
+    valores = serie.to_numpy()
+    unidade, passo = np.datetime_data(valores.dtype)
+    dia = np.timedelta64(1, 'D') // np.timedelta64(passo, unidade)
+    if ((valores.view('int64') % dia == 0) | np.isnat(valores)).all():
+        return serie
+    return serie.dt.normalize()
+
+
+def datas_iso(serie, com_hora=True):
+    """
+    Converte datas ISO 8601 da API em datetime64 sem fuso, com formato
+    explícito (sem inferência por valor). O fuso sai numa passada só sobre
+    o texto, mantendo o horário local como sem_fuso; com_hora=False fica só
+    com a data. Nulos, vazios e valores inválidos viram NaT.
+    """
+    if serie.dtype.kind == 'M':
+        return sem_fuso(serie) if com_hora else data_sem_hora(serie)
+    if serie.dtype == object:
+        # Coluna sem tipo de texto: vira str (nulos continuam nulos)
+        serie = serie.astype('str')
+    if com_hora:
+        texto = serie.str.replace(FUSO_ISO, r'\1', regex=True)
+        return pd.to_datetime(texto, format='ISO8601', errors='coerce')
+    return pd.to_datetime(serie.str.slice(0, 10), format='%Y-%m-%d', errors='coerce')
+
+
+CONVERSORES = {
+    'numero': lambda serie: pd.to_numeric(serie, errors='coerce'),
+    'data_hora': datas_iso,
+    'data': lambda serie: datas_iso(serie, com_hora=False),
+}
+
+
+def _campo(item, chaves):
+    for chave in chaves:
+        if not isinstance(item, dict):
+            return None
+        item = item.get(chave)
+    return item
+
+
+def _tem_campo(item, chaves):
+    for chave in chaves:
+        if not isinstance(item, dict) or chave not in item:
+            return False
+        item = item[chave]
+    return True
+
+
+def extrair_itens(itens, esquema):
+    """
+    Frame só com os campos do esquema (ver ESQUEMAS), lidos direto dos
+    itens da API e já tipados, em vez de achatar o item inteiro com
+    json_normalize. Campos ausentes de todos os itens ficam de fora.
+    """
+    colunas = {}
+    for caminho, tipo in esquema.items():
+        chaves = caminho.split('.')
+        if len(chaves) == 1:
+            valores = [item.get(caminho) for item in itens]
+        else:
+            valores = [_campo(item, chaves) for item in itens]
+        if all(valor is None for valor in valores) and not any(_tem_campo(item, chaves) for item in itens):
+            continue
+        serie = pd.Series(valores)
+        colunas[caminho] = CONVERSORES[tipo](serie) if tipo else serie
+    return pd.DataFrame(colunas, index=pd.RangeIndex(len(itens)))
+
+
+def categorizar(df, colunas):
+    """
+    Converte as colunas de texto indicadas para category (in-place).
+    """
+    for coluna in colunas:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+    return df
+
+
+def compactar_movimentos(df_movimentos):
+    """
+    Aplica o schema compacto aos movimentos já mesclados (as categorias
+    precisam ser definidas sobre o frame completo, não por página).
+    """
+    return categorizar(df_movimentos, CATEGORICAS_MOVIMENTOS)
+
+
+def normalizar_movimentos(df_movimentos):
+    """
+    Renomeia e tipa as colunas dos movimentos vindos da API
+    (Valor em centavos, Data em datetime64 e Horario como timedelta).
+    """
+    if df_movimentos.empty:
+        return df_movimentos
+
+    df_movimentos = df_movimentos.rename(columns={
+        "valor": "Valor",
+        "dataMovimento": "DataMovimento",
+        "descricao": "Descricao",
+        "operacao": "Operacao",
+        "nomeBanco": "Banco"
+    })
+
+    df_movimentos['Valor'] = para_centavos(df_movimentos.get('Valor', pd.Series(0, index=df_movimentos.index)))
+    df_movimentos['DataMovimento'] = datas_iso(
+        df_movimentos.get('DataMovimento', pd.Series(None, index=df_movimentos.index, dtype=object))
+    )
+    df_movimentos['Data'] = data_sem_hora(df_movimentos['DataMovimento'])
+    df_movimentos['Horario'] = sem_fuso(df_movimentos['DataMovimento']) - df_movimentos['Data']
+    df_movimentos['Descricao'] = df_movimentos.get('Descricao', '').astype(str).str.upper()
+    df_movimentos['Operacao'] = df_movimentos.get('Operacao', '').astype(str)
+    return adicionar_lancamentos(df_movimentos)
+
+
+def adicionar_lancamentos(df_movimentos):
+    """
+    Calcula uma única vez a direção do movimento (operação com '-' é saída)
+    e as colunas de valor de entrada e de saída usadas pelos KPIs e extratos.
+    """
+    saida = df_movimentos['Operacao'].str.contains('-', regex=False, na=False)
+    df_movimentos['Saida'] = saida
+    df_movimentos['Total Entradas'] = df_movimentos['Valor'].where(~saida, 0)
+    df_movimentos['Total Saídas'] = df_movimentos['Valor'].where(saida, 0)
+    return df_movimentos
+
+
+def normalizar_saldos(data_saldos):
+    """
+    Normaliza a resposta de saldoBancos em Banco / Saldo dos bancos (centavos).
+    """
+    if not data_saldos:
+        return pd.DataFrame({
+            'Banco': pd.Series(dtype='category'),
+            'Saldo dos bancos': pd.Series(dtype='int64'),
+        })
+
+    df_saldos = extrair_itens(data_saldos, ESQUEMAS["saldoBancos"])
+    df_saldos = df_saldos.rename(columns={
+        "banco.nome": "Banco",
+        "saldo": "Saldo dos bancos"
+    })
+    df_saldos['Saldo dos bancos'] = para_centavos(df_saldos.get('Saldo dos bancos', pd.Series(0, index=df_saldos.index)))
+    return categorizar(df_saldos, ['Banco'])
+
+
+def normalizar_clientes(df_clientes):
+    """
+    Mantém só o id e o nome dos clientes.
+    """
+    df_clientes = df_clientes.rename(columns={
+        "id": "idCliente",
+        "nomeRazaoSocial": "Cliente"
+    })
+    return df_clientes.reindex(columns=['idCliente', 'Cliente'])
+
+
+def indexar_clientes(df_clientes):
+    """
+    Índice idCliente -> nome do diretório de clientes, com os nomes já
+    categóricos (inclui CLIENTE_NAO_INFORMADO). Um nome por id; o cadastro
+    mais recente vence.
+    """
+    df_clientes = df_clientes.dropna(subset=['idCliente']).drop_duplicates('idCliente', keep='last')
+    nomes = df_clientes['Cliente'].astype(object).fillna(CLIENTE_NAO_INFORMADO)
+    categorias = pd.Index(nomes.unique()).union([CLIENTE_NAO_INFORMADO])
+    return pd.Series(
+        pd.Categorical(nomes, categories=categorias),
+        index=pd.Index(df_clientes['idCliente'], name='idCliente'),
+        name='Cliente',
+    )
+
+
+def nomear_clientes(df_receber, indice_clientes):
+    """
+    Acrescenta o nome do cliente (coluna Cliente) às contas a receber pelo
+    índice de indexar_clientes: só uma busca de posições e códigos
+    categóricos, sem merge.
+    """
+    if df_receber.empty:
+        return pd.DataFrame()
+
+    if 'idCliente' not in df_receber.columns:
+        df_receber = df_receber.assign(idCliente=None)
+
+    categorias = indice_clientes.cat.categories
+    # Posição -1 (id fora do diretório) cai no código extra do final
+    codigos = np.append(indice_clientes.cat.codes.to_numpy(), categorias.get_loc(CLIENTE_NAO_INFORMADO))
+    posicoes = indice_clientes.index.get_indexer(df_receber['idCliente'])
+    return df_receber.assign(Cliente=pd.Categorical.from_codes(codigos[posicoes], categorias))
+
+
+def juntar_clientes(df_receber, df_clientes):
+    """
+    Acrescenta o nome do cliente (coluna Cliente) às contas a receber.
+    """
+    return nomear_clientes(df_receber, indexar_clientes(df_clientes))
+
+
+def preprocessar_receber(df_receber_raw, hoje=None):
+    """
+    Prepara os títulos para exibição em passes por coluna: datas sem fuso e
+    sem hora, escolhe o vencimento (nominal ou real) e calcula Status,
+    Vencimento e Recebido em.
+    """
+    # Cópia rasa: as colunas do snapshot são compartilhadas e as substituídas
+    # abaixo ganham dados novos sem tocar no frame original
+    df_receber = df_receber_raw.copy(deep=False)
+
+    # Datas só com a parte da data (já tipadas quando vêm de extrair_itens)
+    for coluna in COLUNAS_DATA_RECEBER:
+        if coluna in df_receber.columns:
+            df_receber[coluna] = datas_iso(df_receber[coluna], com_hora=False)
+
+    # Vencimento: nominal quando preenchido, senão o real
+    vazia = pd.Series(pd.NaT, index=df_receber.index, dtype='datetime64[us]')
+    nominal = df_receber.get('dataVencimentoNominal', vazia)
+    df_receber['dataVencimentoReal'] = nominal.fillna(df_receber.get('dataVencimentoReal', vazia))
+    df_receber['dataBaixa'] = df_receber.get('dataBaixa', vazia)
+    df_receber['dataCredito'] = df_receber.get('dataCredito', vazia)
+
+    # Valor (centavos)
+    valor_bruto = pd.to_numeric(df_receber.get('valorBruto', pd.Series(0, index=df_receber.index)), errors='coerce')
+    df_receber['Valor'] = para_centavos(valor_bruto.abs())
+
+    # Status (a data de hoje é calculada uma única vez)
+    df_receber['Status'] = calcular_status(
+        df_receber['dataVencimentoReal'], df_receber['dataBaixa'], df_receber['dataCredito'], hoje
+    )
+
+    # Colunas de exibição (datas sem hora, NaT quando ausentes)
+    df_receber['Vencimento'] = data_sem_hora(df_receber['dataVencimentoReal'])
+    df_receber['Recebido em'] = data_sem_hora(df_receber['dataBaixa'])
+    df_receber['Nº projeto'] = df_receber.get('codigoProjeto', 'N/A')
+
+    return categorizar(df_receber, CATEGORICAS_RECEBER)
+
+
+def totais_receber(df_receber):
+    """
+    Total a receber (não baixado) e total vencido, em centavos, somados por
+    máscara sem materializar os frames filtrados.
+    """
+    if 'Status' not in df_receber.columns:
+        return 0, 0
+    valores = df_receber['Valor'].to_numpy()
+    status = df_receber['Status']
+    return valores[(status != 'Baixado').to_numpy()].sum(), valores[(status == 'Vencido').to_numpy()].sum()
+
+
+def recebido_entre(df_receber, inicio, fim):
+    """
+    Total recebido (Recebido em no período, inclusive), em centavos.
+    """
+    recebido_em = df_receber['Recebido em']
+    no_periodo = (recebido_em >= pd.Timestamp(inicio)) & (recebido_em <= pd.Timestamp(fim))
+    return df_receber['Valor'].to_numpy()[no_periodo.to_numpy()].sum()
+
+
+def calcular_status(vencimento, data_baixa, data_credito, hoje=None):
+    """
+    Calcula o status dos títulos (A vencer, Vence hoje, Vencido, Baixado)
+    como category, direto dos códigos (sem uma coluna de texto por título).
+    Só os status presentes ficam nas categorias.
+    """
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    baixado = data_baixa.notna().to_numpy() | data_credito.notna().to_numpy()
+
+    if getattr(vencimento.dt, 'tz', None) is not None:
+        # Datas com fuso não são comparáveis com hoje: ficam "A vencer"
+        codigos = np.where(baixado, 1, 0)
+    else:
+        vencimento = data_sem_hora(vencimento)
+        condicoes = [
+            baixado,
+            (vencimento == hoje).to_numpy(),
+            (vencimento < hoje).to_numpy(),
+        ]
+        codigos = np.select(condicoes, [1, 2, 3], default=0)
+    status = pd.Categorical.from_codes(codigos.astype('int8'), categories=STATUS_RECEBER)
+    return pd.Series(status, index=vencimento.index).cat.remove_unused_categories()
+
+
+def agrupar_extrato(df_movimentos):
+    """
+    Extrato agrupado por Data e Descrição com as somas de entradas e saídas
+    (centavos), sem as linhas zeradas.
+    """
+    # Agrupa sem ordenar e ordena só o resultado, bem menor: ordenar no
+    # groupby custa memória proporcional às linhas de entrada
+    df_grouped = df_movimentos.groupby(['Data', 'Descricao'], observed=True, sort=False)[
+        ['Total Entradas', 'Total Saídas']
+    ].sum()
+    df_grouped = df_grouped.sort_index().reset_index()
+    return df_grouped[(df_grouped['Total Entradas'] != 0) | (df_grouped['Total Saídas'] != 0)]
+
+
+def agregar_diario(df_movimentos):
+    """
+    Rollup diário dos movimentos por Data, Banco e Descrição: somas de
+    entradas e saídas (centavos) e quantidade de movimentos.
+    """
+    if df_movimentos.empty:
+        return pd.DataFrame(columns=COLUNAS_DIARIO)
+    df_diario = df_movimentos.groupby(CHAVES_DIARIO, observed=True, sort=False).agg(**{
+        'Total Entradas': ('Total Entradas', 'sum'),
+        'Total Saídas': ('Total Saídas', 'sum'),
+        'Quantidade': ('Valor', 'size'),
+    }).reset_index()
+    return categorizar(df_diario, ['Banco', 'Descricao'])
+
+
+def mesclar_diario(df_diario, df_movimentos, desde=None):
+    """
+    Atualiza o rollup diário: só os dias a partir de `desde` são reagregados
+    dos movimentos e os anteriores vêm do rollup existente. Reagrega tudo sem
+    rollup, sem `desde` ou se o rollup não bate com os movimentos anteriores
+    (ex: gravado por outra versão do store).
+    """
+    if df_diario is None or df_diario.empty or desde is None or df_movimentos.empty:
+        return agregar_diario(df_movimentos)
+
+    desde = pd.Timestamp(desde)
+    anteriores = df_diario[df_diario['Data'] < desde]
+    contados = (df_movimentos['Data'] < desde) & df_movimentos['Banco'].notna()
+    if anteriores['Quantidade'].sum() != contados.sum():
+        return agregar_diario(df_movimentos)
+
+    df_recentes = agregar_diario(df_movimentos[df_movimentos['Data'] >= desde])
+    df_final = pd.concat([anteriores, df_recentes], ignore_index=True)
+    # Categorias diferentes nos dois lados viram texto no concat
+    for coluna in ['Banco', 'Descricao']:
+        df_final[coluna] = df_final[coluna].astype(str).astype('category')
+    return df_final
+
+
+def faixas_atraso(dias, baixado):
+    """
+    Faixa de aging (categórica) a partir dos dias de atraso, numa busca binária.
+    """
+    codigos = np.searchsorted(LIMITES_ATRASO, dias, side='left')
+    codigos = np.where(baixado, FAIXAS_ATRASO.index('Baixado'), codigos)
+    return pd.Categorical.from_codes(codigos, FAIXAS_ATRASO)
+
+
+def inicio_semana(datas):
+    """
+    Segunda-feira da semana de cada data.
+    """
+    return datas - pd.to_timedelta(datas.dt.dayofweek, unit='D')
+
+
+def montar_cubo_receber(df_receber, hoje=None):
+    """
+    Cubo das contas a receber por (Semana do vencimento, Faixa de atraso,
+    Cliente, Status) com Valor (centavos) e Quantidade de títulos, montado
+    uma vez por snapshot e fatiado pelos filtros da tela. Títulos sem
+    vencimento ficam de fora, como no filtro de período.
+    """
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    # Só as colunas do cubo passam pela máscara (não o frame inteiro)
+    df_receber = df_receber[['Vencimento', 'Cliente', 'Status', 'Valor']]
+    df_receber = df_receber[df_receber['Vencimento'].notna()]
+    vencimento = df_receber['Vencimento']
+    dias = (hoje - vencimento).dt.days.to_numpy()
+
+    df_cubo = pd.DataFrame({
+        'Semana': inicio_semana(vencimento).to_numpy(),
+        'Faixa': faixas_atraso(dias, (df_receber['Status'] == 'Baixado').to_numpy()),
+        'Cliente': df_receber['Cliente'].array,
+        'Status': df_receber['Status'].array,
+        'Valor': df_receber['Valor'].to_numpy(),
+    })
+    df_cubo = df_cubo.groupby(CHAVES_CUBO_RECEBER, observed=True, dropna=False).agg(
+        Valor=('Valor', 'sum'), Quantidade=('Valor', 'size')
+    ).reset_index()
+    return categorizar(df_cubo[COLUNAS_CUBO_RECEBER], CATEGORICAS_RECEBER)
+
+
+def liquido_diario(df_diario):
+    """
+    Movimento líquido (entradas - saídas, centavos) por Data e Banco, a
+    partir do rollup diário (sem voltar aos movimentos).
+    """
+    liquido = df_diario['Total Entradas'] - df_diario['Total Saídas']
+    liquido = liquido.groupby([df_diario['Data'], df_diario['Banco'].astype(str)], observed=True).sum()
+    return liquido.rename('Liquido').reset_index()
+
+
+def curva_saldos(df_liquido, df_registro):
+    """
+    Saldo de fim de dia por banco (centavos): soma acumulada do líquido
+    diário ancorada, em cada dia, no primeiro saldo registrado a partir dele
+    (depois do último registro, no último). O último registro de cada dia
+    vale como saldo de fim de dia. Bancos nunca registrados ficam de fora.
+    """
+    if df_registro.empty:
+        tipos = ['datetime64[ns]', 'category', 'int64']
+        return pd.DataFrame({coluna: pd.Series(dtype=tipo) for coluna, tipo in zip(COLUNAS_CURVA_SALDOS, tipos)})
+
+    registro = df_registro.assign(Data=df_registro['Registrado em'].dt.normalize(), Banco=df_registro['Banco'].astype(str))
+    registro = registro.sort_values('Registrado em', kind='stable').drop_duplicates(['Data', 'Banco'], keep='last')
+    datas = pd.concat([registro['Data'], df_liquido['Data']])
+    dias = pd.date_range(datas.min(), datas.max(), freq='D')
+    liquido_por_banco = dict(tuple(df_liquido.groupby('Banco', observed=True)))
+
+    partes = []
+    for banco, ancoras in registro.groupby('Banco', sort=True):
+        liquido = liquido_por_banco.get(banco)
+        if liquido is None:
+            acumulado = np.zeros(len(dias), dtype='int64')
+        else:
+            acumulado = np.cumsum(liquido.set_index('Data')['Liquido'].reindex(dias, fill_value=0).to_numpy(dtype='int64'))
+        # Posições (em ordem de data) dos dias com registro e a correção de cada um
+        posicoes = dias.get_indexer(ancoras['Data'])
+        correcoes = ancoras['Saldo dos bancos'].to_numpy(dtype='int64') - acumulado[posicoes]
+        ancora = np.minimum(np.searchsorted(posicoes, np.arange(len(dias))), len(posicoes) - 1)
+        partes.append(pd.DataFrame({'Data': dias, 'Banco': banco, 'Saldo': acumulado + correcoes[ancora]}))
+
+    return categorizar(pd.concat(partes, ignore_index=True)[COLUNAS_CURVA_SALDOS], ['Banco'])